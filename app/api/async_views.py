@@ -0,0 +1,332 @@
+"""
+Async (ASGI) versions of the search, insert and update endpoints.
+
+DRF function views are synchronous, so these are plain Django async views.
+They reuse DRF's token authentication and return the same payloads as the
+views in `api.views`, which stay in place for WSGI deployments.
+"""
+
+import json
+import time
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from api.utils import result_cache
+from api.utils.highlighter import get_highlighter
+from api.utils.hybrid_search import FUSIONS
+from api.utils.search_types import HYBRID, TEXT, resolve_search_type
+from api.utils.neural_search import NeuralSearcher
+from api.utils.text_search import TextSearcher, decode_cursor
+from api.utils.async_qdrant import (
+    AsyncHybridSearcher,
+    AsyncNeuralSearcher,
+    AsyncQdrantConnection,
+    AsyncTextSearcher,
+    format_hits,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _authenticate(request):
+    """
+    Return the user of a `Authorization: Token ...` header, or None.
+    """
+    try:
+        result = await sync_to_async(TokenAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _unauthorized():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."},
+        status=status.HTTP_401_UNAUTHORIZED,
+    )
+
+
+def _ndjson_response(items) -> StreamingHttpResponse:
+    """
+    Stream an async iterable of JSON-serializable items, one NDJSON line each.
+    """
+    return StreamingHttpResponse(
+        (json.dumps(item) + "\n" async for item in items),
+        content_type="application/x-ndjson",
+    )
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+def _search_error(error):
+    logger.exception("Unhandled exception during search: %s", str(error))
+    return JsonResponse(
+        {"error": f"Failed to perform search due to an internal error. {str(error)}"},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+
+
+def _load_json(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@csrf_exempt
+@require_POST
+async def async_embed_data_into_vector_database(request):
+    """
+    Async version of `embed_data_into_vector_database`, same JSON payload.
+    """
+    if await _authenticate(request) is None:
+        return _unauthorized()
+    data = _load_json(request)
+    if data is None:
+        return JsonResponse(
+            {"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        collection_name = data.get("collection_name")
+        payload = data.get("payload")
+        if not isinstance(payload, list):
+            payload = [payload]
+        document_data = data.get("data")
+
+        qdrant = AsyncQdrantConnection()
+        if not await qdrant.insert_vector(collection_name, document_data, payload):
+            return JsonResponse(
+                {"error": f"Failed to insert data into {collection_name}."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        return JsonResponse({"SUCCESS": payload}, status=status.HTTP_201_CREATED)
+
+    except Exception as error:
+        logger.exception("Unhandled exception during data insertion: %s", str(error))
+        return JsonResponse(
+            {"error": f"Failed to insert data due to an internal error. {str(error)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@csrf_exempt
+@require_POST
+async def async_update_data_into_vector_database(request):
+    """
+    Async version of `update_data_into_vector_database`, same JSON payload.
+    """
+    if await _authenticate(request) is None:
+        return _unauthorized()
+    data = _load_json(request)
+    if data is None:
+        return JsonResponse(
+            {"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        filter_conditions = data.get("filter_conditions", {})
+        collection_name = data.get("collection_name")
+        payload = data.get("payload")
+        if not isinstance(payload, list):
+            payload = [payload]
+        document_data = data.get("data")
+
+        if not filter_conditions or not collection_name:
+            return JsonResponse(
+                {"error": "filter_conditions and collection_name are required fields."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        qdrant = AsyncQdrantConnection()
+        point_id = await qdrant.upsert_vector(
+            collection_name, filter_conditions, document_data, payload
+        )
+        if not point_id:
+            return JsonResponse(
+                {"error": f"Failed to update data for: {filter_conditions}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        return JsonResponse(
+            {"ID": point_id, "SUCCESS": payload}, status=status.HTTP_200_OK
+        )
+    except Exception as error:
+        logger.error(f"Error updating data in vector database: {str(error)}")
+        return JsonResponse(
+            {"error": "Internal server error."},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@require_GET
+async def async_search_in_vector_database(request):
+    """
+    Async version of `search_in_vector_database`, same parameters:
+        q=QUERY (mandatory)
+        collection_name=COLLECTION_NAME (mandatory)
+        limit=1 (optional, default 10)
+        type=neural or hybrid (or text by default)
+        fusion=rrf or dbsf (optional, hybrid only)
+        highlight=1 (optional, adds snippets around the matches to each hit)
+        cursor=CURSOR (optional, text only, the "cursor" of the previous page)
+        stream=1 (optional, text only, streams every page as an NDJSON line)
+        format=ndjson (optional, streams one hit per line instead of a JSON body)
+        collapse=1 (optional, one hit per document instead of one per chunk)
+
+    An "Accept: application/x-ndjson" header is the same as format=ndjson. Text
+    results carry a "cursor", sent in the X-Next-Cursor header with NDJSON.
+    """
+    collection_name = request.GET.get("collection_name")
+    q = request.GET.get("q")
+    search_type = request.GET.get("type")
+    search_limit = int(request.GET.get("limit", 10))
+    highlight = request.GET.get("highlight") in ("1", "true", "True")
+    cursor = request.GET.get("cursor")
+    stream = request.GET.get("stream") in ("1", "true", "True")
+    collapse = request.GET.get("collapse") in ("1", "true", "True")
+    ndjson = request.GET.get("format") == "ndjson" or (
+        "application/x-ndjson" in request.headers.get("Accept", "")
+    )
+    if not q:
+        return JsonResponse(
+            {"error": "Query parameter 'q' is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not collection_name:
+        return JsonResponse(
+            {"error": "Query parameter 'collection_name' is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    search_type = resolve_search_type(search_type)
+    fusion = request.GET.get("fusion", settings.HYBRID_FUSION)
+    if search_type == HYBRID and fusion not in FUSIONS:
+        return JsonResponse(
+            {"error": f"Query parameter 'fusion' must be one of {list(FUSIONS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if search_type == HYBRID and not await AsyncQdrantConnection().is_hybrid(
+        collection_name
+    ):
+        return JsonResponse(
+            {
+                "error": f"Collection '{collection_name}' has no sparse vectors, "
+                'type=hybrid needs a collection created with "hybrid": true.'
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if (cursor or stream) and search_type != TEXT:
+        return JsonResponse(
+            {"error": "Query parameters 'cursor' and 'stream' require type=text."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        decode_cursor(cursor)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    highlighter = get_highlighter(q) if highlight else None
+    if stream and ndjson:
+        records = AsyncTextSearcher(collection_name=collection_name).iter_records(
+            text=q, page_size=search_limit, cursor=cursor
+        )
+        return _ndjson_response(
+            TextSearcher.format_hit(record, highlighter) async for record in records
+        )
+    if stream:
+        pages = AsyncTextSearcher(collection_name=collection_name).iter_pages(
+            text=q, page_size=search_limit, highlight=highlight, cursor=cursor
+        )
+        return _ndjson_response(
+            {"results": hits, "cursor": next_cursor}
+            async for hits, next_cursor in pages
+        )
+
+    if search_type == TEXT:
+        searcher = AsyncTextSearcher(collection_name=collection_name)
+    elif search_type == HYBRID:
+        searcher = AsyncHybridSearcher(collection_name=collection_name, fusion=fusion)
+    else:
+        searcher = AsyncNeuralSearcher(collection_name=collection_name)
+
+    if ndjson:
+        # One hit per line, the JSON body of the whole result is never built.
+        next_cursor = None
+        try:
+            if search_type == TEXT:
+                points, next_cursor = await searcher.scroll(
+                    text=q, search_limit=search_limit, cursor=cursor, collapse=collapse
+                )
+                formatter = TextSearcher.format_hits
+            else:
+                points = await searcher.search_points(
+                    text=q, search_limit=search_limit, collapse=collapse
+                )
+                formatter = NeuralSearcher.format_hits
+            hits = await format_hits(formatter, points, q, highlight)
+        except Exception as error:
+            return _search_error(error)
+        response = _ndjson_response(_iterate(hits))
+        if next_cursor is not None:
+            response["X-Next-Cursor"] = next_cursor
+        return response
+
+    start_time = time.time()
+    cache_key = await sync_to_async(result_cache.make_key)(
+        collection_name,
+        q=q,
+        type=search_type,
+        limit=search_limit,
+        fusion=fusion if search_type == HYBRID else None,
+        highlight=highlight,
+        cursor=cursor,
+        collapse=collapse,
+    )
+    cached_response = await sync_to_async(result_cache.get_results)(cache_key)
+    if cached_response is not None:
+        return JsonResponse(
+            {
+                **cached_response,
+                "search_time_seconds": round(time.time() - start_time, 2),
+                "cached": True,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    try:
+        if search_type == TEXT:
+            search_results, next_cursor = await searcher.search_page(
+                text=q,
+                search_limit=search_limit,
+                highlight=highlight,
+                cursor=cursor,
+                collapse=collapse,
+            )
+            cached_response = {"results": search_results, "cursor": next_cursor}
+        else:
+            search_results, start_time = await searcher.search(
+                text=q,
+                search_limit=search_limit,
+                highlight=highlight,
+                collapse=collapse,
+            )
+            cached_response = {"results": search_results}
+        await sync_to_async(result_cache.set_results)(cache_key, cached_response)
+        return JsonResponse(
+            {
+                **cached_response,
+                "search_time_seconds": round(time.time() - start_time, 2),
+                "cached": False,
+            },
+            status=status.HTTP_200_OK,
+        )
+    except Exception as error:
+        return _search_error(error)
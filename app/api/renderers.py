@@ -0,0 +1,26 @@
+"""
+Renderers for the API/REST endpoints.
+"""
+
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Render newline-delimited JSON, one line per item of a list.
+
+    Streamed NDJSON responses bypass the renderer, this makes `format=ndjson`
+    a valid choice for DRF and renders the plain responses (errors) of such
+    requests.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        items = data if isinstance(data, list) else [data]
+        return "".join(json.dumps(item) + "\n" for item in items).encode(self.charset)
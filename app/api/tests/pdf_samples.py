@@ -0,0 +1,80 @@
+"""
+Small PDFs built by hand for the PDF OCR tests.
+"""
+
+
+def build_pdf(pages):
+    """
+    Return the bytes of a PDF with one page per content stream of `pages`,
+    drawn with the standard Helvetica font. `FIGURE` draws a 200x100 figure.
+    """
+    form = b"0 0 200 100 re f"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /XObject /Subtype /Form /BBox [0 0 200 100] /Length %d >>\n"
+        b"stream\n%s\nendstream" % (len(form), form),
+    ]
+    kids = []
+    for content in pages:
+        stream = content.encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> /XObject << /Fm1 4 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(kids),
+        len(kids),
+    )
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return pdf
+
+
+def text(x, y, value, size=12):
+    return f"BT /F1 {size} Tf {x} {y} Td ({value}) Tj ET\n"
+
+
+def table(x, y, rows):
+    """
+    Draw a ruled table with its top left corner at (x, y), one 100x20 cell
+    per value of `rows`.
+    """
+    content = ""
+    for row_num, row in enumerate(rows):
+        top = y - 20 * row_num
+        for col_num, value in enumerate(row):
+            left = x + 100 * col_num
+            content += f"{left} {top - 20} 100 20 re S\n"
+            content += text(left + 5, top - 15, value, size=10)
+    return content
+
+
+FIGURE = "q 1 0 0 1 100 400 cm /Fm1 Do Q\n"
+
+PAGES = [
+    text(72, 700, "Hello page one") + text(72, 680, "Second line"),
+    text(72, 700, "Table below") + table(72, 650, [["Name", "City"], ["Ana", "Cluj"]]),
+]
+
+
+def write_pdf(tmp_path, pages=PAGES):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(build_pdf(pages))
+    return str(path)
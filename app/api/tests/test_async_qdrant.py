@@ -0,0 +1,53 @@
+import asyncio
+
+from qdrant_client import AsyncQdrantClient, models
+
+from api.utils.async_qdrant import (
+    AsyncNeuralSearcher,
+    AsyncQdrantConnection,
+    AsyncTextSearcher,
+)
+
+
+def test_async_insert_search_update(registered_client, fake_vector):
+    vector_name = registered_client.get_vector_field_name()
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        await client.create_collection(
+            "c",
+            vectors_config={
+                vector_name: models.VectorParams(
+                    size=len(fake_vector), distance=models.Distance.COSINE
+                )
+            },
+        )
+        qdrant = AsyncQdrantConnection(client=client)
+        assert await qdrant.insert_vector(
+            "c", {"city": "Chicago"}, [{"companyID": "1"}]
+        )
+
+        text_hits, _ = await AsyncTextSearcher("c", client=client).search("Chicago")
+        neural_hits, _ = await AsyncNeuralSearcher("c", client=client).search("Chicago")
+        point_id = await qdrant.upsert_vector(
+            "c", {"companyID": "1"}, {"city": "Chicago"}, [{"companyID": "1"}]
+        )
+        assert (await client.count("c")).count == 1
+        assert (await client.retrieve("c", [point_id]))[0].payload["companyID"] == "1"
+        return text_hits, neural_hits
+
+    text_hits, neural_hits = asyncio.run(scenario())
+    assert text_hits == [{"companyID": "1"}]
+    assert neural_hits[0]["data"] == {"companyID": "1"}
+
+
+def test_async_insert_creates_a_missing_collection(registered_client):
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        qdrant = AsyncQdrantConnection(client=client)
+        inserted = await qdrant.insert_vector(
+            "missing", {"city": "Chicago"}, [{"companyID": "1"}]
+        )
+        return inserted, (await client.count("missing")).count
+
+    assert asyncio.run(scenario()) == (True, 1)
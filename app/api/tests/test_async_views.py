@@ -0,0 +1,219 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from django.test import AsyncClient
+from qdrant_client import AsyncQdrantClient, models
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.utils import async_qdrant, client_registry, result_cache
+from api.utils.hybrid_search import sparse_vector_params
+from api.utils.qdrant_connection import _hybrid_collections
+
+HEADERS = {"Authorization": "Token secret"}
+# Long enough to be stored as several chunks
+LONG_TEXT = "Chicago music " * 200
+
+
+class FakeSparseEmbedding:
+    def __init__(self, text):
+        self.indices = np.array([0])
+        self.values = np.array([float(len(text))])
+
+
+class FakeSparseModel:
+    def embed(self, documents, batch_size=256):
+        return [FakeSparseEmbedding(text) for text in documents]
+
+    def query_embed(self, query):
+        return self.embed(query)
+
+
+@pytest.fixture
+def client(registered_client, monkeypatch):
+    """
+    `registered_client` for the embedding, with a fake sparse model, and a
+    token authentication accepting "secret" without a database.
+    """
+
+    def authenticate_credentials(self, key):
+        if key != "secret":
+            raise AuthenticationFailed("Invalid token.")
+        return SimpleNamespace(is_authenticated=True), key
+
+    monkeypatch.setattr(
+        TokenAuthentication, "authenticate_credentials", authenticate_credentials
+    )
+    monkeypatch.setattr(
+        registered_client,
+        "_get_or_init_sparse_model",
+        lambda model_name: FakeSparseModel(),
+    )
+    result_cache.get_cache().clear()
+    _hybrid_collections.clear()
+    yield registered_client
+    _hybrid_collections.clear()
+
+
+def run(monkeypatch, scenario):
+    """
+    Run `scenario(async_client)` with an in-memory hybrid collection "c" as
+    the async client of the views.
+    """
+
+    async def main():
+        async_client = AsyncQdrantClient(":memory:")
+        await async_client.create_collection(
+            "c",
+            vectors_config={
+                async_client.get_vector_field_name(): models.VectorParams(
+                    size=384, distance=models.Distance.COSINE
+                )
+            },
+            sparse_vectors_config=sparse_vector_params(),
+        )
+        monkeypatch.setattr(async_qdrant, "get_async_client", lambda: async_client)
+        return await scenario(async_client)
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("path", ["/api/async/insert-data/", "/api/async/update-data/"])
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Token wrong"}])
+def test_async_writes_require_a_token(client, path, headers):
+    response = asyncio.run(
+        AsyncClient().post(
+            path,
+            {"collection_name": "c"},
+            content_type="application/json",
+            headers=headers,
+        )
+    )
+    assert response.status_code == 401
+
+
+def test_async_insert_update_and_search(client, monkeypatch):
+    # The sync client is built on the first request, off the event loop.
+    build_threads = []
+
+    def build_client():
+        build_threads.append(threading.current_thread().name)
+        return client
+
+    monkeypatch.setattr(client_registry, "_build_client", build_client)
+
+    async def scenario(async_client):
+        api_client = AsyncClient()
+        inserted = await api_client.post(
+            "/api/async/insert-data/",
+            {
+                "collection_name": "c",
+                "data": {"city": "Chicago"},
+                "payload": [{"companyID": "1"}],
+            },
+            content_type="application/json",
+            headers=HEADERS,
+        )
+        updated = await api_client.post(
+            "/api/async/update-data/",
+            {
+                "collection_name": "c",
+                "filter_conditions": {"companyID": "1"},
+                "data": {"city": "Chicago"},
+                "payload": [{"companyID": "1", "name": "one"}],
+            },
+            content_type="application/json",
+            headers=HEADERS,
+        )
+        searches = {
+            search_type: await api_client.get(
+                "/api/async/search/",
+                {"q": "Chicago", "collection_name": "c", "type": search_type},
+            )
+            for search_type in ("text", "neural", "hybrid")
+        }
+        return inserted, updated, searches, (await async_client.count("c")).count
+
+    inserted, updated, searches, count = run(monkeypatch, scenario)
+    assert len(build_threads) == 1
+    assert build_threads[0].startswith("embedding")
+    assert inserted.status_code == 201
+    assert updated.status_code == 200
+    assert updated.json()["SUCCESS"] == [{"companyID": "1", "name": "one"}]
+    assert count == 1
+    for response in searches.values():
+        assert response.status_code == 200
+    assert searches["text"].json()["results"] == [{"companyID": "1", "name": "one"}]
+    for search_type in ("neural", "hybrid"):
+        (hit,) = searches[search_type].json()["results"]
+        assert hit["data"] == {"companyID": "1", "name": "one"}
+
+
+async def hit_count(response):
+    if response["Content-Type"] == "application/x-ndjson":
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        return len(body.decode().splitlines())
+    return len(response.json()["results"])
+
+
+def test_async_search_collapse_and_ndjson(client, monkeypatch):
+    async def scenario(async_client):
+        api_client = AsyncClient()
+        await api_client.post(
+            "/api/async/insert-data/",
+            {
+                "collection_name": "c",
+                "data": {"pdfText1": LONG_TEXT},
+                "payload": [{"companyID": "1"}],
+            },
+            content_type="application/json",
+            headers=HEADERS,
+        )
+        counts = {}
+        for search_type in ("text", "neural", "hybrid"):
+            for response_format in ("json", "ndjson"):
+                for collapse in ("0", "1"):
+                    response = await api_client.get(
+                        "/api/async/search/",
+                        {
+                            "q": "Chicago",
+                            "collection_name": "c",
+                            "type": search_type,
+                            "format": response_format,
+                            "collapse": collapse,
+                        },
+                    )
+                    assert response.status_code == 200
+                    counts[search_type, response_format, collapse] = await hit_count(
+                        response
+                    )
+        return counts, (await async_client.count("c")).count
+
+    counts, chunks = run(monkeypatch, scenario)
+    assert chunks > 1
+    for (_, _, collapse), count in counts.items():
+        assert count == (1 if collapse == "1" else chunks)
+
+
+def test_async_hybrid_search_of_a_dense_collection(client, monkeypatch):
+    async def scenario(async_client):
+        await async_client.create_collection(
+            "d",
+            vectors_config={
+                async_client.get_vector_field_name(): models.VectorParams(
+                    size=384, distance=models.Distance.COSINE
+                )
+            },
+        )
+        return await AsyncClient().get(
+            "/api/async/search/",
+            {"q": "Chicago", "collection_name": "d", "type": "hybrid"},
+        )
+
+    response = run(monkeypatch, scenario)
+    assert response.status_code == 400
+    assert "no sparse vectors" in response.json()["error"]
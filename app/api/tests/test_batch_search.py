@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+
+from api.utils import client_registry
+from api.utils.batch_search import batch_search
+from api.utils.hybrid_search import HybridSearcher
+from api.utils.neural_search import query_embedding_cache
+
+VECTORS = {"chicago": [1.0, 0.0], "angels": [0.0, 1.0]}
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def query_embed(self, query):
+        self.calls.append(list(query))
+        for text in query:
+            yield np.array(VECTORS[text])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    local_client = QdrantClient(":memory:")
+    model = FakeModel()
+    local_client._get_or_init_model = lambda model_name: model
+    vector_name = local_client.get_vector_field_name()
+    for collection_name in ("a", "b"):
+        local_client.create_collection(
+            collection_name,
+            vectors_config={
+                vector_name: models.VectorParams(
+                    size=2, distance=models.Distance.COSINE
+                )
+            },
+        )
+        local_client.upsert(
+            collection_name,
+            [
+                models.PointStruct(
+                    id=1,
+                    vector={vector_name: [1.0, 0.0]},
+                    payload={
+                        "document": "chicago angels",
+                        "name": f"{collection_name}1",
+                    },
+                ),
+                models.PointStruct(
+                    id=2,
+                    vector={vector_name: [0.0, 1.0]},
+                    payload={"document": "angels", "name": f"{collection_name}2"},
+                ),
+            ],
+        )
+    client_registry.reset()
+    monkeypatch.setattr(client_registry, "_build_client", lambda: local_client)
+    query_embedding_cache.clear()
+    yield local_client
+    client_registry.reset()
+    query_embedding_cache.clear()
+
+
+def test_batch_search_keeps_request_order(client):
+    queries = [
+        {"q": "angels", "collection_name": "a", "type": "text", "limit": 10},
+        {"q": "chicago", "collection_name": "a", "type": "neural", "limit": 1},
+        {"q": "angels", "collection_name": "b", "type": "neural", "limit": 1},
+        {"q": "angels", "collection_name": "a", "type": "neural", "limit": 1},
+        {"q": "angels", "collection_name": "missing", "type": "text", "limit": 1},
+    ]
+    responses = batch_search(queries)
+
+    assert len(responses[0]["results"]) == 2
+    assert responses[1]["results"][0]["data"] == {"name": "a1"}
+    assert responses[2]["results"][0]["data"] == {"name": "b2"}
+    assert responses[3]["results"][0]["data"] == {"name": "a2"}
+    assert "error" in responses[4]
+    # All neural queries share one model call.
+    assert client._get_or_init_model(None).calls == [["chicago", "angels"]]
+
+
+def test_sparse_embedding_failure_only_fails_hybrid_queries(client, monkeypatch):
+    def fail(self, texts):
+        raise RuntimeError("no sparse model")
+
+    monkeypatch.setattr(HybridSearcher, "embed_sparse_queries", fail)
+    responses = batch_search(
+        [
+            {"q": "chicago", "collection_name": "a", "type": "hybrid", "limit": 1},
+            {"q": "angels", "collection_name": "b", "type": "neural", "limit": 1},
+        ]
+    )
+
+    assert "no sparse model" in responses[0]["error"]
+    assert responses[1]["results"][0]["data"] == {"name": "b2"}
@@ -0,0 +1,58 @@
+from api.utils.bulk_insert import batched, bulk_insert, parse_ndjson
+
+
+class FakeConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def insert_vectors(self, collection_name, documents, payloads, batch_size=64):
+        self.calls.append((collection_name, documents, payloads))
+        return not self.fail
+
+
+LINES = [
+    b'{"payload": {"companyID": 1}, "data": {"name": "one"}}\n',
+    b"\n",
+    b"not json\n",
+    b'{"payload": [{"companyID": 3}], "data": "three"}\n',
+    b'{"payload": {"companyID": 4}}\n',
+    b'{"data": "five"}\n',
+]
+
+
+def test_parse_ndjson():
+    parsed = list(parse_ndjson(LINES))
+    assert [line for line, _, _ in parsed] == [1, 3, 4, 5, 6]
+    assert parsed[0][1] == {"payload": {"companyID": 1}, "data": {"name": "one"}}
+    assert parsed[1][2].startswith("Invalid JSON")
+    assert parsed[2][1]["payload"] == {"companyID": 3}
+    assert parsed[3][1] is None
+    assert parsed[4][1] == {"payload": {}, "data": "five"}
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_bulk_insert_batches_and_reports_per_line():
+    qdrant = FakeConnection()
+    results = list(bulk_insert(qdrant, "c", LINES, batch_size=2))
+    assert [result["line"] for result in results] == [1, 3, 4, 5, 6]
+    assert [("error" in result) for result in results] == [
+        False,
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert [call[1] for call in qdrant.calls] == [
+        [{"name": "one"}],
+        ["three"],
+        ["five"],
+    ]
+
+
+def test_bulk_insert_failed_batch():
+    results = list(bulk_insert(FakeConnection(fail=True), "c", LINES[:1], 10))
+    assert results == [{"line": 1, "error": "Failed to insert data"}]
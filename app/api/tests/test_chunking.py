@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from api.utils.chunking import chunk_document, chunk_point_ids, split_text
+from api.utils.neural_search import NeuralSearcher
+from api.utils.qdrant_connection import point_id_for
+
+LONG_TEXT = " ".join(f"word{i}" for i in range(600))
+
+
+def test_split_text_respects_size_and_overlap():
+    chunks = list(split_text(LONG_TEXT, size=100, overlap=20))
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks[0].split()[-2:]) == " ".join(chunks[1].split()[:2])
+    assert chunks[-1].endswith("word599")
+    assert list(split_text("short", size=100, overlap=20)) == ["short"]
+
+
+def test_chunk_document_splits_long_fields():
+    document = {"name": "Hyde Park", "pdfText1": LONG_TEXT}
+    assert chunk_document({"name": "Hyde Park"}) == [json.dumps({"name": "Hyde Park"})]
+    chunks = [json.loads(chunk) for chunk in chunk_document(document, 1000, 200)]
+    assert chunks[0] == {"name": "Hyde Park"}
+    assert all(list(chunk) == ["pdfText1"] for chunk in chunks[1:])
+    assert len(chunks) > 2
+    assert chunk_document(document, 0, 0) == [json.dumps(document)]
+
+
+def test_chunk_point_ids_are_derived_from_the_parent():
+    parent_id = point_id_for({"companyID": "1"})
+    ids = list(chunk_point_ids(parent_id, 3))
+    assert ids[0] == parent_id
+    assert ids == list(chunk_point_ids(parent_id, 3))
+    assert len(set(ids)) == 3
+
+
+@pytest.fixture
+def client(registered_client, monkeypatch):
+    # One vector per chunk length, so the chunks of a document differ.
+    monkeypatch.setattr(
+        registered_client,
+        "_embed_documents",
+        lambda documents, **kwargs: (
+            (doc, [1.0, float(len(doc))] + [0.0] * 382) for doc in documents
+        ),
+    )
+    return registered_client
+
+
+def test_chunks_are_stored_and_collapsed(client, qdrant):
+    documents = [{"name": "one", "pdfText1": LONG_TEXT}, {"name": "two"}]
+    assert qdrant.insert_vectors("c", documents, [{"n": 1}, {"n": 2}])
+    records, _ = client.scroll("c", limit=100)
+    assert len(records) > 3
+    assert len({record.payload["parent_id"] for record in records}) == 2
+
+    searcher = NeuralSearcher("c", client=client)
+    hits, _ = searcher.search("one", filter_={}, search_limit=10, collapse=True)
+    assert sorted(hit["data"]["n"] for hit in hits) == [1, 2]
+    hits, _ = searcher.search("one", filter_={}, search_limit=10)
+    assert len(hits) == len(records)
+
+
+def test_update_removes_leftover_chunks(client, qdrant):
+    conditions = {"companyID": "1"}
+    payload = [{"companyID": "1"}]
+    point_id = qdrant.upsert_vector("c", conditions, {"pdfText1": LONG_TEXT}, payload)
+    assert client.count("c").count > 1
+    assert qdrant.upsert_vector("c", conditions, {"pdfText1": "short"}, payload)
+    records, _ = client.scroll("c", limit=100)
+    assert [record.id for record in records] == [point_id]
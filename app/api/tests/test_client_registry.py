@@ -0,0 +1,33 @@
+from api.utils import client_registry
+from api.utils.qdrant_connection import QdrantConnection
+from api.utils.text_search import TextSearcher
+from api.utils.neural_search import NeuralSearcher
+
+
+def test_client_is_built_once(monkeypatch):
+    built = []
+
+    def fake_build():
+        built.append(object())
+        return built[-1]
+
+    client_registry.reset()
+    monkeypatch.setattr(client_registry, "_build_client", fake_build)
+
+    first = QdrantConnection().client
+    assert TextSearcher(collection_name="c").client is first
+    assert NeuralSearcher(collection_name="c").client is first
+    assert QdrantConnection().client is first
+    assert len(built) == 1
+
+    client_registry.reset()
+
+
+def test_warm_up_only_runs_when_enabled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(client_registry, "initialize", lambda: calls.append(1))
+    monkeypatch.setattr(client_registry, "QDRANT_WARMUP_ON_STARTUP", False)
+    client_registry.warm_up()
+    monkeypatch.setattr(client_registry, "QDRANT_WARMUP_ON_STARTUP", True)
+    client_registry.warm_up()
+    assert calls == [1]
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from api.utils import embedding_store
+from api.utils.embedding_store import EmbeddingStore, embed_documents
+
+
+class FakeClient:
+    embedding_model_name = "fake-model"
+
+    def __init__(self):
+        self.embedded = []
+
+    def _embed_documents(self, documents, **kwargs):
+        for document in documents:
+            self.embedded.append(document)
+            yield document, [float(len(document)), 0.5]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"), max_entries=3)
+    monkeypatch.setattr(embedding_store, "_store", store)
+    return store
+
+
+def test_store_round_trip_and_stats(store):
+    store.set_many("m", ["a", "bb"], [[1.0, 2.0], [3.0, 4.0]])
+    assert store.get_many("m", ["a", "bb", "c"]) == [[1.0, 2.0], [3.0, 4.0], None]
+    assert store.get_many("other-model", ["a"]) == [None]
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 2)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_store_is_shared_and_capped(store, monkeypatch):
+    monkeypatch.setattr(embedding_store, "TOUCH_INTERVAL", 0)
+    monkeypatch.setattr(embedding_store, "EVICT_FRACTION", 0)
+    for text in ("a", "b", "c"):
+        store.set_many("m", [text], [[float(ord(text))]])
+        time.sleep(0.01)
+    store.get_many("m", ["a"])
+    time.sleep(0.01)
+    store.set_many("m", ["d"], [[4.0]])
+    assert len(store) == 3
+    # Another connection (another worker) sees the same rows, "b" was the
+    # least recently used and was evicted.
+    other = EmbeddingStore(store.path, max_entries=3)
+    assert other.get_many("m", ["a", "b", "c", "d"]) == [[97.0], None, [99.0], [4.0]]
+
+
+def test_reads_and_writes_skip_the_write_work_when_they_can(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"), max_entries=10)
+    statements = []
+    store._connection().set_trace_callback(statements.append)
+
+    def run(statement_type, function, *args):
+        statements.clear()
+        function(*args)
+        return sum(sql.startswith(statement_type) for sql in statements)
+
+    texts = [str(i) for i in range(11)]
+    assert run("SELECT COUNT", store.set_many, "m", texts, [[1.0]] * 11) == 1
+    # Evicted down to 9 vectors, the next write fits without counting.
+    assert len(store) == 9
+    assert run("SELECT COUNT", store.set_many, "m", ["a"], [[1.0]]) == 0
+    assert run("SELECT COUNT", store.set_many, "m", ["b"], [[1.0]]) == 1
+    # Vectors used within TOUCH_INTERVAL are read without a write.
+    assert run("UPDATE", store.get_many, "m", ["a", "b"]) == 0
+
+
+def test_embed_documents_only_embeds_misses(store):
+    client = FakeClient()
+    first = embed_documents(client, ["one", "three"])
+    second = embed_documents(client, ["three", "four"])
+    assert client.embedded == ["one", "three", "four"]
+    assert first[1] == second[0] == ("three", [5.0, 0.5])
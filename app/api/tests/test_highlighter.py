@@ -0,0 +1,39 @@
+import json
+
+from api.utils.highlighter import Highlighter, document_text, get_highlighter
+from api.utils.text_search import TextSearcher
+
+
+def test_highlight_single_pass():
+    highlighter = Highlighter("Chicago angels")
+    assert (
+        highlighter.highlight("An angel & Angels in CHICAGO.")
+        == "An <b>angel</b> &amp; <b>Angels</b> in <b>CHICAGO</b>."
+    )
+    assert highlighter.highlight("Los Angeles") == "Los Angeles"
+
+
+def test_snippets_are_bounded_and_disjoint():
+    highlighter = Highlighter("angels", snippet_size=40, max_snippets=2)
+    text = "Hyde Park Angels is the largest angel group. " * 20
+    snippets = highlighter.snippets(text)
+    assert len(snippets) == 2
+    assert all(len(snippet) <= 2 * 40 + 40 for snippet in snippets)
+    assert all("<b>" in snippet for snippet in snippets)
+    assert snippets[0].endswith("…")
+    assert Highlighter("missing").snippets(text) == []
+    assert Highlighter("").snippets(text) == []
+
+
+def test_document_text_flattens_json():
+    document = json.dumps({"name": "Hyde Park", "tags": ["a", {"city": "Chicago"}]})
+    assert document_text(document) == "Hyde Park\na\nChicago"
+    assert document_text("plain text") == "plain text"
+    assert document_text(None) == ""
+
+
+def test_text_searcher_highlight_uses_the_query():
+    searcher = TextSearcher(collection_name="c", client=object())
+    record = searcher.highlight({"document": "music in Chicago"}, "chicago")
+    assert record["document"] == "music in <b>Chicago</b>"
+    assert get_highlighter("chicago") is get_highlighter("chicago")
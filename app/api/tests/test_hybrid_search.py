@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from qdrant_client import models
+from rest_framework.test import APIClient
+
+from api.utils.batch_search import batch_search
+from api.utils.hybrid_search import HybridSearcher, sparse_vector_name
+from api.utils.qdrant_connection import QdrantConnection, _hybrid_collections
+
+WORDS = ["chicago", "angels", "music"]
+
+
+class FakeSparseEmbedding:
+    def __init__(self, text):
+        self.indices = np.array(
+            [i for i, word in enumerate(WORDS) if word in text.lower()]
+        )
+        self.values = np.ones(len(self.indices))
+
+
+class FakeSparseModel:
+    def embed(self, documents, batch_size=256):
+        return [FakeSparseEmbedding(text) for text in documents]
+
+    def query_embed(self, query):
+        return self.embed(query)
+
+
+def dense_vector(text):
+    vector = [0.1] + [float(word in text.lower()) for word in WORDS]
+    return vector + [0.0] * (384 - len(vector))
+
+
+class FakeDenseModel:
+    def query_embed(self, query):
+        for text in query:
+            yield np.array(dense_vector(text))
+
+
+@pytest.fixture
+def client(registered_client, monkeypatch):
+    monkeypatch.setattr(
+        registered_client, "_get_or_init_model", lambda model_name: FakeDenseModel()
+    )
+    monkeypatch.setattr(
+        registered_client,
+        "_get_or_init_sparse_model",
+        lambda model_name: FakeSparseModel(),
+    )
+    monkeypatch.setattr(
+        registered_client,
+        "_embed_documents",
+        lambda documents, **kwargs: ((doc, dense_vector(doc)) for doc in documents),
+    )
+    _hybrid_collections.clear()
+    yield registered_client
+    _hybrid_collections.clear()
+
+
+def test_hybrid_collection_insert_and_search(client):
+    qdrant = QdrantConnection()
+    assert qdrant.create_collection("h", 384, hybrid=True) is None
+    assert qdrant.is_hybrid("h")
+    assert qdrant.insert_vector("h", {"text": "Chicago angels"}, [{"name": "one"}])
+    assert qdrant.insert_vectors(
+        "h",
+        [{"text": "music"}, {"text": "other"}],
+        [{"name": "two"}, {"name": "three"}],
+    )
+    record = client.scroll("h", with_vectors=True)[0][0]
+    assert sparse_vector_name() in record.vector
+
+    hits, _ = HybridSearcher("h", fusion="rrf").search("music", search_limit=3)
+    assert hits[0]["data"] == {"name": "two"}
+    hits, _ = HybridSearcher("h").search("angels", search_limit=3)
+    assert hits[0]["data"] == {"name": "one"}
+    request = HybridSearcher("h", fusion="dbsf").build_requests([{"q": "angels"}])[0]
+    assert request.query.fusion == models.Fusion.DBSF
+    assert [prefetch.using for prefetch in request.prefetch] == [
+        client.get_vector_field_name(),
+        sparse_vector_name(),
+    ]
+
+    responses = batch_search(
+        [
+            {"q": "music", "collection_name": "h", "type": "hybrid", "limit": 1},
+            {"q": "angels", "collection_name": "h", "type": "hybrid", "limit": 1},
+        ]
+    )
+    assert [response["results"][0]["data"]["name"] for response in responses] == [
+        "two",
+        "one",
+    ]
+
+
+def test_dense_collection_is_not_hybrid(client):
+    qdrant = QdrantConnection()
+    qdrant.create_collection("d", 384)
+    assert not qdrant.is_hybrid("d")
+    assert not qdrant.is_hybrid("missing")
+
+
+def test_unknown_fusion(client):
+    with pytest.raises(ValueError):
+        HybridSearcher("h", fusion="max")
+
+
+@pytest.mark.parametrize("response_format", ["json", "ndjson"])
+def test_hybrid_search_of_a_dense_collection(client, response_format):
+    QdrantConnection().create_collection("d", 384)
+    response = APIClient().get(
+        "/api/search/",
+        {"q": "music", "collection_name": "d", "type": "hybrid"},
+        HTTP_ACCEPT="application/x-ndjson" if response_format == "ndjson" else "*/*",
+    )
+    assert response.status_code == 400
+    assert "no sparse vectors" in response.data["error"]
+
+
+@pytest.mark.parametrize(
+    "value, hybrid", [(True, True), ("true", True), ("false", False), ("0", False)]
+)
+def test_create_collection_hybrid_flag(client, value, hybrid):
+    api_client = APIClient()
+    api_client.force_authenticate(SimpleNamespace(is_authenticated=True, id=1))
+    response = api_client.post(
+        "/api/create-namespace/",
+        {"collection_name": "n", "hybrid": value},
+        format="json",
+    )
+    assert response.status_code == 201
+    assert QdrantConnection().is_hybrid("1_n") is hybrid
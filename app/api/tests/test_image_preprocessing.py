@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from api.utils import image_preprocessing
+
+
+def text_lines(width=600, height=400):
+    """
+    Black 4-pixel lines every 40 rows on white, like lines of text.
+    """
+    pixels = np.full((height, width), 255, dtype=np.uint8)
+    for top in range(40, height - 40, 40):
+        pixels[top : top + 4, 50 : width - 50] = 0
+    return pixels
+
+
+def test_grayscale_and_downscale():
+    rgb = np.zeros((4, 6, 3), dtype=np.uint8)
+    rgb[..., 0] = 255
+    gray = image_preprocessing.grayscale(rgb)
+    assert gray.shape == (4, 6) and (gray == 76).all()
+
+    pixels = np.arange(36, dtype=np.uint8).reshape(6, 6)
+    assert image_preprocessing.downscale(pixels, 600, 300).tolist()[0] == [3, 5, 7]
+    assert image_preprocessing.downscale(pixels, 300, 300) is pixels
+    assert image_preprocessing.downscale(pixels, 300, 0) is pixels
+    # The default PDF_OCR_DPI to the default OCR_PREPROCESS_DPI
+    flat = np.full((200, 400), 100, dtype=np.uint8)
+    scaled = image_preprocessing.downscale(flat, 200, 150)
+    assert scaled.shape == (150, 300) and (scaled == 100).all()
+
+
+@pytest.mark.parametrize("angle", [-3.0, 0.0, 2.0])
+def test_deskew_angle(angle):
+    image = Image.fromarray(text_lines()).rotate(
+        angle, resample=Image.BILINEAR, expand=True, fillcolor=255
+    )
+    assert image_preprocessing.deskew_angle(np.asarray(image)) == pytest.approx(
+        angle, abs=0.25
+    )
+
+
+def test_binarize_follows_the_local_background():
+    # Dark text on a background that gets darker from left to right
+    background = np.linspace(250, 120, 300).astype(np.uint8)
+    pixels = np.tile(background, (100, 1))
+    pixels[40:44, :] -= 100
+    binary = image_preprocessing.binarize(pixels, 21)
+    assert set(np.unique(binary)) == {0, 255}
+    assert (binary[40:44, 10:-10] == 0).all()
+    assert (binary[10:30] == 255).all() and (binary[60:90] == 255).all()
+
+
+def test_preprocess_records_the_steps(monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "_timings", {})
+    monkeypatch.setattr(image_preprocessing, "OCR_PREPROCESS_DPI", 300)
+    image = (
+        Image.fromarray(text_lines(1200, 800))
+        .convert("RGB")
+        .rotate(2, expand=True, fillcolor="white")
+    )
+    image.info["dpi"] = (600, 600)
+    result, timings = image_preprocessing.preprocess(image)
+    assert list(timings) == ["grayscale", "downscale", "deskew", "binarize"]
+    assert result.mode == "L" and result.info["dpi"] == (300, 300)
+    assert result.width < image.width
+    assert image_preprocessing.timing_stats()["deskew"]["images"] == 1
+
+    monkeypatch.setattr(image_preprocessing, "OCR_PREPROCESS_DESKEW", False)
+    monkeypatch.setattr(image_preprocessing, "OCR_PREPROCESS_BINARIZE", False)
+    _, timings = image_preprocessing.preprocess(image)
+    assert list(timings) == ["grayscale", "downscale"]
+
+
+def test_timings_of_other_processes_add_up(monkeypatch):
+    monkeypatch.setattr(image_preprocessing, "_timings", {})
+    image_preprocessing.add_timings({"deskew": {"images": 2, "seconds": 0.5}})
+    image_preprocessing.add_timings({"deskew": {"images": 1, "seconds": 0.25}})
+    assert image_preprocessing.timing_stats() == {
+        "deskew": {"images": 3, "seconds": 0.75}
+    }
+    image_preprocessing.reset_timings()
+    assert image_preprocessing.timing_stats() == {}
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+from rest_framework.test import APIRequestFactory
+
+from api import views
+from api.utils import client_registry
+from api.utils.neural_search import query_embedding_cache
+
+
+class FakeModel:
+    def query_embed(self, query):
+        for _ in query:
+            yield np.array([1.0, 0.0])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    local_client = QdrantClient(":memory:")
+    local_client._get_or_init_model = lambda model_name: FakeModel()
+    vector_name = local_client.get_vector_field_name()
+    local_client.create_collection(
+        "c",
+        vectors_config={
+            vector_name: models.VectorParams(size=2, distance=models.Distance.COSINE)
+        },
+    )
+    local_client.upsert(
+        "c",
+        [
+            models.PointStruct(
+                id=point_id,
+                vector={vector_name: [1.0, 0.0]},
+                payload={"document": "music in Chicago", "companyID": point_id},
+            )
+            for point_id in range(1, 6)
+        ],
+    )
+    client_registry.reset()
+    monkeypatch.setattr(client_registry, "_build_client", lambda: local_client)
+    query_embedding_cache.clear()
+    yield local_client
+    client_registry.reset()
+    query_embedding_cache.clear()
+
+
+def search(**params):
+    request = APIRequestFactory().get(
+        "/api/search/", {"q": "Chicago", "collection_name": "c", **params}
+    )
+    response = views.search_in_vector_database(request)
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    return response, [json.loads(line) for line in lines]
+
+
+def test_text_search_streams_one_hit_per_line(client):
+    response, hits = search(format="ndjson", limit=2, highlight=1)
+    assert [hit["companyID"] for hit in hits] == [1, 2]
+    assert hits[0]["highlight"] == ["music in <b>Chicago</b>"]
+    _, hits = search(format="ndjson", limit=2, cursor=response["X-Next-Cursor"])
+    assert [hit["companyID"] for hit in hits] == [3, 4]
+
+
+def test_neural_search_streams_scored_hits(client):
+    _, hits = search(format="ndjson", type="neural", limit=3)
+    assert len(hits) == 3
+    assert set(hits[0]) == {"score", "data"}
+
+
+def test_stream_exports_every_hit(client):
+    _, hits = search(format="ndjson", stream=1, limit=2)
+    assert [hit["companyID"] for hit in hits] == [1, 2, 3, 4, 5]
@@ -0,0 +1,121 @@
+import sqlite3
+import time
+from unittest import mock
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+
+from api.utils import ocr_cache, pdf_pool, pdfhandler
+from api.utils.ocr_cache import OCRResultCache
+from pdf_samples import PAGES, build_pdf, write_pdf
+
+OPTIONS = {"dpi": 200}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = OCRResultCache(str(tmp_path / "ocr_cache.sqlite3"))
+    monkeypatch.setattr(pdf_pool, "get_ocr_cache", lambda: cache)
+    return cache
+
+
+def test_pages_are_cached_by_file_and_options(cache):
+    cache.set_page_count("abc", 3)
+    cache.set_page("abc", OPTIONS, 0, [["first"]])
+    cache.set_page("abc", OPTIONS, 2, [["third"]])
+    assert cache.page_count("abc") == 3
+    assert cache.page_count("def") is None
+    assert cache.get_pages("abc", OPTIONS, [0, 1, 2]) == {
+        0: [["first"]],
+        2: [["third"]],
+    }
+    assert cache.get_pages("abc", {"dpi": 300}, [0, 1, 2]) == {}
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_least_recently_used_pages_are_evicted(cache, monkeypatch):
+    monkeypatch.setattr(ocr_cache, "EVICT_FRACTION", 0)
+    # Room for three pages of 11 bytes
+    cache.max_bytes = 35
+    cache.set_page_count("abc", 3)
+    for page_number in range(3):
+        cache.set_page("abc", OPTIONS, page_number, [["x" * 5]])
+        time.sleep(0.01)
+    cache.get_pages("abc", OPTIONS, [0])
+    time.sleep(0.01)
+    cache.set_page("abc", OPTIONS, 3, [["x" * 5]])
+    assert sorted(cache.get_pages("abc", OPTIONS, [0, 1, 2, 3])) == [0, 2, 3]
+    assert cache.size() <= 35
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.page_count("abc") is None
+
+
+def test_writes_and_lookups_stay_cheap(cache):
+    # 100 pages of 11 bytes
+    cache.max_bytes = 1000
+    statements = []
+    cache._connection().set_trace_callback(statements.append)
+    for page_number in range(100):
+        cache.set_page("abc", OPTIONS, page_number, [["x" * 5]])
+    # Summed on the first write, then once when the estimate went over the
+    # cap: the 10 oldest pages were evicted, leaving room for the others.
+    assert sum("TOTAL(size)" in sql for sql in statements) == 2
+    assert cache.size() == 990
+
+    statements.clear()
+    assert len(cache.get_pages("abc", OPTIONS, list(range(1200)))) == 90
+    assert sum(sql.startswith("SELECT page_number") for sql in statements) == 3
+
+
+def test_failing_cache_falls_back_to_extraction(tmp_path, cache, monkeypatch):
+    path = write_pdf(tmp_path)
+    expected = pdf_pool.extract_document(path)
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "set_page", locked)
+    assert pdf_pool.extract_document(path, file_hash="abc") == expected
+    monkeypatch.setattr(cache, "page_count", locked)
+    assert pdf_pool.extract_document(path, file_hash="abc") == expected
+
+
+def test_cached_document_is_not_opened(tmp_path, cache):
+    path = write_pdf(tmp_path)
+    result = pdf_pool.extract_document(path, file_hash="abc")
+    assert cache.page_count("abc") == 2
+    with mock.patch.object(pdfhandler.pdfplumber, "open") as opened:
+        assert pdf_pool.extract_document(path, file_hash="abc") == result
+        assert pdf_pool.extract_document(path, pages=[(2, 2)], file_hash="abc") == {
+            "Page_2": result["Page_2"]
+        }
+    opened.assert_not_called()
+
+
+def test_only_missing_pages_are_extracted(tmp_path, cache):
+    path = write_pdf(tmp_path)
+    first = pdf_pool.extract_document(path, pages=[(2, 2)], file_hash="abc")
+    with mock.patch.object(
+        pdf_pool, "extract_pages", wraps=pdfhandler.extract_pages
+    ) as extracted:
+        result = pdf_pool.extract_document(path, file_hash="abc")
+    assert extracted.call_args.args[2] == [0]
+    assert list(result) == ["Page_1", "Page_2"]
+    assert result["Page_2"] == first["Page_2"]
+
+
+def test_ocr_endpoint_reuses_cached_results(cache):
+    client = APIClient()
+    responses = [
+        client.post(
+            "/pdf-ocr-api/ocr/",
+            {"file": SimpleUploadedFile("document.pdf", build_pdf(PAGES))},
+            format="multipart",
+        )
+        for _ in range(2)
+    ]
+    assert responses[0].json() == responses[1].json()
+    assert (cache.hits, cache.misses) == (2, 0)
@@ -0,0 +1,67 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from api.utils import ocr_engine
+from pdf_samples import FIGURE, text, write_pdf
+from pdfocrapi.views import OCRView
+
+
+class FakeAPI:
+    created = 0
+
+    def __init__(self, lang):
+        FakeAPI.created += 1
+        self.image = None
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        # The first figure of the page (the small one) takes the longest
+        width = self.image.size[0]
+        time.sleep(0.2 if width < 1000 else 0)
+        return f"{width} pixels wide"
+
+    def End(self):
+        pass
+
+
+def test_each_thread_keeps_its_engine(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "tesserocr", SimpleNamespace(PyTessBaseAPI=FakeAPI))
+    monkeypatch.setattr(ocr_engine, "_local", threading.local())
+    FakeAPI.created = 0
+    engines = []
+
+    def use_engine():
+        engines.extend([ocr_engine.get_engine(), ocr_engine.get_engine()])
+
+    for _ in range(2):
+        thread = threading.Thread(target=use_engine)
+        thread.start()
+        thread.join()
+    assert FakeAPI.created == 2
+    assert engines[0] is engines[1] and engines[1] is not engines[2]
+
+
+def test_fallback_to_pytesseract_is_logged_once(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "tesserocr", None)
+    monkeypatch.setattr(ocr_engine, "_fallback_logged", False)
+    warnings = []
+    monkeypatch.setattr(ocr_engine.logger, "warning", warnings.append)
+    ocr_engine.TesseractEngine()
+    ocr_engine.TesseractEngine()
+    assert len(warnings) == 1
+
+
+def test_figures_are_recognized_in_parallel_in_page_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_engine, "tesserocr", SimpleNamespace(PyTessBaseAPI=FakeAPI))
+    monkeypatch.setattr(ocr_engine, "_local", threading.local())
+    large_figure = "q 3 0 0 3 0 20 cm /Fm1 Do Q\n"
+    path = write_pdf(tmp_path, [text(72, 700, "Figures") + FIGURE + large_figure])
+    result = OCRView.pdfworkflow(path)
+    _, _, text_from_images, page_content = result["Page_1"]
+    # The small figure finished last but stays first
+    small, large = (int(line.split()[0]) for line in text_from_images)
+    assert small < large
+    assert page_content == ["Figures\n"] + text_from_images
@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+
+from api.utils import ocr_jobs
+from pdf_samples import PAGES, build_pdf, write_pdf
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ocr_jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_job_records_progress_and_result(tmp_path, store):
+    runner = ocr_jobs.JobRunner(store, workers=1)
+    pdf_path = write_pdf(tmp_path)
+    job_id = runner.submit(pdf_path)
+    runner.join()
+    job = store.get(job_id)
+    assert job["status"] == ocr_jobs.DONE
+    assert (job["pages_done"], job["pages_total"]) == (2, 2)
+    assert list(job["result"]) == ["Page_1", "Page_2"]
+    assert not os.path.exists(pdf_path)
+
+
+def test_failed_job_records_the_error(tmp_path, store):
+    runner = ocr_jobs.JobRunner(store, workers=1)
+    pdf_path = tmp_path / "broken.pdf"
+    pdf_path.write_bytes(b"not a pdf")
+    job_id = runner.submit(str(pdf_path))
+    runner.join()
+    job = store.get(job_id)
+    assert job["status"] == ocr_jobs.FAILED
+    assert job["error"]
+    assert job["result"] is None
+
+
+def test_full_queue_refuses_jobs(tmp_path, store):
+    # No job thread, the first job stays queued
+    runner = ocr_jobs.JobRunner(store, workers=0, queue_size=1)
+    first_job = runner.submit(write_pdf(tmp_path))
+    second_path = tmp_path / "second.pdf"
+    second_path.write_bytes(build_pdf(PAGES))
+    with pytest.raises(ocr_jobs.JobQueueFull):
+        runner.submit(str(second_path))
+    assert store.get(first_job)["status"] == ocr_jobs.QUEUED
+    assert not second_path.exists()
+
+
+def test_expired_jobs_are_purged(store):
+    store.ttl = -1
+    job_id = store.create()
+    store.update(job_id, status=ocr_jobs.DONE, result={})
+    store.purge()
+    assert store.get(job_id) is None
+
+
+def test_jobs_of_a_stopped_process_fail_then_expire(store):
+    # Nothing refreshes the job, as when its process died.
+    store.stale_timeout = -1
+    job_id = store.create()
+    job = store.get(job_id)
+    assert job["status"] == ocr_jobs.FAILED
+    assert job["error"] == ocr_jobs.STALE_ERROR
+    store.ttl = -1
+    store.purge()
+    assert store.get(job_id) is None
+
+
+def test_heartbeat_keeps_waiting_jobs_alive(tmp_path, store):
+    store.stale_timeout = 0.3
+    runner = ocr_jobs.JobRunner(store, workers=0, heartbeat=0.02)
+    job_id = runner.submit(write_pdf(tmp_path))
+    time.sleep(0.6)
+    assert store.get(job_id)["status"] == ocr_jobs.QUEUED
+
+
+def test_async_ocr_endpoint(store, monkeypatch):
+    runner = ocr_jobs.JobRunner(store, workers=1)
+    monkeypatch.setattr(ocr_jobs, "_runner", runner)
+    client = APIClient()
+    upload = SimpleUploadedFile("document.pdf", build_pdf(PAGES))
+    response = client.post(
+        "/pdf-ocr-api/ocr/?async=1", {"file": upload}, format="multipart"
+    )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.json()["status_url"].endswith(f"/pdf-ocr-api/ocr/jobs/{job_id}/")
+    runner.join()
+
+    response = client.get(f"/pdf-ocr-api/ocr/jobs/{job_id}/")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == ocr_jobs.DONE
+    assert (body["pages_done"], body["pages_total"]) == (2, 2)
+    assert body["data"]["Page_2"][2] == ["|Name|City|\n|Ana|Cluj|"]
+    assert client.get("/pdf-ocr-api/ocr/jobs/unknown/").status_code == 404
@@ -0,0 +1,79 @@
+import json
+from types import SimpleNamespace
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+
+from api import views
+from api.utils.pdf_indexing import index_pdf, page_text
+from api.utils.pdf_pool import iter_document
+from api.utils.qdrant_connection import point_id_for
+from pdf_samples import PAGES, build_pdf, write_pdf
+
+
+def test_page_text_joins_the_page_content():
+    assert page_text([]) == ""
+    assert page_text([["a"], ["a ", "|x|", "  "]]) == "a\n|x|"
+
+
+def test_pages_are_indexed_in_batches(tmp_path, qdrant_client, qdrant):
+    path = write_pdf(tmp_path)
+    pages = list(iter_document(path)) + [("Page_3", [])]
+    results = list(index_pdf(qdrant, "c", pages, "abc", {"source": "t"}, 2))
+    assert results == [
+        {"page": 1, "status": "indexed"},
+        {"page": 2, "status": "indexed"},
+        {"page": 3, "status": "empty"},
+    ]
+    record = qdrant_client.retrieve(
+        "c", [point_id_for({"file_hash": "abc", "page": 2})]
+    )
+    assert record[0].payload["source"] == "t"
+    assert "|Name|City|" in record[0].payload["document"]
+
+    # Indexing the same file again overwrites its pages
+    list(index_pdf(qdrant, "c", pages, "abc", batch_size=2))
+    assert qdrant_client.count("c").count == 2
+
+
+def test_reindexing_a_shorter_page_drops_its_old_chunks(qdrant_client, qdrant):
+    long_page = " ".join(f"word{i}" for i in range(600))
+    list(index_pdf(qdrant, "c", [("Page_1", [[long_page]])], "abc"))
+    assert qdrant_client.count("c").count > 1
+
+    assert list(index_pdf(qdrant, "c", [("Page_1", [["short"]])], "abc")) == [
+        {"page": 1, "status": "indexed"}
+    ]
+    records, _ = qdrant_client.scroll("c", limit=100)
+    assert [record.id for record in records] == [
+        point_id_for({"file_hash": "abc", "page": 1})
+    ]
+    assert records[0].payload["document"] == json.dumps({"text": "short"})
+
+
+def test_index_pdf_endpoint(monkeypatch, qdrant_client, qdrant):
+    monkeypatch.setattr(views, "QdrantConnection", lambda: qdrant)
+    api_client = APIClient()
+    api_client.force_authenticate(SimpleNamespace(is_authenticated=True))
+    response = api_client.post(
+        "/api/index-pdf/?collection_name=c&pages=2",
+        {
+            "file": SimpleUploadedFile("document.pdf", build_pdf(PAGES)),
+            "payload": json.dumps({"source": "t"}),
+        },
+        format="multipart",
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.streaming_content]
+    assert lines == [{"page": 2, "status": "indexed"}]
+    (record,) = qdrant_client.scroll("c")[0]
+    assert record.payload["file_name"] == "document.pdf"
+    assert record.payload["page"] == 2
+
+    response = api_client.post(
+        "/api/index-pdf/?collection_name=c&pages=9",
+        {"file": SimpleUploadedFile("document.pdf", build_pdf(PAGES))},
+        format="multipart",
+    )
+    assert "error" in json.loads(next(iter(response.streaming_content)))
+    assert api_client.post("/api/index-pdf/").status_code == 400
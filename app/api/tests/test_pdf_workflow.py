@@ -0,0 +1,190 @@
+import tempfile
+from unittest import mock
+
+import pdfplumber
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api.utils import image_preprocessing, ocr_engine, pdf_pool, pdfhandler
+from pdf_samples import FIGURE, PAGES, build_pdf, text, write_pdf
+from pdfocrapi.views import OCRView
+
+
+def test_pdfworkflow_extracts_text_and_tables(tmp_path):
+    result = OCRView.pdfworkflow(write_pdf(tmp_path))
+    assert list(result) == ["Page_1", "Page_2"]
+    page_text, line_format, page_content = result["Page_1"]
+    assert page_text == ["Hello page one\n", "Second line\n"]
+    assert set(line_format[0]) == {"Helvetica", 12.0}
+    page_text, _, text_from_tables, page_content = result["Page_2"]
+    assert page_text == ["Table below\n", "table"]
+    assert text_from_tables == ["|Name|City|\n|Ana|Cluj|"]
+    assert page_content == ["Table below\n", "|Name|City|\n|Ana|Cluj|"]
+
+
+def test_pdfworkflow_opens_the_document_once(tmp_path):
+    path = write_pdf(tmp_path)
+    with mock.patch.object(
+        pdfhandler.pdfplumber, "open", wraps=pdfplumber.open
+    ) as opened:
+        OCRView.pdfworkflow(path)
+    assert opened.call_count == 1
+
+
+def test_page_ranges():
+    assert pdf_pool.page_ranges(range(5), 2) == [[0, 1], [2, 3], [4]]
+    assert pdf_pool.page_ranges(range(0), 2) == []
+
+
+def test_pdfworkflow_spreads_pages_over_the_process_pool(tmp_path, monkeypatch):
+    pages = [text(72, 700, f"Page number {i}") for i in range(5)]
+    path = write_pdf(tmp_path, pages)
+    monkeypatch.setattr(pdf_pool, "PDF_OCR_WORKERS", 2)
+    monkeypatch.setattr(pdf_pool, "PDF_OCR_PAGES_PER_TASK", 2)
+    try:
+        result = OCRView.pdfworkflow(path)
+        executor = pdf_pool.get_executor()
+        assert OCRView.pdfworkflow(path) == result
+        assert pdf_pool.get_executor() is executor
+    finally:
+        pdf_pool._reset_executor(pdf_pool.get_executor())
+    assert list(result) == [f"Page_{i + 1}" for i in range(5)]
+    assert [content[0] for content in result.values()] == [
+        [f"Page number {i}\n"] for i in range(5)
+    ]
+
+
+def test_worker_ranges_return_their_preprocessing_timings(tmp_path, monkeypatch):
+    path = write_pdf(tmp_path, [text(72, 700, "Logo below") + FIGURE])
+    # The timings of earlier ranges of the worker are not sent again
+    monkeypatch.setattr(image_preprocessing, "_timings", {"deskew": [5, 1.0]})
+    with mock.patch.object(
+        ocr_engine.pytesseract, "image_to_string", return_value="Figure text"
+    ):
+        pages, timings = pdf_pool._extract_range(str(path), [0])
+    assert [key for key, _ in pages] == ["Page_1"]
+    assert timings["deskew"]["images"] == 1
+
+
+def test_figures_are_rendered_in_memory(tmp_path, monkeypatch):
+    path = write_pdf(tmp_path, [text(72, 700, "Logo below") + FIGURE])
+    monkeypatch.chdir(tmp_path)
+    images = []
+
+    def image_to_string(image, **kwargs):
+        images.append(image)
+        return "Figure text"
+
+    monkeypatch.setattr(ocr_engine.pytesseract, "image_to_string", image_to_string)
+    # The rendered image, as is
+    monkeypatch.setattr(pdfhandler, "preprocess", lambda image: (image, {}))
+    result = OCRView.pdfworkflow(path)
+    page_text, _, text_from_images, page_content = result["Page_1"]
+    assert text_from_images == ["Figure text"]
+    assert page_content == ["Logo below\n", "Figure text"]
+    # Only the 200x100 points of the figure, at PDF_OCR_DPI
+    scale = pdfhandler.PDF_OCR_DPI / 72
+    width, height = images[0].size
+    assert abs(width - 200 * scale) < 3 and abs(height - 100 * scale) < 3
+    assert images[0].convert("L").getextrema() == (0, 0)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["document.pdf"]
+
+
+# Twenty long lines, the text layer covers over a quarter of the page
+TEXT_PAGE = "".join(text(40, 700 - 14 * i, "Body text " * 9) for i in range(20))
+LARGE_FIGURE = "q 3 0 0 3 0 20 cm /Fm1 Do Q\n"
+
+
+@pytest.mark.parametrize(
+    "content, image_sizes",
+    [
+        # A logo next to the text layer is not OCRed
+        (TEXT_PAGE + FIGURE, []),
+        # A figure covering a third of the page is
+        (TEXT_PAGE + LARGE_FIGURE, [(600, 300)]),
+        # A page without a text layer is OCRed once, whole
+        (FIGURE + LARGE_FIGURE, [(612, 792)]),
+    ],
+)
+def test_only_figures_without_text_layer_are_ocred(tmp_path, content, image_sizes):
+    path = write_pdf(tmp_path, [content])
+    with mock.patch.object(
+        ocr_engine.pytesseract, "image_to_string", return_value="OCR text"
+    ) as ocr:
+        result = OCRView.pdfworkflow(path)
+    # Rendered at PDF_OCR_DPI, then downscaled to OCR_PREPROCESS_DPI
+    scale = min(pdfhandler.PDF_OCR_DPI, image_preprocessing.OCR_PREPROCESS_DPI) / 72
+    sizes = [call.args[0].size for call in ocr.call_args_list]
+    assert len(sizes) == len(image_sizes)
+    for (width, height), (expected_width, expected_height) in zip(sizes, image_sizes):
+        assert abs(width - expected_width * scale) < 3
+        assert abs(height - expected_height * scale) < 3
+    assert ("OCR text" in result["Page_1"][-1]) == bool(image_sizes)
+
+
+def test_parse_and_select_pages():
+    pages = pdfhandler.parse_pages("1-3, 5,8-")
+    assert pages == [(1, 3), (5, 5), (8, None)]
+    assert pdfhandler.select_pages(pages, 10) == [0, 1, 2, 4, 7, 8, 9]
+    assert pdfhandler.select_pages([(2, 20)], 4) == [1, 2, 3]
+    assert pdfhandler.select_pages(None, 3) == [0, 1, 2]
+    with pytest.raises(pdfhandler.PageRangeError):
+        pdfhandler.select_pages([(5, None)], 4)
+    for spec in ("", "a", "3-1", "0", "1-b"):
+        with pytest.raises(ValueError):
+            pdfhandler.parse_pages(spec)
+
+
+@pytest.mark.parametrize("max_memory_size", [2621440, 10])
+def test_ocr_endpoint_uses_a_file_per_request(tmp_path, monkeypatch, max_memory_size):
+    # 10 bytes makes Django write the upload to a temporary file of its own
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(uploads))
+    client = APIClient()
+
+    def post(pages):
+        upload = SimpleUploadedFile("document.pdf", build_pdf(PAGES))
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=max_memory_size):
+            return client.post(
+                f"/pdf-ocr-api/ocr/?pages={pages}", {"file": upload}, format="multipart"
+            )
+
+    response = post("2")
+    assert response.status_code == 200
+    assert list(response.json()["data"]) == ["Page_2"]
+    assert post("3-").status_code == 400
+    assert post("x").status_code == 400
+    assert not any(uploads.iterdir())
+
+
+def test_text_mode_skips_fonts_and_ocr(tmp_path):
+    path = write_pdf(tmp_path, PAGES + [FIGURE])
+    with mock.patch.object(ocr_engine.pytesseract, "image_to_string") as ocr:
+        result = OCRView.pdfworkflow(path, mode=pdfhandler.TEXT)
+    ocr.assert_not_called()
+    assert list(result) == ["Page_1", "Page_2", "Page_3"]
+    page_text, page_content = result["Page_1"]
+    assert page_text == page_content == ["Hello page one\n", "Second line\n"]
+    full = OCRView.pdfworkflow(write_pdf(tmp_path))
+    assert result["Page_2"] == [full["Page_2"][0], full["Page_2"][2], full["Page_2"][3]]
+    assert result["Page_3"] == []
+    assert pdfhandler.extraction_options(pdfhandler.TEXT) != (
+        pdfhandler.extraction_options()
+    )
+
+
+def test_ocr_endpoint_mode():
+    client = APIClient()
+
+    def post(mode):
+        upload = SimpleUploadedFile("document.pdf", build_pdf(PAGES))
+        return client.post(
+            f"/pdf-ocr-api/ocr/?mode={mode}", {"file": upload}, format="multipart"
+        )
+
+    assert len(post("text").json()["data"]["Page_1"]) == 2
+    assert len(post("full").json()["data"]["Page_1"]) == 3
+    assert post("fast").status_code == 400
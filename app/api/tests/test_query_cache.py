@@ -0,0 +1,58 @@
+import numpy as np
+
+from api.utils import neural_search
+from api.utils.lru_cache import LRUCache
+from api.utils.neural_search import NeuralSearcher, query_embedding_cache
+
+
+def test_lru_eviction_and_stats():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+    assert len(cache) == 2
+
+
+def test_lru_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("api.utils.lru_cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def query_embed(self, query):
+        self.calls += 1
+        yield np.array([1.0, 2.0])
+
+
+class FakeClient:
+    embedding_model_name = "fake-model"
+
+    def __init__(self):
+        self.model = FakeModel()
+
+    def _get_or_init_model(self, model_name):
+        return self.model
+
+
+def test_query_embedding_is_cached():
+    query_embedding_cache.clear()
+    client = FakeClient()
+    searcher = NeuralSearcher(collection_name="c", client=client)
+    assert searcher.embed_query("hello  world") == [1.0, 2.0]
+    assert searcher.embed_query(" hello world ") == [1.0, 2.0]
+    assert client.model.calls == 1
+    assert neural_search.query_embedding_cache.stats()["hits"] == 1
+    query_embedding_cache.clear()
@@ -0,0 +1,59 @@
+from django.core.cache import caches
+from django.test import override_settings
+
+from api.utils import result_cache
+
+LOCMEM = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+
+
+@override_settings(CACHES={"default": LOCMEM, "search": LOCMEM})
+def test_write_invalidates_only_that_collection():
+    caches["search"].clear()
+    key_a = result_cache.make_key("a", q="chicago", type="text", limit=10)
+    key_b = result_cache.make_key("b", q="chicago", type="text", limit=10)
+    result_cache.set_results(key_a, [{"name": "A"}])
+    result_cache.set_results(key_b, [{"name": "B"}])
+
+    assert key_a == result_cache.make_key("a", q="chicago", type="text", limit=10)
+    assert key_a != result_cache.make_key("a", q="chicago", type="text", limit=5)
+
+    result_cache.bump_generation("a")
+
+    key_a_new = result_cache.make_key("a", q="chicago", type="text", limit=10)
+    assert key_a_new != key_a
+    assert result_cache.get_results(key_a_new) is None
+    assert result_cache.get_results(
+        result_cache.make_key("b", q="chicago", type="text", limit=10)
+    ) == [{"name": "B"}]
+    assert result_cache.get_generation("a") == 1
+
+
+@override_settings(
+    CACHES={
+        "default": LOCMEM,
+        "search": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": "/tmp/dj-se-test-search-cache",
+        },
+    }
+)
+def test_file_based_backend_shares_generations():
+    caches["search"].clear()
+    result_cache.bump_generation("a")
+    result_cache.bump_generation("a")
+    assert result_cache.get_generation("a") == 2
+    caches["search"].clear()
+
+
+def test_backend_outage_skips_the_cache(monkeypatch):
+    class BrokenCache:
+        def get(self, *args, **kwargs):
+            raise ConnectionError("cache down")
+
+        set = get
+
+    monkeypatch.setattr(result_cache, "get_cache", BrokenCache)
+    key = result_cache.make_key("a", q="chicago", type="text", limit=10)
+    assert key is None
+    assert result_cache.get_results(key) is None
+    result_cache.set_results(key, [{"name": "A"}])
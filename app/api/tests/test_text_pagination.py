@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+from api.utils.text_search import TextSearcher, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def searcher():
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        "c",
+        vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+    )
+    client.upsert(
+        "c",
+        points=[
+            models.PointStruct(
+                id=point_id,
+                vector=[1.0, 0.0],
+                payload={
+                    "document": json.dumps({"city": "Chicago"}),
+                    "companyID": point_id,
+                },
+            )
+            for point_id in range(1, 8)
+        ],
+    )
+    return TextSearcher("c", client=client)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+    uuid = "5c56c793-69f3-4fbf-87e6-c4bf54c28c26"
+    assert decode_cursor(encode_cursor(uuid)) == uuid
+    assert encode_cursor(None) is None
+    assert decode_cursor(None) is None
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_pages_continue_from_the_cursor(searcher):
+    first, cursor = searcher.search_page("Chicago", search_limit=3)
+    second, cursor = searcher.search_page("Chicago", search_limit=3, cursor=cursor)
+    third, cursor = searcher.search_page("Chicago", search_limit=3, cursor=cursor)
+    ids = [hit["companyID"] for hit in first + second + third]
+    assert ids == list(range(1, 8))
+    assert cursor is None
+
+
+def test_iter_pages_scrolls_everything(searcher):
+    pages = list(searcher.iter_pages("Chicago", page_size=3))
+    assert [len(hits) for hits, _ in pages] == [3, 3, 1]
+    assert pages[-1][1] is None
+
+
+def test_collapsed_pages_hold_distinct_documents(searcher):
+    # Chunks of documents A to E, scrolled in ID order.
+    parents = {8: "A", 9: "B", 10: "B", 11: "A", 12: "C", 13: "A", 14: "D"}
+    parents.update({15: "E", 16: "E"})
+    searcher.client.delete("c", models.FilterSelector(filter=models.Filter()))
+    searcher.client.upsert(
+        "c",
+        points=[
+            models.PointStruct(
+                id=point_id,
+                vector=[1.0, 0.0],
+                payload={"document": "Chicago", "parent_id": parent, "name": parent},
+            )
+            for point_id, parent in parents.items()
+        ],
+    )
+    pages = []
+    cursor = None
+    while True:
+        hits, cursor = searcher.search_page(
+            "Chicago", search_limit=2, cursor=cursor, collapse=True
+        )
+        pages.append([hit["name"] for hit in hits])
+        if cursor is None:
+            break
+    assert pages == [["A", "B"], ["C", "D"], ["E"]]
@@ -0,0 +1,103 @@
+import pytest
+from qdrant_client import models
+
+from api.utils.qdrant_connection import point_id_for
+
+
+@pytest.fixture
+def client(qdrant_client, fake_vector):
+    # Records inserted before IDs were deterministic.
+    qdrant_client.upsert(
+        "c",
+        [
+            models.PointStruct(
+                id=point_id,
+                vector={qdrant_client.get_vector_field_name(): fake_vector},
+                payload={"document": "old", "companyID": "1772", "type": "business"},
+            )
+            for point_id in range(1, 151)
+        ],
+    )
+    return qdrant_client
+
+
+def test_point_id_is_deterministic():
+    point_id = point_id_for({"companyID": 1772, "type": "business"})
+    assert point_id == point_id_for({"type": "business", "companyID": "1772"})
+    assert point_id != point_id_for({"companyID": 1773, "type": "business"})
+
+
+def test_upsert_replaces_every_duplicate(client, qdrant):
+    conditions = {"companyID": "1772", "type": "business"}
+    payload = [{"companyID": "1772", "type": "business", "name": "New"}]
+
+    point_id = qdrant.upsert_vector("c", conditions, {"city": "Chicago"}, payload)
+    assert point_id == point_id_for(conditions)
+    assert qdrant.upsert_vector("c", conditions, {"city": "Chicago"}, payload)
+
+    records, _ = client.scroll("c", limit=200)
+    assert [record.id for record in records] == [point_id]
+    assert records[0].payload["name"] == "New"
+
+
+def count_embeddings(monkeypatch, client):
+    embedded = []
+    embed = client._embed_documents
+
+    def embed_documents(documents, **kwargs):
+        documents = list(documents)
+        embedded.extend(documents)
+        return embed(documents, **kwargs)
+
+    monkeypatch.setattr(client, "_embed_documents", embed_documents)
+    return embedded
+
+
+def test_unchanged_document_is_not_embedded_again(monkeypatch, client, qdrant):
+    embedded = count_embeddings(monkeypatch, client)
+    conditions = {"companyID": "1772", "type": "business"}
+    document = {"city": "Chicago", "name": "Hyde Park"}
+
+    point_id = qdrant.upsert_vector("c", conditions, document, [{"name": "Old"}])
+    assert len(embedded) == 1
+    _, operations = qdrant.update_operations(
+        "c", conditions, document, [{"name": "Old"}]
+    )
+    assert [type(operation) for operation in operations] == [models.DeleteOperation]
+    # Same document with the keys in another order, new payload.
+    same = {"name": "Hyde Park", "city": "Chicago"}
+    qdrant.upsert_vector("c", conditions, same, [{"name": "New"}])
+    assert len(embedded) == 1
+    assert client.retrieve("c", [point_id])[0].payload["name"] == "New"
+
+
+def test_unchanged_record_still_loses_its_duplicates(client, qdrant, fake_vector):
+    conditions = {"companyID": "1772", "type": "business"}
+    document = {"city": "Chicago"}
+    payload = [{"companyID": "1772", "type": "business"}]
+    point_id = qdrant.upsert_vector("c", conditions, document, payload)
+    # A duplicate written by an older version after the record was migrated.
+    client.upsert(
+        "c",
+        [
+            models.PointStruct(
+                id=151,
+                vector={client.get_vector_field_name(): fake_vector},
+                payload={"document": "old", **conditions},
+            )
+        ],
+    )
+
+    assert qdrant.upsert_vector("c", conditions, document, payload) == point_id
+    records, _ = client.scroll("c", limit=200)
+    assert [record.id for record in records] == [point_id]
+
+
+def test_insert_reuses_stored_vectors(monkeypatch, client, qdrant):
+    embedded = count_embeddings(monkeypatch, client)
+    documents = [{"city": "Chicago"}, {"city": "Boston"}]
+    assert qdrant.insert_vectors("c", documents, [{"n": 1}, {"n": 2}])
+    assert len(embedded) == 2
+    assert qdrant.insert_vectors("c", documents + [{"city": "Denver"}], [{}, {}, {}])
+    assert len(embedded) == 3
+    assert client.count("c").count == 150 + 5
@@ -2,7 +2,7 @@
 URL structure for the API/REST endpoints
 """
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("", views.HelloWorldApiView.as_view(), name="hello_world"),
@@ -21,5 +21,33 @@ urlpatterns = [
         views.update_data_into_vector_database,
         name="insert_data",
     ),
+    path(
+        "bulk-insert/",
+        views.bulk_insert_into_vector_database,
+        name="bulk_insert",
+    ),
+    path(
+        "index-pdf/",
+        views.index_pdf_into_vector_database,
+        name="index_pdf",
+    ),
     path("search/", views.search_in_vector_database, name="search"),
+    path("search/batch/", views.batch_search_in_vector_database, name="search_batch"),
+    path("cache-stats/", views.cache_stats, name="cache_stats"),
+    # Async (ASGI) versions of the endpoints above.
+    path(
+        "async/insert-data/",
+        async_views.async_embed_data_into_vector_database,
+        name="async_insert_data",
+    ),
+    path(
+        "async/update-data/",
+        async_views.async_update_data_into_vector_database,
+        name="async_update_data",
+    ),
+    path(
+        "async/search/",
+        async_views.async_search_in_vector_database,
+        name="async_search",
+    ),
 ]
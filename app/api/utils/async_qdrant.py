@@ -0,0 +1,514 @@
+"""
+This module provides the asyncio counterparts of `QdrantConnection`,
+`TextSearcher` and `NeuralSearcher` for the ASGI views.
+
+Network calls go through the `AsyncQdrantClient` of the running loop, while the
+CPU-bound embedding runs on a thread pool with the shared sync model, so the
+event loop never blocks. The sync client is also resolved on that pool: the
+first request after a start without warm-up builds it and loads the model.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, List, Optional, Tuple
+from asgiref.sync import sync_to_async
+from qdrant_client import models
+from app.settings import (
+    ASYNC_EMBEDDING_WORKERS,
+    CONTENT_HASH_FIELD_NAME,
+    PARENT_ID_FIELD_NAME,
+)
+from .chunking import chunk_document
+from .client_registry import get_async_client, get_client
+from .highlighter import get_highlighter
+from .hybrid_search import HybridSearcher, sparse_vector_name
+from .neural_search import NeuralSearcher
+from .qdrant_connection import (
+    QdrantConnection,
+    _hybrid_collections,
+    content_hash,
+    point_id_for,
+)
+from .result_cache import bump_generation
+from .text_search import TextSearcher, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+_embedding_executor = ThreadPoolExecutor(
+    max_workers=ASYNC_EMBEDDING_WORKERS, thread_name_prefix="embedding"
+)
+
+
+async def run_cpu_bound(func, *args):
+    """
+    Run `func(*args)` on the embedding thread pool and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_embedding_executor, func, *args)
+
+
+async def sync_client():
+    """
+    Return the shared sync client (`get_client`), resolved on the embedding
+    thread pool.
+    """
+    return await run_cpu_bound(get_client)
+
+
+async def format_hits(formatter, points, text: str, highlight: bool):
+    """
+    Format search hits, moving the highlighting work off the event loop.
+    """
+    if not highlight:
+        return formatter(points)
+    return await run_cpu_bound(formatter, points, get_highlighter(text))
+
+
+class AsyncQdrantConnection:
+    """
+    Async version of the write operations of `QdrantConnection`.
+    """
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_async_client()
+        self.connection = None
+
+    async def get_connection(self) -> QdrantConnection:
+        """
+        Return the sync `QdrantConnection` that builds points and operations.
+        """
+        if self.connection is None:
+            self.connection = QdrantConnection(client=await sync_client())
+        return self.connection
+
+    async def is_hybrid(self, collection_name: str, create_missing: bool = False):
+        """
+        Async version of `QdrantConnection.is_hybrid`, sharing its cache. A
+        missing collection is created with the async client when
+        `create_missing` is set.
+        """
+        hybrid = _hybrid_collections.get(collection_name)
+        if hybrid is None:
+            try:
+                collection_info = await self.client.get_collection(collection_name)
+            except Exception:  # pylint: disable=broad-except
+                if not create_missing:
+                    return False
+                connection = await self.get_connection()
+                await self.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=connection.client.get_fastembed_vector_params(),
+                )
+                _hybrid_collections.set(collection_name, False)
+                return False
+            sparse_vectors = collection_info.config.params.sparse_vectors or {}
+            hybrid = sparse_vector_name() in sparse_vectors
+            _hybrid_collections.set(collection_name, hybrid)
+        return hybrid
+
+    async def vectors_by_hash(self, collection_name: str, hashes: list) -> dict:
+        """
+        Async version of `QdrantConnection.vectors_by_hash`.
+        """
+        unique_hashes = list(dict.fromkeys(hashes))
+        if not unique_hashes:
+            return {}
+        try:
+            responses = await self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=QdrantConnection.hash_lookup_requests(unique_hashes),
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug(
+                "No stored vectors for collection %s: %s", collection_name, str(error)
+            )
+            return {}
+        return {
+            hash_: response.points[0].vector
+            for hash_, response in zip(unique_hashes, responses)
+            if response.points
+        }
+
+    async def insert_vector(self, collection_name, document: dict, payload: list):
+        """
+        Embed `document` off the loop (unless it is already stored) and upsert
+        it with `payload`. A missing collection is created first, like
+        `QdrantConnection.insert_vector` does.
+
+        Returns:
+            bool: True if the insertion was successful, False otherwise.
+        """
+        try:
+            await self.is_hybrid(collection_name, create_missing=True)
+            known_vectors = await self.vectors_by_hash(
+                collection_name, [content_hash(document)]
+            )
+            connection = await self.get_connection()
+            points = await run_cpu_bound(
+                partial(connection.build_insert_points, known_vectors=known_vectors),
+                collection_name,
+                [document],
+                payload,
+            )
+            await self.client.upsert(
+                collection_name=collection_name, points=points, wait=True
+            )
+            await sync_to_async(bump_generation)(collection_name)
+            return True
+        except Exception as error:
+            logger.error(
+                "Failed to insert vector into collection %s: %s",
+                collection_name,
+                str(error),
+            )
+            return False
+
+    async def upsert_vector(
+        self, collection_name: str, filter_conditions: dict, document, payload: list
+    ):
+        """
+        Replace the record identified by `filter_conditions`, like
+        `QdrantConnection.upsert_vector`. Lookups go through the async client,
+        only the embedding runs on the thread pool.
+
+        Returns:
+            str: The point ID of the record, or False if the update failed.
+        """
+        try:
+            point_id = point_id_for(filter_conditions)
+            chunks = chunk_document(document)
+            connection = await self.get_connection()
+            new_payload = connection.record_payload(document, payload, point_id)
+            stored = await self.client.retrieve(
+                collection_name=collection_name, ids=[point_id], with_payload=True
+            )
+            operations = connection.payload_operations(
+                stored, chunks, new_payload, filter_conditions
+            )
+            if operations is None:
+                known_vectors = {}
+                hash_ = new_payload[CONTENT_HASH_FIELD_NAME]
+                if len(chunks) == 1:
+                    known_vectors = await self.vectors_by_hash(collection_name, [hash_])
+                operations = await run_cpu_bound(
+                    connection.upsert_operations,
+                    collection_name,
+                    point_id,
+                    chunks,
+                    new_payload,
+                    filter_conditions,
+                    known_vectors.get(hash_),
+                )
+            if operations:
+                await self.client.batch_update_points(
+                    collection_name=collection_name, update_operations=operations
+                )
+                await sync_to_async(bump_generation)(collection_name)
+            return point_id
+        except Exception as error:
+            logger.error(
+                "Failed to update %s in collection %s: %s",
+                filter_conditions,
+                collection_name,
+                str(error),
+            )
+            return False
+
+
+class AsyncTextSearcher:
+    def __init__(self, collection_name: str, client=None):
+        self.collection_name = collection_name
+        self.client = client if client is not None else get_async_client()
+
+    async def scroll(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        cursor: str = None,
+        collapse: bool = False,
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Async version of `TextSearcher.scroll`.
+        """
+        if collapse:
+            return await self.scroll_collapsed(text, search_limit, filter_, cursor)
+        records, next_offset = await self.client.scroll(
+            collection_name=self.collection_name,
+            scroll_filter=TextSearcher.build_filter(text, filter_),
+            with_payload=True,
+            with_vectors=False,
+            limit=int(search_limit),
+            offset=decode_cursor(cursor),
+        )
+        return records, encode_cursor(next_offset)
+
+    async def first_chunk_ids(self, text: str, filter_: dict, parent_ids: set):
+        """
+        Async version of `TextSearcher.first_chunk_ids`.
+        """
+        scroll_filter = TextSearcher.parents_filter(text, filter_, parent_ids)
+        remaining = set(parent_ids)
+        first_ids = {}
+        offset = None
+        while remaining:
+            records, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                with_payload=[PARENT_ID_FIELD_NAME],
+                with_vectors=False,
+                limit=max(len(remaining), 64),
+                offset=offset,
+            )
+            for record in records:
+                parent_id = record.payload.get(PARENT_ID_FIELD_NAME)
+                if parent_id in remaining:
+                    first_ids[parent_id] = record.id
+                    remaining.discard(parent_id)
+            if offset is None:
+                break
+        return first_ids
+
+    async def scroll_collapsed(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        cursor: str = None,
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Async version of `TextSearcher.scroll_collapsed`.
+        """
+        limit = int(search_limit)
+        collapsed = []
+        seen = set()
+        offset = decode_cursor(cursor)
+        while True:
+            records, next_offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=TextSearcher.build_filter(text, filter_),
+                with_payload=True,
+                with_vectors=False,
+                limit=limit,
+                offset=offset,
+            )
+            unseen = TextSearcher.unseen_parents(records, seen)
+            first_ids = (
+                await self.first_chunk_ids(text, filter_, unseen) if unseen else {}
+            )
+            position = TextSearcher.collapse_page(
+                records, first_ids, seen, collapsed, limit
+            )
+            if position is not None:
+                if position + 1 < len(records):
+                    next_offset = records[position + 1].id
+                return collapsed, encode_cursor(next_offset)
+            if next_offset is None:
+                return collapsed, None
+            offset = next_offset
+
+    async def search_page(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        highlight: bool = False,
+        cursor: str = None,
+        collapse: bool = False,
+    ) -> Tuple[List[dict], Optional[str]]:
+        records, next_cursor = await self.scroll(
+            text, search_limit, filter_, cursor, collapse
+        )
+        hits = await format_hits(TextSearcher.format_hits, records, text, highlight)
+        return hits, next_cursor
+
+    async def iter_pages(
+        self,
+        text: str,
+        page_size: int = 10,
+        filter_: dict = None,
+        highlight: bool = False,
+        cursor: str = None,
+    ) -> AsyncIterator[Tuple[List[dict], Optional[str]]]:
+        while True:
+            hits, cursor = await self.search_page(
+                text, page_size, filter_, highlight, cursor
+            )
+            yield hits, cursor
+            if cursor is None:
+                return
+
+    async def iter_records(
+        self,
+        text: str,
+        page_size: int = 10,
+        filter_: dict = None,
+        cursor: str = None,
+    ) -> AsyncIterator:
+        """
+        Async version of `TextSearcher.iter_records`.
+        """
+        while True:
+            records, cursor = await self.scroll(text, page_size, filter_, cursor)
+            for record in records:
+                yield record
+            if cursor is None:
+                return
+
+    async def search(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        highlight: bool = False,
+        cursor: str = None,
+        collapse: bool = False,
+    ) -> List[dict]:
+        start_time = time.time()
+        hits, _ = await self.search_page(
+            text, search_limit, filter_, highlight, cursor, collapse
+        )
+        if not hits:
+            logger.info("No hits found for query: %s", text)
+        return hits, start_time
+
+
+class AsyncNeuralSearcher:
+    def __init__(self, collection_name: str, client=None):
+        self.collection_name = collection_name
+        self.client = client if client is not None else get_async_client()
+        self.searcher = None
+
+    async def get_searcher(self) -> NeuralSearcher:
+        """
+        Return the sync `NeuralSearcher` whose model embeds the queries.
+        """
+        if self.searcher is None:
+            self.searcher = NeuralSearcher(
+                collection_name=self.collection_name, client=await sync_client()
+            )
+        return self.searcher
+
+    async def search_points(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        collapse: bool = False,
+    ) -> list:
+        """
+        Async version of `NeuralSearcher.search_points`.
+        """
+        searcher = await self.get_searcher()
+        vector = await run_cpu_bound(searcher.embed_query, text)
+        query_vector = models.NamedVector(
+            name=searcher.client.get_vector_field_name(), vector=vector
+        )
+        query_filter = NeuralSearcher.build_filter(text, filter_)
+        if collapse:
+            groups = await self.client.search_groups(
+                collection_name=self.collection_name,
+                query_vector=query_vector,
+                query_filter=query_filter,
+                group_by=PARENT_ID_FIELD_NAME,
+                group_size=1,
+                limit=search_limit,
+                with_payload=True,
+            )
+            return [group.hits[0] for group in groups.groups]
+        return await self.client.search(
+            collection_name=self.collection_name,
+            query_vector=query_vector,
+            query_filter=query_filter,
+            limit=search_limit,
+            with_payload=True,
+        )
+
+    async def search(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        highlight: bool = False,
+        collapse: bool = False,
+    ) -> List[dict]:
+        start_time = time.time()
+        scored_points = await self.search_points(text, filter_, search_limit, collapse)
+        hits = await format_hits(
+            NeuralSearcher.format_hits, scored_points, text, highlight
+        )
+        if not hits:
+            logger.info("No hits found for query: %s with filter: %s", text, filter_)
+        return hits, start_time
+
+
+class AsyncHybridSearcher:
+    def __init__(self, collection_name: str, client=None, fusion: str = None):
+        self.collection_name = collection_name
+        self.client = client if client is not None else get_async_client()
+        self.fusion = fusion
+        self.searcher = None
+
+    async def get_searcher(self) -> HybridSearcher:
+        """
+        Return the sync `HybridSearcher` that embeds and builds the queries.
+        """
+        if self.searcher is None:
+            kwargs = {"fusion": self.fusion} if self.fusion else {}
+            self.searcher = HybridSearcher(
+                collection_name=self.collection_name,
+                client=await sync_client(),
+                **kwargs,
+            )
+        return self.searcher
+
+    async def search_points(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        collapse: bool = False,
+    ) -> list:
+        """
+        Async version of `HybridSearcher.search_points`.
+        """
+        searcher = await self.get_searcher()
+        requests = await run_cpu_bound(
+            searcher.build_requests,
+            [{"q": text, "filter": filter_, "limit": search_limit}],
+        )
+        if collapse:
+            groups = await self.client.query_points_groups(
+                collection_name=self.collection_name,
+                prefetch=requests[0].prefetch,
+                query=requests[0].query,
+                group_by=PARENT_ID_FIELD_NAME,
+                group_size=1,
+                limit=search_limit,
+                with_payload=True,
+            )
+            return [group.hits[0] for group in groups.groups]
+        responses = await self.client.query_batch_points(
+            collection_name=self.collection_name, requests=requests
+        )
+        return responses[0].points
+
+    async def search(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        highlight: bool = False,
+        collapse: bool = False,
+    ) -> List[dict]:
+        start_time = time.time()
+        scored_points = await self.search_points(text, filter_, search_limit, collapse)
+        hits = await format_hits(
+            NeuralSearcher.format_hits, scored_points, text, highlight
+        )
+        if not hits:
+            logger.info("No hits found for query: %s with filter: %s", text, filter_)
+        return hits, start_time
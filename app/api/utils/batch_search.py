@@ -0,0 +1,146 @@
+"""
+This module runs many searches from one request.
+
+Neural and hybrid queries are embedded in one model call per model and sent as
+one batch per collection and type; text queries and those batches run
+concurrently on a shared thread pool. Results are returned in request order.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from app.settings import SEARCH_BATCH_WORKERS
+from .client_registry import get_client
+from .hybrid_search import HybridSearcher
+from .neural_search import NeuralSearcher
+from .search_types import HYBRID, TEXT
+from .text_search import TextSearcher
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide thread pool used to run searches concurrently.
+    """
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=SEARCH_BATCH_WORKERS, thread_name_prefix="search"
+                )
+    return _executor
+
+
+def _text_search(query: dict) -> List[List[dict]]:
+    searcher = TextSearcher(collection_name=query["collection_name"])
+    hits, _ = searcher.search(
+        text=query["q"],
+        search_limit=query["limit"],
+        filter_=query.get("filter"),
+        highlight=query.get("highlight", False),
+    )
+    return [hits]
+
+
+def _fail(responses: list, indexes: List[int], message: str) -> None:
+    for index in indexes:
+        responses[index] = {"error": message}
+
+
+def batch_search(queries: List[dict]) -> List[dict]:
+    """
+    Run a list of validated queries.
+
+    Args:
+        queries (List[dict]): Items with "q", "collection_name", "type",
+        "limit" and optional "filter" and "highlight".
+
+    Returns:
+        List[dict]: One {"results": [...]} or {"error": "..."} per query, in
+        the order of `queries`.
+    """
+    executor = get_executor()
+    responses = [None] * len(queries)
+    futures = {}
+
+    vector_groups = defaultdict(list)
+    for index, query in enumerate(queries):
+        if query["type"] == TEXT:
+            futures[executor.submit(_text_search, query)] = [index]
+        else:
+            vector_groups[(query["type"], query["collection_name"])].append(index)
+
+    if vector_groups:
+        client = get_client()
+        dense_indexes = [index for group in vector_groups.values() for index in group]
+        hybrid_indexes = [
+            index
+            for (search_type, _), group in vector_groups.items()
+            if search_type == HYBRID
+            for index in group
+        ]
+        try:
+            dense_vectors = NeuralSearcher(None, client=client).embed_queries(
+                [queries[index]["q"] for index in dense_indexes]
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception("Failed to embed batch queries: %s", str(error))
+            _fail(responses, dense_indexes, f"Failed to embed query. {error}")
+            vector_groups = {}
+        else:
+            dense_by_index = dict(zip(dense_indexes, dense_vectors))
+
+        sparse_by_index = {}
+        if hybrid_indexes and vector_groups:
+            # A failure of the sparse model only fails the hybrid queries;
+            # the neural ones still run with their dense vectors
+            try:
+                sparse_vectors = HybridSearcher(
+                    None, client=client
+                ).embed_sparse_queries(
+                    [queries[index]["q"] for index in hybrid_indexes]
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Failed to embed sparse queries: %s", str(error))
+                _fail(responses, hybrid_indexes, f"Failed to embed query. {error}")
+                vector_groups = {
+                    key: indexes
+                    for key, indexes in vector_groups.items()
+                    if key[0] != HYBRID
+                }
+            else:
+                sparse_by_index = dict(zip(hybrid_indexes, sparse_vectors))
+
+        for (search_type, collection_name), indexes in vector_groups.items():
+            group_queries = [queries[index] for index in indexes]
+            group_dense = [dense_by_index[index] for index in indexes]
+            if search_type == HYBRID:
+                searcher = HybridSearcher(collection_name, client=client)
+                future = executor.submit(
+                    searcher.search_batch,
+                    group_queries,
+                    group_dense,
+                    [sparse_by_index[index] for index in indexes],
+                )
+            else:
+                searcher = NeuralSearcher(collection_name, client=client)
+                future = executor.submit(
+                    searcher.search_batch, group_queries, group_dense
+                )
+            futures[future] = indexes
+
+    for future, indexes in futures.items():
+        try:
+            for index, hits in zip(indexes, future.result()):
+                responses[index] = {"results": hits}
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception("Batch search failed: %s", str(error))
+            _fail(responses, indexes, f"Failed to perform search. {error}")
+    return responses
@@ -0,0 +1,86 @@
+"""
+This module provides the NDJSON bulk ingestion pipeline.
+
+The request body is read line by line, grouped into batches and each batch is
+embedded and upserted in one go, so neither the body nor the results are ever
+held in memory as a whole.
+"""
+
+import json
+import logging
+from itertools import islice
+from typing import Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_ndjson(lines: Iterable[bytes]) -> Iterator[Tuple[int, dict, str]]:
+    """
+    Parse NDJSON lines into `{payload, data}` records.
+
+    Args:
+        lines (Iterable[bytes]): Raw lines, e.g. from `request.readline`.
+
+    Yields:
+        Tuple[int, dict, str]: The 1-based line number, the parsed record (or
+        None) and an error message (or None). Blank lines are skipped.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(record, dict) or "data" not in record:
+            yield line_number, None, "Each line must be an object with a 'data' key."
+            continue
+        payload = record.get("payload") or {}
+        if isinstance(payload, list):
+            payload = payload[0] if payload else {}
+        if not isinstance(payload, dict):
+            yield line_number, None, "'payload' must be an object."
+            continue
+        yield line_number, {"payload": payload, "data": record["data"]}, None
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Split an iterable into lists of at most `size` items.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def bulk_insert(
+    qdrant, collection_name: str, lines: Iterable[bytes], batch_size: int
+) -> Iterator[dict]:
+    """
+    Insert NDJSON records into a collection in batches.
+
+    Args:
+        qdrant (QdrantConnection): The connection used for the upserts.
+        collection_name (str): The target collection.
+        lines (Iterable[bytes]): The NDJSON lines.
+        batch_size (int): How many records are embedded and upserted together.
+
+    Yields:
+        dict: One status entry per non-blank line, in input order.
+    """
+    for batch in batched(parse_ndjson(lines), batch_size):
+        valid = [(line, record) for line, record, error in batch if error is None]
+        inserted = bool(valid) and qdrant.insert_vectors(
+            collection_name,
+            [record["data"] for _, record in valid],
+            [record["payload"] for _, record in valid],
+            batch_size=batch_size,
+        )
+        for line, _, error in batch:
+            if error is not None:
+                yield {"line": line, "error": error}
+            elif inserted:
+                yield {"line": line, "status": "inserted"}
+            else:
+                yield {"line": line, "error": "Failed to insert data"}
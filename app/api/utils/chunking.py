@@ -0,0 +1,87 @@
+"""
+This module splits long documents into overlapping chunks before embedding.
+
+The embedding model only reads the first few hundred tokens of a text, so a
+document whose JSON is longer than `CHUNK_SIZE` characters is stored as several
+points: one for its short fields and one per chunk of each long text field.
+Every point of a document carries the same `parent_id` (the ID of its first
+point) and its `chunk_index`, so search can collapse the chunks back into one
+hit per document.
+"""
+
+import json
+import uuid
+from typing import Iterator, List
+from app.settings import CHUNK_OVERLAP, CHUNK_SIZE
+
+
+def split_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+    """
+    Split `text` on whitespace into chunks of at most `size` characters (a
+    single longer word makes its own chunk). Each chunk starts with the last
+    `overlap` characters of words of the previous one.
+
+    Yields:
+        str: The chunks, in order.
+    """
+    words = text.split()
+    chunk: List[str] = []
+    length = 0
+    for word in words:
+        if chunk and length + len(word) + 1 > size:
+            yield " ".join(chunk)
+            carried: List[str] = []
+            carried_length = 0
+            for previous in reversed(chunk):
+                if carried_length + len(previous) + 1 > overlap:
+                    break
+                carried.insert(0, previous)
+                carried_length += len(previous) + 1
+            chunk, length = carried, carried_length
+        chunk.append(word)
+        length += len(word) + 1
+    if chunk:
+        yield " ".join(chunk)
+
+
+def chunk_document(
+    document, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP
+) -> List[str]:
+    """
+    Return the JSON strings to embed for `document`: the document itself if
+    it fits in `size` characters (or chunking is disabled with `size` 0).
+    Otherwise, one JSON object of its short fields followed by one
+    {field: chunk} object per chunk of each string field longer than `size`.
+    """
+    document_str = json.dumps(document)
+    if size <= 0 or len(document_str) <= size:
+        return [document_str]
+    if not isinstance(document, dict):
+        if not isinstance(document, str):
+            return [document_str]
+        return [json.dumps(chunk) for chunk in split_text(document, size, overlap)]
+
+    short_fields = {
+        key: value
+        for key, value in document.items()
+        if not (isinstance(value, str) and len(value) > size)
+    }
+    chunks = [json.dumps(short_fields)] if short_fields else []
+    for key, value in document.items():
+        if key not in short_fields:
+            chunks.extend(
+                json.dumps({key: chunk}) for chunk in split_text(value, size, overlap)
+            )
+    return chunks
+
+
+def chunk_point_ids(parent_id: str, count: int) -> Iterator[str]:
+    """
+    Return the point IDs of the `count` chunks of a document: the parent ID
+    for the first one, then UUIDv5s derived from it, so re-writing a document
+    overwrites its own chunks.
+    """
+    namespace = uuid.UUID(str(parent_id))
+    yield str(namespace)
+    for index in range(1, count):
+        yield str(uuid.uuid5(namespace, str(index)))
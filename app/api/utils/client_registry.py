@@ -0,0 +1,125 @@
+"""
+This module keeps the Qdrant clients shared by the whole process.
+
+Building a `QdrantClient` opens a gRPC channel and `set_model` loads the
+FastEmbed ONNX model, so both are done once (from `ApiConfig.ready()`) and
+every view, searcher and `QdrantConnection` reuses the same objects.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import weakref
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from app.settings import EMBEDDINGS_MODEL, QDRANT_WARMUP_ON_STARTUP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLIENT = "default"
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _build_client() -> QdrantClient:
+    """
+    Create the gRPC client and load the embedding model into it.
+
+    Returns:
+        QdrantClient: A client ready for `add`/`query` calls.
+    """
+    client = QdrantClient(
+        url=os.environ.get("QDRANT_URL"),
+        port=os.environ.get("QDRANT_PORT"),
+        prefer_grpc=True,  # Use gRPC for better performance
+        # api_key=os.environ.get("QDRANT_API_KEY"),
+    )
+    if not client._FASTEMBED_INSTALLED:
+        logger.warning(
+            "FastEmbed is not installed. Install fastembed to use this feature."
+        )
+        return client
+    client.set_model(embedding_model_name=EMBEDDINGS_MODEL)
+    dim, _ = client._get_model_params(EMBEDDINGS_MODEL)
+    logger.info("Embedding model %s loaded (dim=%s).", EMBEDDINGS_MODEL, dim)
+    return client
+
+
+def get_client(name: str = DEFAULT_CLIENT) -> QdrantClient:
+    """
+    Return the process-wide client registered under `name`, creating it on
+    first use.
+
+    Args:
+        name (str): The registry key. Defaults to the main client.
+
+    Returns:
+        QdrantClient: The shared client.
+    """
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        if name not in _clients:
+            _clients[name] = _build_client()
+        return _clients[name]
+
+
+def get_async_client() -> AsyncQdrantClient:
+    """
+    Return the `AsyncQdrantClient` of the running event loop, creating it on
+    first use. gRPC channels are bound to a loop, so there is one client per
+    loop (one per ASGI worker). It is only used for network calls, embedding
+    is done with the model of the sync client.
+
+    Returns:
+        AsyncQdrantClient: The shared async client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncQdrantClient(
+            url=os.environ.get("QDRANT_URL"),
+            port=os.environ.get("QDRANT_PORT"),
+            prefer_grpc=True,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def initialize():
+    """
+    Warm up the registry at startup so the first request does not pay for
+    the gRPC channel and the model load. Failures are logged and the client
+    is built lazily on the first request instead.
+    """
+    try:
+        get_client()
+    except Exception as error:
+        logger.exception("Failed to warm up the Qdrant client: %s", str(error))
+
+
+def warm_up():
+    """
+    Call `initialize` when `QDRANT_WARMUP_ON_STARTUP` is set. Only the server
+    entry points (wsgi.py, asgi.py) call it, so management commands such as
+    migrate or test do not load the embedding model.
+    """
+    if QDRANT_WARMUP_ON_STARTUP:
+        initialize()
+
+
+def reset():
+    """
+    Drop every registered client. Used by tests and after a fork.
+    """
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        _clients.clear()
+        _async_clients.clear()
@@ -0,0 +1,282 @@
+"""
+This module keeps document embeddings in a local SQLite file, so text that was
+embedded once is never sent to the model again: not after a restart, a crash
+during ingestion, or when the same data is loaded into another collection.
+
+Rows are keyed by (model name, SHA-256 of the text) and hold the vector as
+float32 bytes. The database runs in WAL mode, so the Django workers of a host
+share it and read concurrently while one of them writes. The number of rows is
+capped, the least recently used ones are evicted first. Reads only take the
+write lock to refresh the use time of rows not used for `TOUCH_INTERVAL`, and
+writes only count the rows when this process's estimate exceeds the cap.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+import numpy as np
+from app.settings import EMBEDDING_STORE_MAX_ENTRIES, EMBEDDING_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, text_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+# SQLite limits the number of variables of a statement.
+_LOOKUP_BATCH = 500
+
+# The use time of a row is refreshed on read when it is older than this
+# (seconds), an approximate LRU that keeps most reads free of writes.
+TOUCH_INTERVAL = 3600
+
+# Eviction frees this fraction of `max_entries` below the cap, so a full
+# store is not counted and evicted on every write.
+EVICT_FRACTION = 0.1
+
+
+def text_hash(text: str) -> str:
+    """
+    Return the key of `text` in the store.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    A persistent, size-capped store of embeddings.
+
+    Args:
+        path (str): The SQLite file, created if needed.
+        max_entries (int): The maximum number of vectors kept. Writes past it
+        evict the least recently used vectors.
+
+    Attributes:
+        hits (int): Texts found in the store by this process.
+        misses (int): Texts that had to be embedded by this process.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Rows counted at the last eviction plus the rows written since by
+        # this process, None until the first write.
+        self._estimated_size = None
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return the connection of the current thread, sqlite3 connections
+        cannot be shared between threads.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Return the stored vector of each text, None for the ones not stored.
+        """
+        keys = [text_hash(text) for text in texts]
+        found = {}
+        stale = []
+        now = time.time()
+        connection = self._connection()
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), _LOOKUP_BATCH):
+            batch = unique_keys[start : start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                "SELECT text_hash, vector, last_used FROM embeddings "
+                f"WHERE model = ? AND text_hash IN ({placeholders})",
+                [model, *batch],
+            ).fetchall()
+            for key, vector, last_used in rows:
+                found[key] = vector
+                if now - last_used > TOUCH_INTERVAL:
+                    stale.append(key)
+        if stale:
+            connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(now, model, key) for key in stale],
+            )
+        vectors = [
+            (
+                np.frombuffer(found[key], dtype=np.float32).tolist()
+                if key in found
+                else None
+            )
+            for key in keys
+        ]
+        with self._lock:
+            self.hits += sum(vector is not None for vector in vectors)
+            self.misses += sum(vector is None for vector in vectors)
+        return vectors
+
+    def set_many(self, model: str, texts: List[str], vectors: Iterable):
+        """
+        Store the vector of each text, then evict the oldest vectors if the
+        store may be over `max_entries`.
+        """
+        now = time.time()
+        rows = [
+            (
+                model,
+                text_hash(text),
+                np.asarray(vector, dtype=np.float32).tobytes(),
+                now,
+            )
+            for text, vector in zip(texts, vectors)
+        ]
+        if not rows:
+            return
+        connection = self._connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        with self._lock:
+            if self._estimated_size is not None:
+                self._estimated_size += len(rows)
+            full = (
+                self._estimated_size is None or self._estimated_size > self.max_entries
+            )
+        if full:
+            self.evict()
+
+    def evict(self):
+        """
+        Count the vectors and delete the least recently used ones until the
+        store is `EVICT_FRACTION` below `max_entries`.
+        """
+        connection = self._connection()
+        (size,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = max(size - int(self.max_entries * (1 - EVICT_FRACTION)), 0)
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM embeddings WHERE (model, text_hash) IN ("
+                "SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            logger.info("Evicted %s vectors from the embedding store.", excess)
+        with self._lock:
+            self._estimated_size = size - excess
+
+    def clear(self):
+        """
+        Drop every stored vector and reset the counters.
+        """
+        self._connection().execute("DELETE FROM embeddings")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self._estimated_size = None
+
+    def __len__(self):
+        return (
+            self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        )
+
+    def stats(self) -> dict:
+        """
+        Return the hit/miss counters of this process and the size of the store.
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "path": self.path,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """
+    Return the process-wide store, or None when `EMBEDDING_STORE_PATH` is
+    empty or the file cannot be opened.
+    """
+    global _store  # pylint: disable=global-statement
+    if _store is None and EMBEDDING_STORE_PATH:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = EmbeddingStore(
+                        EMBEDDING_STORE_PATH, EMBEDDING_STORE_MAX_ENTRIES
+                    )
+                except sqlite3.Error as error:
+                    logger.error(
+                        "Embedding store %s disabled: %s",
+                        EMBEDDING_STORE_PATH,
+                        str(error),
+                    )
+                    return None
+    return _store
+
+
+def embed_documents(client, documents: List[str], batch_size: int = 64) -> list:
+    """
+    Return the (document, vector) pairs of `documents`, like
+    `client._embed_documents`, embedding only the documents that are not in
+    the embedding store and storing the new vectors.
+    """
+    model_name = client.embedding_model_name
+    store = get_embedding_store()
+    if store is None:
+        return list(
+            client._embed_documents(
+                documents=documents,
+                embedding_model_name=model_name,
+                batch_size=batch_size,
+                embed_type="passage",
+            )
+        )
+    try:
+        vectors = store.get_many(model_name, documents)
+    except sqlite3.Error as error:
+        logger.error("Failed to read the embedding store: %s", str(error))
+        vectors = [None] * len(documents)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        embedded = [
+            vector
+            for _, vector in client._embed_documents(
+                documents=[documents[i] for i in missing],
+                embedding_model_name=model_name,
+                batch_size=batch_size,
+                embed_type="passage",
+            )
+        ]
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+        try:
+            store.set_many(model_name, [documents[i] for i in missing], embedded)
+        except sqlite3.Error as error:
+            logger.error("Failed to write the embedding store: %s", str(error))
+    return list(zip(documents, vectors))
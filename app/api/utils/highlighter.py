@@ -0,0 +1,153 @@
+"""
+This module highlights query words in search results.
+
+The query is compiled once into a single case-insensitive alternation, and
+every document is scanned in one pass. Instead of the whole document, a few
+bounded snippets around the matches are returned.
+"""
+
+import html
+import json
+import re
+from functools import lru_cache
+from typing import List
+from app.settings import HIGHLIGHT_SNIPPET_SIZE, HIGHLIGHT_MAX_SNIPPETS
+
+
+def _word_pattern(word: str) -> str:
+    # Long words also match a slightly different ending (plural, etc.).
+    if len(word) > 4:
+        return rf"{re.escape(word[:-1])}(?:{re.escape(word[-1])})?\w?"
+    return re.escape(word)
+
+
+def document_text(document) -> str:
+    """
+    Return the searchable text of a stored document: the string values of a
+    JSON document, one per line, or the document itself.
+    """
+    if not isinstance(document, str):
+        return ""
+    try:
+        data = json.loads(document)
+    except ValueError:
+        return document
+    values = []
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+        elif value is not None:
+            values.append(str(value))
+    return "\n".join(values)
+
+
+class Highlighter:
+    """
+    Highlight the words of one query.
+
+    Args:
+        query (str): The search query.
+        snippet_size (int, optional): Approximate length of each snippet.
+        max_snippets (int, optional): Maximum number of snippets per document.
+        pre_tag (str, optional): Inserted before each match.
+        post_tag (str, optional): Inserted after each match.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        snippet_size: int = HIGHLIGHT_SNIPPET_SIZE,
+        max_snippets: int = HIGHLIGHT_MAX_SNIPPETS,
+        pre_tag: str = "<b>",
+        post_tag: str = "</b>",
+    ):
+        words = sorted(set(query.lower().split()), key=len, reverse=True)
+        self.pattern = (
+            re.compile(
+                r"\b(?:" + "|".join(_word_pattern(word) for word in words) + r")\b",
+                flags=re.IGNORECASE,
+            )
+            if words
+            else None
+        )
+        self.snippet_size = snippet_size
+        self.max_snippets = max_snippets
+        self.pre_tag = pre_tag
+        self.post_tag = post_tag
+
+    def _mark(self, text: str, matches, start: int, end: int) -> str:
+        parts = []
+        position = start
+        for match_start, match_end in matches:
+            parts.append(html.escape(text[position:match_start]))
+            parts.append(self.pre_tag)
+            parts.append(html.escape(text[match_start:match_end]))
+            parts.append(self.post_tag)
+            position = match_end
+        parts.append(html.escape(text[position:end]))
+        return "".join(parts)
+
+    def highlight(self, text: str) -> str:
+        """
+        Return `text` with every match wrapped in the tags.
+        """
+        if self.pattern is None:
+            return html.escape(text)
+        matches = [match.span() for match in self.pattern.finditer(text)]
+        return self._mark(text, matches, 0, len(text))
+
+    def snippets(self, text: str) -> List[str]:
+        """
+        Return up to `max_snippets` highlighted fragments of about
+        `snippet_size` characters around the matches.
+        """
+        if self.pattern is None or not text:
+            return []
+        half = self.snippet_size // 2
+        windows = []  # [start, end, [match spans]], never overlapping
+        for match in self.pattern.finditer(text):
+            match_start, match_end = match.span()
+            if windows and match_start < windows[-1][1]:
+                window = windows[-1]
+                if match_end - window[0] <= 2 * self.snippet_size:
+                    window[1] = min(len(text), max(window[1], match_end + half))
+                    window[2].append((match_start, match_end))
+                    continue
+                window[1] = match_start
+            if len(windows) == self.max_snippets:
+                break
+            previous_end = windows[-1][1] if windows else 0
+            windows.append(
+                [
+                    max(0, match_start - half, previous_end),
+                    min(len(text), match_end + half),
+                    [(match_start, match_end)],
+                ]
+            )
+
+        snippets = []
+        for start, end, matches in windows:
+            # Do not cut words at the edges of the snippet.
+            if start > 0:
+                space = text.find(" ", start, matches[0][0])
+                start = space + 1 if space != -1 else start
+            if end < len(text):
+                space = text.rfind(" ", matches[-1][1], end)
+                end = space if space != -1 else end
+            snippet = self._mark(text, matches, start, end).strip()
+            prefix = "…" if start > 0 else ""
+            suffix = "…" if end < len(text) else ""
+            snippets.append(f"{prefix}{snippet}{suffix}")
+        return snippets
+
+
+@lru_cache(maxsize=1024)
+def get_highlighter(query: str) -> Highlighter:
+    """
+    Return the compiled highlighter of a query, reused across requests.
+    """
+    return Highlighter(query)
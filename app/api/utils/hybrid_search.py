@@ -0,0 +1,235 @@
+"""
+This module provides hybrid (dense + sparse) search using the Qdrant server.
+
+Dense and sparse retrieval run as two prefetches of a single `query_points`
+request and Qdrant fuses them server side (RRF or DBSF).
+"""
+
+import logging
+import time
+from typing import List
+from qdrant_client import models
+from qdrant_client.qdrant_fastembed import IDF_EMBEDDING_MODELS
+from app.settings import (
+    PARENT_ID_FIELD_NAME,
+    SPARSE_EMBEDDINGS_MODEL,
+    HYBRID_FUSION,
+    HYBRID_PREFETCH_LIMIT,
+)
+from .client_registry import get_client
+from .highlighter import get_highlighter
+from .neural_search import NeuralSearcher, normalize_query, query_embedding_cache
+
+logger = logging.getLogger(__name__)
+
+FUSIONS = {"rrf": models.Fusion.RRF, "dbsf": models.Fusion.DBSF}
+
+
+def sparse_vector_name(model_name: str = SPARSE_EMBEDDINGS_MODEL) -> str:
+    """
+    Return the name of the sparse vector, following FastEmbed's convention.
+    """
+    return f"fast-sparse-{model_name.split('/')[-1].lower()}"
+
+
+def sparse_vector_params() -> dict:
+    """
+    Return the `sparse_vectors_config` of a hybrid collection.
+    """
+    modifier = (
+        models.Modifier.IDF if SPARSE_EMBEDDINGS_MODEL in IDF_EMBEDDING_MODELS else None
+    )
+    return {
+        sparse_vector_name(): models.SparseVectorParams(
+            index=models.SparseIndexParams(on_disk=True),
+            modifier=modifier,
+        )
+    }
+
+
+def embed_sparse_documents(
+    client, documents: List[str], batch_size: int = 64
+) -> List[models.SparseVector]:
+    """
+    Embed documents with the sparse model, in batches.
+    """
+    sparse_model = client._get_or_init_sparse_model(model_name=SPARSE_EMBEDDINGS_MODEL)
+    return [
+        models.SparseVector(
+            indices=embedding.indices.tolist(), values=embedding.values.tolist()
+        )
+        for embedding in sparse_model.embed(documents, batch_size=batch_size)
+    ]
+
+
+class HybridSearcher:
+    def __init__(self, collection_name: str, client=None, fusion: str = HYBRID_FUSION):
+        self.collection_name = collection_name
+        self.client = client if client is not None else get_client()
+        if fusion not in FUSIONS:
+            raise ValueError(f"Unknown fusion '{fusion}', use one of {list(FUSIONS)}.")
+        self.fusion = FUSIONS[fusion]
+        self.dense_searcher = NeuralSearcher(collection_name, client=self.client)
+
+    def embed_sparse_queries(self, texts: List[str]) -> List[models.SparseVector]:
+        """
+        Return one sparse query vector per text, embedding cache misses in a
+        single model call.
+        """
+        keys = [(SPARSE_EMBEDDINGS_MODEL, normalize_query(text)) for text in texts]
+        vectors = [query_embedding_cache.get(key) for key in keys]
+        missing = {key[1]: key for key, vector in zip(keys, vectors) if vector is None}
+        if missing:
+            sparse_model = self.client._get_or_init_sparse_model(
+                model_name=SPARSE_EMBEDDINGS_MODEL
+            )
+            computed = {}
+            for key, embedding in zip(
+                missing.values(), sparse_model.query_embed(query=list(missing))
+            ):
+                computed[key] = models.SparseVector(
+                    indices=embedding.indices.tolist(),
+                    values=embedding.values.tolist(),
+                )
+                query_embedding_cache.set(key, computed[key])
+            vectors = [
+                vector if vector is not None else computed[key]
+                for key, vector in zip(keys, vectors)
+            ]
+        return vectors
+
+    def build_request(
+        self,
+        dense_vector: List[float],
+        sparse_vector: models.SparseVector,
+        filter_: dict = None,
+        search_limit: int = 10,
+    ) -> models.QueryRequest:
+        """
+        Build one fused query: a dense and a sparse prefetch, combined by
+        `self.fusion` on the server.
+        """
+        query_filter = models.Filter(**filter_) if filter_ is not None else None
+        prefetch_limit = max(search_limit, HYBRID_PREFETCH_LIMIT)
+        return models.QueryRequest(
+            prefetch=[
+                models.Prefetch(
+                    query=dense_vector,
+                    using=self.client.get_vector_field_name(),
+                    filter=query_filter,
+                    limit=prefetch_limit,
+                ),
+                models.Prefetch(
+                    query=sparse_vector,
+                    using=sparse_vector_name(),
+                    filter=query_filter,
+                    limit=prefetch_limit,
+                ),
+            ],
+            query=models.FusionQuery(fusion=self.fusion),
+            limit=search_limit,
+            with_payload=True,
+        )
+
+    def build_requests(
+        self, queries: List[dict], dense_vectors=None, sparse_vectors=None
+    ):
+        """
+        Build the fused requests of several queries ("q", "limit", "filter"),
+        embedding whatever vectors are not given.
+        """
+        texts = [query["q"] for query in queries]
+        if dense_vectors is None:
+            dense_vectors = self.dense_searcher.embed_queries(texts)
+        if sparse_vectors is None:
+            sparse_vectors = self.embed_sparse_queries(texts)
+        return [
+            self.build_request(
+                dense_vector,
+                sparse_vector,
+                filter_=query.get("filter"),
+                search_limit=query.get("limit", 10),
+            )
+            for query, dense_vector, sparse_vector in zip(
+                queries, dense_vectors, sparse_vectors
+            )
+        ]
+
+    def search_batch(
+        self, queries: List[dict], dense_vectors=None, sparse_vectors=None
+    ):
+        """
+        Run several hybrid queries in one `query_batch_points` round trip.
+
+        Returns:
+            List[List[dict]]: The hits of each query, in order.
+        """
+        requests = self.build_requests(queries, dense_vectors, sparse_vectors)
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name, requests=requests
+        )
+        return [
+            NeuralSearcher.format_hits(
+                response.points,
+                get_highlighter(query["q"]) if query.get("highlight") else None,
+            )
+            for query, response in zip(queries, responses)
+        ]
+
+    def search_points(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        collapse: bool = False,
+    ) -> list:
+        """
+        Return the raw fused `ScoredPoint`s of a search, unformatted. With
+        `collapse`, only the best chunk of each document is returned.
+        """
+        request = self.build_requests(
+            [{"q": text, "filter": filter_, "limit": search_limit}]
+        )[0]
+        if collapse:
+            groups = self.client.query_points_groups(
+                collection_name=self.collection_name,
+                prefetch=request.prefetch,
+                query=request.query,
+                group_by=PARENT_ID_FIELD_NAME,
+                group_size=1,
+                limit=search_limit,
+                with_payload=True,
+            )
+            return [group.hits[0] for group in groups.groups]
+        return self.client.query_batch_points(
+            collection_name=self.collection_name, requests=[request]
+        )[0].points
+
+    def search(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        highlight: bool = False,
+        collapse: bool = False,
+    ) -> List[dict]:
+        start_time = time.time()
+        if collapse:
+            hits = NeuralSearcher.format_hits(
+                self.search_points(text, filter_, search_limit, collapse=True),
+                get_highlighter(text) if highlight else None,
+            )
+        else:
+            hits = self.search_batch(
+                [
+                    {
+                        "q": text,
+                        "filter": filter_,
+                        "limit": search_limit,
+                        "highlight": highlight,
+                    }
+                ]
+            )[0]
+        if not hits:
+            logger.info("No hits found for query: %s with filter: %s", text, filter_)
+        return hits, start_time
@@ -0,0 +1,228 @@
+"""
+This module prepares the images of the figures for OCR, with NumPy.
+
+A figure goes through the steps enabled in the settings, in this order:
+grayscale conversion, downscaling to `OCR_PREPROCESS_DPI`, deskewing (the
+angle of the text lines is found from the row profiles of the dark pixels)
+and adaptive binarization (each pixel against the mean of its neighbourhood,
+computed from an integral image), so large or noisy scans reach Tesseract
+small and clean. The image is copied into a NumPy array, the steps work on
+arrays (only the deskew rotation and the downscaling by a fractional factor go
+through Pillow) and the result is converted back with `Image.fromarray`.
+
+The time spent in each step is recorded per process, see `timing_stats`. The
+PDF worker processes send theirs back with each page range (`add_timings`).
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+import numpy as np
+from PIL import Image
+from app.settings import (
+    OCR_PREPROCESS_BINARIZE,
+    OCR_PREPROCESS_DESKEW,
+    OCR_PREPROCESS_DPI,
+    OCR_PREPROCESS_GRAYSCALE,
+    PDF_OCR_DPI,
+)
+
+logger = logging.getLogger(__name__)
+
+# `deskew_angle` finds skews of up to SKEW_RANGE degrees, to SKEW_STEP degrees
+SKEW_RANGE = 5.0
+SKEW_STEP = 0.25
+# At most this many dark pixels are projected for each angle
+DESKEW_SAMPLE = 200_000
+
+# `binarize` keeps a pixel white unless it is this much darker than the mean
+# of its neighbourhood
+BINARIZE_SENSITIVITY = 0.15
+
+_timings: Dict[str, list] = {}
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def _timed(step: str, timings: dict):
+    start = time.perf_counter()
+    yield
+    timings[step] = time.perf_counter() - start
+
+
+def preprocessing_options() -> dict:
+    """
+    Return the enabled steps, part of the extraction options of a page.
+    """
+    return {
+        "grayscale": OCR_PREPROCESS_GRAYSCALE,
+        "target_dpi": OCR_PREPROCESS_DPI,
+        "deskew": OCR_PREPROCESS_DESKEW,
+        "binarize": OCR_PREPROCESS_BINARIZE,
+    }
+
+
+def grayscale(pixels: np.ndarray) -> np.ndarray:
+    """
+    Return the luminance (ITU-R 601) of RGB(A) `pixels` as uint8.
+    """
+    if pixels.ndim == 2:
+        return pixels
+    luminance = pixels[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return luminance.astype(np.uint8)
+
+
+def downscale(pixels: np.ndarray, dpi: float, target_dpi: float) -> np.ndarray:
+    """
+    Reduce `pixels` rendered at `dpi` to `target_dpi`, each new pixel being
+    the mean of the ones it covers: blocks of pixels for an integer factor,
+    Pillow's box filter otherwise. Images at or below `target_dpi` are
+    returned as they are.
+    """
+    if target_dpi <= 0 or dpi <= target_dpi:
+        return pixels
+    factor = dpi / target_dpi
+    if not factor.is_integer():
+        size = (
+            max(round(pixels.shape[1] / factor), 1),
+            max(round(pixels.shape[0] / factor), 1),
+        )
+        return np.asarray(Image.fromarray(pixels).resize(size, Image.BOX))
+    factor = int(factor)
+    height = pixels.shape[0] // factor * factor
+    width = pixels.shape[1] // factor * factor
+    blocks = pixels[:height, :width].reshape(
+        height // factor, factor, width // factor, factor, *pixels.shape[2:]
+    )
+    return blocks.mean(axis=(1, 3)).astype(np.uint8)
+
+
+def deskew_angle(pixels: np.ndarray) -> float:
+    """
+    Return the angle in degrees (counterclockwise) by which the text lines of
+    the grayscale `pixels` are rotated: the one whose projection of the dark
+    pixels on rows has the sharpest profile.
+    """
+    rows, columns = np.nonzero(pixels < 128)
+    if rows.size < 2:
+        return 0.0
+    # A sample of the dark pixels is enough to find the angle of a large scan
+    step = rows.size // DESKEW_SAMPLE + 1
+    rows, columns = rows[::step], columns[::step]
+
+    def sharpness(angle):
+        shifted = rows + columns * np.tan(np.radians(angle))
+        profile = np.bincount((shifted - shifted.min()).astype(np.int64))
+        return float(np.square(profile, dtype=np.float64).sum())
+
+    # Every degree first, then every SKEW_STEP around the best one
+    coarse = max(np.arange(-SKEW_RANGE, SKEW_RANGE + 0.5, 1.0), key=sharpness)
+    fine = np.arange(coarse - 1 + SKEW_STEP, coarse + 1, SKEW_STEP)
+    return float(max(fine, key=sharpness))
+
+
+def binarize(pixels: np.ndarray, window: int) -> np.ndarray:
+    """
+    Return grayscale `pixels` as black (0) and white (255): a pixel is black
+    when it is `BINARIZE_SENSITIVITY` darker than the mean of the `window`
+    pixels square around it.
+    """
+    height, width = pixels.shape
+    half = max(window // 2, 1)
+    integral = np.zeros((height + 1, width + 1), dtype=np.int64)
+    integral[1:, 1:] = pixels.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+    top = np.clip(np.arange(height) - half, 0, height)
+    bottom = np.clip(np.arange(height) + half + 1, 0, height)
+    left = np.clip(np.arange(width) - half, 0, width)
+    right = np.clip(np.arange(width) + half + 1, 0, width)
+    # The sums of the windows, in place to keep a single image-sized array
+    sums = integral[np.ix_(bottom, right)]
+    sums -= integral[np.ix_(top, right)]
+    sums -= integral[np.ix_(bottom, left)]
+    sums += integral[np.ix_(top, left)]
+    areas = np.outer(bottom - top, right - left)
+    dark = pixels * areas < sums * (1 - BINARIZE_SENSITIVITY)
+    return np.where(dark, 0, 255).astype(np.uint8)
+
+
+def preprocess(image: Image.Image) -> Tuple[Image.Image, Dict[str, float]]:
+    """
+    Run the enabled steps on `image`, whose resolution is read from its
+    "dpi" info (`PDF_OCR_DPI` by default).
+
+    Returns:
+        Tuple[Image.Image, Dict[str, float]]: The image for OCR and the
+        seconds spent in each step that ran.
+    """
+    timings: Dict[str, float] = {}
+    dpi = float(image.info.get("dpi", (PDF_OCR_DPI,))[0])
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    pixels = np.asarray(image)
+    if OCR_PREPROCESS_GRAYSCALE:
+        with _timed("grayscale", timings):
+            pixels = grayscale(pixels)
+    if OCR_PREPROCESS_DPI:
+        with _timed("downscale", timings):
+            scaled = downscale(pixels, dpi, OCR_PREPROCESS_DPI)
+            dpi *= scaled.shape[1] / max(pixels.shape[1], 1)
+            pixels = scaled
+    if OCR_PREPROCESS_DESKEW and pixels.ndim == 2:
+        with _timed("deskew", timings):
+            angle = deskew_angle(pixels)
+            if angle:
+                rotated = Image.fromarray(pixels).rotate(
+                    -angle, resample=Image.BILINEAR, expand=True, fillcolor=255
+                )
+                pixels = np.asarray(rotated)
+    if OCR_PREPROCESS_BINARIZE and pixels.ndim == 2:
+        with _timed("binarize", timings):
+            # A neighbourhood of about a sixth of an inch, a line of text
+            pixels = binarize(pixels, int(dpi / 6) | 1)
+
+    _record(timings)
+    logger.debug(f"Preprocessed an image for OCR: {timings}")
+    result = Image.fromarray(np.ascontiguousarray(pixels))
+    result.info["dpi"] = (dpi, dpi)
+    return result, timings
+
+
+def _record(timings: Dict[str, float]):
+    with _timings_lock:
+        for step, seconds in timings.items():
+            totals = _timings.setdefault(step, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+
+def reset_timings():
+    """
+    Clear the timings recorded by this process.
+    """
+    with _timings_lock:
+        _timings.clear()
+
+
+def add_timings(stats: dict):
+    """
+    Add the `timing_stats` of another process to the timings of this one.
+    """
+    with _timings_lock:
+        for step, step_stats in stats.items():
+            totals = _timings.setdefault(step, [0, 0.0])
+            totals[0] += step_stats["images"]
+            totals[1] += step_stats["seconds"]
+
+
+def timing_stats() -> dict:
+    """
+    Return the number of images and the seconds spent in each step by this
+    process.
+    """
+    with _timings_lock:
+        return {
+            step: {"images": count, "seconds": round(seconds, 4)}
+            for step, (count, seconds) in _timings.items()
+        }
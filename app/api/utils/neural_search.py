@@ -6,59 +6,198 @@ import logging
 import time
 from typing import List
 from qdrant_client import models
-from .qdrant_connection import QdrantConnection
+from .client_registry import get_client
+from .highlighter import Highlighter, document_text, get_highlighter
+from .lru_cache import LRUCache
+from .text_search import HIDDEN_FIELDS
 from qdrant_client.models import Filter, FieldCondition, MatchText
-from app.settings import TEXT_FIELD_NAME
+from app.settings import (
+    PARENT_ID_FIELD_NAME,
+    TEXT_FIELD_NAME,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+)
 
 logger = logging.getLogger(__name__)
 
+# Query vectors keyed by (embedding model, normalized query text).
+query_embedding_cache = LRUCache(
+    maxsize=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL
+)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Collapse the whitespace of a query so trivially different spellings of
+    the same query share one cache entry.
+    """
+    return " ".join(text.split())
+
 
 class NeuralSearcher:
-    def __init__(self, collection_name: str):
+    def __init__(self, collection_name: str, client=None):
         self.collection_name = collection_name
-        qdrant_connection = QdrantConnection()
-        qdrant_connection.initialize_client()
-        self.client = qdrant_connection.client
+        self.client = client if client is not None else get_client()
 
-    def search(
-        self, text: str, filter_: dict = None, search_limit: int = 10
-    ) -> List[dict]:
-        query_filter = (
-            Filter(
-                must=[
-                    FieldCondition(
-                        key=TEXT_FIELD_NAME,
-                        match=MatchText(text=text),
-                    )
-                ]
-            )
-            if filter_ is None
-            else Filter(**filter_)
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Return the query vector for `text`, running the embedding model only
+        when it is not already in `query_embedding_cache`.
+        """
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Return one query vector per text. Cache misses are embedded together
+        in a single model call.
+        """
+        model_name = self.client.embedding_model_name
+        keys = [(model_name, normalize_query(text)) for text in texts]
+        vectors = [query_embedding_cache.get(key) for key in keys]
+        missing = {key[1]: key for key, vector in zip(keys, vectors) if vector is None}
+        if missing:
+            embedding_model = self.client._get_or_init_model(model_name=model_name)
+            embedded = embedding_model.query_embed(query=list(missing))
+            computed = {}
+            for key, vector in zip(missing.values(), embedded):
+                computed[key] = vector.tolist()
+                query_embedding_cache.set(key, computed[key])
+            vectors = [
+                vector if vector is not None else computed[key]
+                for key, vector in zip(keys, vectors)
+            ]
+        return vectors
+
+    @staticmethod
+    def build_filter(text: str, filter_: dict = None) -> Filter:
+        """
+        Return the caller's filter, or a full-text match on the query by default.
+        """
+        if filter_ is not None:
+            return Filter(**filter_)
+        return Filter(
+            must=[
+                FieldCondition(
+                    key=TEXT_FIELD_NAME,
+                    match=MatchText(text=text),
+                )
+            ]
         )
 
-        # logger.info(f"query_filter {query_filter} for {text}.")
-        start_time = time.time()
-        query_response = self.client.query(
+    @staticmethod
+    def format_hit(hit, highlighter: Highlighter = None) -> dict:
+        """
+        Convert one `ScoredPoint` into the response format, without the
+        document. With a `highlighter`, a "highlight" list of snippets is added.
+        """
+        result = {
+            "score": hit.score,
+            "data": {k: v for k, v in hit.payload.items() if k not in HIDDEN_FIELDS},
+        }
+        if highlighter is not None:
+            result["highlight"] = highlighter.snippets(
+                document_text(hit.payload.get(TEXT_FIELD_NAME))
+            )
+        return result
+
+    @classmethod
+    def format_hits(cls, hits, highlighter: Highlighter = None) -> List[dict]:
+        """
+        Convert `ScoredPoint`s into the response format, see `format_hit`.
+        """
+        return [cls.format_hit(hit, highlighter) for hit in hits]
+
+    def search_points(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        collapse: bool = False,
+    ) -> list:
+        """
+        Return the raw `ScoredPoint`s of a search, unformatted. With
+        `collapse`, only the best chunk of each document is returned.
+        """
+        query_vector = models.NamedVector(
+            name=self.client.get_vector_field_name(),
+            vector=self.embed_query(text),
+        )
+        query_filter = self.build_filter(text, filter_)
+        if collapse:
+            groups = self.client.search_groups(
+                collection_name=self.collection_name,
+                query_vector=query_vector,
+                query_filter=query_filter,
+                group_by=PARENT_ID_FIELD_NAME,
+                group_size=1,
+                limit=search_limit,
+                with_payload=True,
+            )
+            return [group.hits[0] for group in groups.groups]
+        query_response = self.client.search(
             collection_name=self.collection_name,
-            query_text=text,
+            query_vector=query_vector,
             query_filter=query_filter,
             limit=search_limit,
+            with_payload=True,
         )
         if query_response is None:
             logger.info(
                 "Query response is None for query: %s with filter: %s", text, filter_
             )
-            return [], start_time
-        else:
-            hits = [
-                {
-                    "score": hit.score,
-                    "data": {k: v for k, v in hit.metadata.items() if k != "document"},
-                }
-                for hit in query_response
-            ]
-            if not hits:
-                logger.info(
-                    "No hits found for query: %s with filter: %s", text, filter_
-                )
-            return hits, start_time
+            return []
+        return query_response
+
+    def search(
+        self,
+        text: str,
+        filter_: dict = None,
+        search_limit: int = 10,
+        highlight: bool = False,
+        collapse: bool = False,
+    ) -> List[dict]:
+        start_time = time.time()
+        hits = self.format_hits(
+            self.search_points(text, filter_, search_limit, collapse),
+            get_highlighter(text) if highlight else None,
+        )
+        if not hits:
+            logger.info("No hits found for query: %s with filter: %s", text, filter_)
+        return hits, start_time
+
+    def search_batch(self, queries: List[dict], vectors: List[List[float]] = None):
+        """
+        Run several searches against the collection in one `search_batch`
+        round trip.
+
+        Args:
+            queries (List[dict]): Items with "q" and optional "limit", "filter"
+            and "highlight".
+            vectors (List[List[float]], optional): Precomputed query vectors, one
+            per query. Embedded here when omitted.
+
+        Returns:
+            List[List[dict]]: The hits of each query, in order.
+        """
+        if vectors is None:
+            vectors = self.embed_queries([query["q"] for query in queries])
+        vector_name = self.client.get_vector_field_name()
+        requests = [
+            models.SearchRequest(
+                vector=models.NamedVector(name=vector_name, vector=vector),
+                filter=self.build_filter(query["q"], query.get("filter")),
+                limit=query.get("limit", 10),
+                with_payload=True,
+            )
+            for query, vector in zip(queries, vectors)
+        ]
+        responses = self.client.search_batch(
+            collection_name=self.collection_name, requests=requests
+        )
+        return [
+            self.format_hits(
+                response,
+                get_highlighter(query["q"]) if query.get("highlight") else None,
+            )
+            for query, response in zip(queries, responses)
+        ]
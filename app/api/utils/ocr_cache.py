@@ -0,0 +1,252 @@
+"""
+This module caches the OCR workflow results of the PDFs, so a document that is
+uploaded again is not extracted and OCRed again.
+
+Results are content-addressed: keyed by the SHA-256 of the file and the
+extraction options, one row per page, so a request for other pages of a known
+document only extracts the missing ones. The page count of each document is
+kept too, and a request whose pages are all cached is answered without
+opening the PDF. The store is a SQLite file (WAL mode) shared by the processes
+of the host; above `OCR_CACHE_MAX_BYTES` of results, the least recently used
+pages are evicted first. Writes keep an estimate of the size of the results
+and only sum the pages when it goes over the cap.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from app.settings import OCR_CACHE_MAX_BYTES, OCR_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_hash TEXT PRIMARY KEY,
+    page_count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pages (
+    file_hash TEXT NOT NULL,
+    options TEXT NOT NULL,
+    page_number INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (file_hash, options, page_number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+"""
+
+# SQLite limits the number of variables of a statement.
+_LOOKUP_BATCH = 500
+
+# Eviction frees this fraction of `max_bytes` below the cap, so a full cache
+# is not summed and evicted on every write.
+EVICT_FRACTION = 0.1
+
+
+def options_key(options: dict) -> str:
+    """
+    Return the canonical form of extraction `options`, part of the cache key.
+    """
+    return json.dumps(options, sort_keys=True, separators=(",", ":"))
+
+
+class OCRResultCache:
+    """
+    A persistent, size-capped cache of the pages extracted from PDFs.
+
+    Args:
+        path (str): The SQLite file, created if needed.
+        max_bytes (int): The maximum size of the cached results (JSON bytes).
+        Writes past it evict the least recently used pages.
+
+    Attributes:
+        hits (int): Pages found in the cache by this process.
+        misses (int): Pages that had to be extracted by this process.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Bytes summed at the last eviction plus the bytes written since by
+        # this process, None until the first write.
+        self._estimated_size = None
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return the connection of the current thread, sqlite3 connections
+        cannot be shared between threads.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def page_count(self, file_hash: str) -> Optional[int]:
+        """
+        Return the number of pages of the document, None if it is unknown.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT page_count FROM documents WHERE file_hash = ?", (file_hash,)
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def set_page_count(self, file_hash: str, page_count: int):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO documents (file_hash, page_count) VALUES (?, ?)",
+            (file_hash, page_count),
+        )
+
+    def get_pages(
+        self, file_hash: str, options: dict, page_numbers: List[int]
+    ) -> Dict[int, list]:
+        """
+        Return the cached content of the `page_numbers` (0-based) of the
+        document extracted with `options`, keyed by page number. Pages that
+        are not cached are missing from the result.
+        """
+        connection = self._connection()
+        key = options_key(options)
+        rows = []
+        for start in range(0, len(page_numbers), _LOOKUP_BATCH):
+            batch = page_numbers[start : start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(
+                connection.execute(
+                    "SELECT page_number, content FROM pages WHERE file_hash = ? "
+                    f"AND options = ? AND page_number IN ({placeholders})",
+                    [file_hash, key, *batch],
+                ).fetchall()
+            )
+        if rows:
+            connection.executemany(
+                "UPDATE pages SET last_used = ? "
+                "WHERE file_hash = ? AND options = ? AND page_number = ?",
+                [(time.time(), file_hash, key, number) for number, _ in rows],
+            )
+        with self._lock:
+            self.hits += len(rows)
+            self.misses += len(page_numbers) - len(rows)
+        return {number: json.loads(content) for number, content in rows}
+
+    def set_page(self, file_hash: str, options: dict, page_number: int, content):
+        """
+        Store the content of a page, then evict the least recently used pages
+        if the cache may be over `max_bytes`.
+        """
+        data = json.dumps(content)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO pages "
+            "(file_hash, options, page_number, content, size, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                file_hash,
+                options_key(options),
+                page_number,
+                data,
+                len(data),
+                time.time(),
+            ),
+        )
+        with self._lock:
+            if self._estimated_size is not None:
+                self._estimated_size += len(data)
+            full = self._estimated_size is None or self._estimated_size > self.max_bytes
+        if full:
+            self.evict()
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT TOTAL(size) FROM pages").fetchone()[0]
+
+    def evict(self):
+        """
+        Sum the size of the pages and delete the least recently used ones
+        until the cache is `EVICT_FRACTION` below `max_bytes`, then the
+        documents that have no page left.
+        """
+        connection = self._connection()
+        size = self.size()
+        excess = max(size - self.max_bytes * (1 - EVICT_FRACTION), 0)
+        with self._lock:
+            self._estimated_size = size - excess
+        if excess <= 0:
+            return
+        connection.execute(
+            "DELETE FROM pages WHERE (file_hash, options, page_number) IN ("
+            "SELECT file_hash, options, page_number FROM ("
+            "SELECT file_hash, options, page_number, "
+            "SUM(size) OVER (ORDER BY last_used ROWS UNBOUNDED PRECEDING) AS freed "
+            "FROM pages) WHERE freed - size < ?)",
+            (excess,),
+        )
+        connection.execute(
+            "DELETE FROM documents WHERE file_hash NOT IN "
+            "(SELECT DISTINCT file_hash FROM pages)"
+        )
+        logger.info("Evicted %s bytes of OCR results.", int(excess))
+
+    def clear(self):
+        """
+        Drop every cached result and reset the counters.
+        """
+        connection = self._connection()
+        connection.execute("DELETE FROM pages")
+        connection.execute("DELETE FROM documents")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self._estimated_size = None
+
+    def stats(self) -> dict:
+        """
+        Return the hit/miss counters of this process and the size of the cache.
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "size_bytes": int(self.size()),
+            "max_bytes": self.max_bytes,
+            "path": self.path,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """
+    Return the process-wide cache, or None when `OCR_CACHE_PATH` is empty or
+    the file cannot be opened.
+    """
+    global _cache  # pylint: disable=global-statement
+    if _cache is None and OCR_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = OCRResultCache(OCR_CACHE_PATH, OCR_CACHE_MAX_BYTES)
+                except sqlite3.Error as error:
+                    logger.error(
+                        "OCR result cache %s disabled: %s", OCR_CACHE_PATH, str(error)
+                    )
+                    return None
+    return _cache
@@ -0,0 +1,110 @@
+"""
+This module keeps the OCR engines of a process alive between images.
+
+`pytesseract` starts a Tesseract process, which loads the language data
+again, for every image. With `tesserocr` (in the requirements, built against
+the libtesseract-dev headers), each OCR thread keeps an initialized Tesseract
+API instead and the images are passed in memory, without encoding nor a
+process per image. When it cannot be imported, the threads fall back to
+`pytesseract` and a warning is logged.
+
+Each process (the Django processes and the workers of the PDF pool) runs
+`OCR_ENGINE_WORKERS` OCR threads, started on first use, each with its own
+engine. Tesseract releases the GIL, so the figures of a page are recognized
+in parallel.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import pytesseract
+from app.settings import OCR_ENGINE_WORKERS
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_fallback_logged = False
+
+
+class TesseractEngine:
+    """
+    An initialized Tesseract engine, used by one thread at a time.
+
+    Args:
+        language (str): The Tesseract language(s), e.g. "eng" or "eng+ron".
+    """
+
+    def __init__(self, language: str = "eng"):
+        self.language = language
+        self._api = None
+        if tesserocr is not None:
+            self._api = tesserocr.PyTessBaseAPI(lang=language)
+            logger.debug(f"Initialized a Tesseract engine for {language}")
+        else:
+            _log_fallback()
+
+    def recognize(self, image) -> str:
+        """
+        Return the text of the PIL `image`.
+        """
+        if self._api is None:
+            return pytesseract.image_to_string(image, lang=self.language)
+        self._api.SetImage(image)
+        return self._api.GetUTF8Text()
+
+    def close(self):
+        if self._api is not None:
+            self._api.End()
+            self._api = None
+
+
+def _log_fallback():
+    global _fallback_logged  # pylint: disable=global-statement
+    if not _fallback_logged:
+        _fallback_logged = True
+        logger.warning(
+            "tesserocr is not installed, OCR starts a Tesseract process per "
+            "image (pytesseract)"
+        )
+
+
+def get_engine() -> TesseractEngine:
+    """
+    Return the engine of the current thread, initialized on first use and
+    kept for the following images.
+    """
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        engine = _local.engine = TesseractEngine()
+    return engine
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_ocr_executor() -> ThreadPoolExecutor:
+    """
+    Return the OCR threads of the process.
+    """
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(OCR_ENGINE_WORKERS, 1),
+                    thread_name_prefix="ocr-engine",
+                )
+    return _executor
+
+
+def submit_ocr(function, *args) -> Future:
+    """
+    Run `function(*args)`, which uses `get_engine`, on an OCR thread.
+    """
+    return get_ocr_executor().submit(function, *args)
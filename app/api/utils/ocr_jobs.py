@@ -0,0 +1,328 @@
+"""
+This module runs PDF OCR workflows as background jobs, so a large scan does
+not hold an HTTP request (and a web worker) for minutes.
+
+Each Django process runs `OCR_JOB_WORKERS` job threads fed by a queue of at
+most `OCR_JOB_QUEUE_SIZE` waiting jobs; a job thread hands the pages to the PDF
+process pool and records its progress after every page. The status, progress
+and result of the jobs are kept in a SQLite file (WAL mode), so any process of
+the host can answer for a job accepted by another one, without a broker.
+Finished jobs are deleted `OCR_JOB_TTL` seconds after they end.
+
+The queue itself lives in the memory of its process. A runner refreshes its
+queued and running jobs every `OCR_JOB_HEARTBEAT` seconds; a job whose process
+died or was recycled misses these heartbeats and is marked failed after
+`OCR_JOB_STALE_TIMEOUT` seconds, then purged like the other finished jobs.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+from app.settings import (
+    OCR_JOB_HEARTBEAT,
+    OCR_JOB_QUEUE_SIZE,
+    OCR_JOB_STALE_TIMEOUT,
+    OCR_JOB_STORE_PATH,
+    OCR_JOB_TTL,
+    OCR_JOB_WORKERS,
+)
+from .pdf_pool import extract_document
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated);
+"""
+
+_FIELDS = ("status", "pages_done", "pages_total", "result", "error")
+
+STALE_ERROR = "The process running the job stopped before it ended."
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when `OCR_JOB_QUEUE_SIZE` jobs are already waiting.
+    """
+
+
+class JobStore:
+    """
+    The status, progress and result of the OCR jobs of a host.
+
+    Args:
+        path (str): The SQLite file, created if needed.
+        ttl (int): Seconds a finished job is kept.
+        stale_timeout (int): Seconds after which a queued or running job
+        that was not updated is marked failed.
+    """
+
+    def __init__(self, path: str, ttl: int = 86400, stale_timeout: int = 300):
+        self.path = path
+        self.ttl = ttl
+        self.stale_timeout = stale_timeout
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Return the connection of the current thread, sqlite3 connections
+        cannot be shared between threads.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def create(self) -> str:
+        """
+        Record a new queued job and return its ID. Expired jobs are purged.
+        """
+        self.purge()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (job_id, status, created, updated) VALUES (?, ?, ?, ?)",
+            (job_id, QUEUED, now, now),
+        )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        """
+        Set the given fields (status, pages_done, pages_total, result, error)
+        of a job. The result is stored as JSON.
+        """
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields if name in _FIELDS)
+        self._connection().execute(
+            f"UPDATE jobs SET {assignments}, updated = ? WHERE job_id = ?",
+            [fields[name] for name in fields if name in _FIELDS]
+            + [time.time(), job_id],
+        )
+
+    def touch(self, job_ids: list):
+        """
+        Record that the queued or running jobs of `job_ids` are still alive.
+        """
+        self._connection().executemany(
+            "UPDATE jobs SET updated = ? WHERE job_id = ? AND status IN (?, ?)",
+            [(time.time(), job_id, QUEUED, RUNNING) for job_id in job_ids],
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Return the job as a dict, or None if it is unknown or expired. A stale
+        job is returned as failed.
+        """
+        connection = self._connection()
+        connection.row_factory = sqlite3.Row
+        row = connection.execute(
+            "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        if (
+            job["status"] in (QUEUED, RUNNING)
+            and job["updated"] < time.time() - self.stale_timeout
+        ):
+            self.fail_stale()
+            return self.get(job_id)
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def delete(self, job_id: str):
+        self._connection().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def fail_stale(self):
+        """
+        Mark failed the queued and running jobs not updated for
+        `stale_timeout` seconds: their process is gone.
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = ?, error = ?, updated = ? "
+            "WHERE status IN (?, ?) AND updated < ?",
+            (FAILED, STALE_ERROR, now, QUEUED, RUNNING, now - self.stale_timeout),
+        )
+        if cursor.rowcount:
+            logger.warning(f"Marked {cursor.rowcount} stale OCR jobs as failed")
+
+    def purge(self):
+        """
+        Fail the stale jobs, then delete the jobs that ended more than `ttl`
+        seconds ago.
+        """
+        self.fail_stale()
+        self._connection().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?",
+            (DONE, FAILED, time.time() - self.ttl),
+        )
+
+
+class JobRunner:
+    """
+    The job threads of a process and their bounded queue.
+
+    Args:
+        store (JobStore): Where the jobs are recorded.
+        workers (int): The number of job threads, started on the first job.
+        queue_size (int): The maximum number of jobs waiting for a thread.
+        heartbeat (float): Seconds between the refreshes of the queued and
+        running jobs of the runner in the store.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = 2,
+        queue_size: int = 16,
+        heartbeat: float = 30,
+    ):
+        self.store = store
+        self.workers = workers
+        self.heartbeat = heartbeat
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._heartbeat_thread = None
+        # The queued and running jobs of this runner.
+        self._jobs = set()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"ocr-job-{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._beat, name="ocr-job-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                job_ids = list(self._jobs)
+            try:
+                self.store.touch(job_ids)
+            except sqlite3.Error as error:
+                logger.error(f"Failed to refresh the OCR jobs: {error}")
+
+    def submit(self, pdf_path: str, **options) -> str:
+        """
+        Queue the OCR workflow of `pdf_path` and return the job ID. The runner
+        owns the file and deletes it once the job ends. `options` are passed
+        to `extract_document` (e.g. `pages`).
+
+        Raises:
+            JobQueueFull: If the queue is full, the file is deleted.
+        """
+        self._start()
+        job_id = self.store.create()
+        with self._lock:
+            self._jobs.add(job_id)
+        try:
+            self._queue.put_nowait((job_id, pdf_path, options))
+        except queue.Full as error:
+            with self._lock:
+                self._jobs.discard(job_id)
+            self.store.delete(job_id)
+            _remove(pdf_path)
+            raise JobQueueFull("Too many OCR jobs queued, retry later.") from error
+        logger.debug(f"Queued OCR job {job_id}")
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, pdf_path, options = self._queue.get()
+            try:
+                self.run(job_id, pdf_path, **options)
+            finally:
+                self._queue.task_done()
+
+    def run(self, job_id: str, pdf_path: str, **options):
+        """
+        Run the OCR workflow of a job, recording its progress and its result
+        or error, then delete its file.
+        """
+
+        def progress(pages_done, pages_total):
+            self.store.update(job_id, pages_done=pages_done, pages_total=pages_total)
+
+        try:
+            self.store.update(job_id, status=RUNNING)
+            result = extract_document(pdf_path, progress, **options)
+            self.store.update(job_id, status=DONE, result=result)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception(f"OCR job {job_id} failed")
+            self.store.update(job_id, status=FAILED, error=str(error))
+        finally:
+            with self._lock:
+                self._jobs.discard(job_id)
+            _remove(pdf_path)
+
+    def join(self):
+        """
+        Wait until every queued job has ended.
+        """
+        self._queue.join()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """
+    Return the job runner of the process, with the host-wide job store.
+    """
+    global _runner  # pylint: disable=global-statement
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(
+                    JobStore(OCR_JOB_STORE_PATH, OCR_JOB_TTL, OCR_JOB_STALE_TIMEOUT),
+                    OCR_JOB_WORKERS,
+                    OCR_JOB_QUEUE_SIZE,
+                    OCR_JOB_HEARTBEAT,
+                )
+    return _runner
@@ -0,0 +1,91 @@
+"""
+This module indexes a PDF into a collection, page by page.
+
+The pages flow from the OCR workflow (`iter_document`, which reuses the OCR
+result cache) through chunking and embedding to the upserts as generators,
+`batch_size` pages at a time, so a long document is never held in memory as a
+whole. Each page is one record, with a point ID derived from the SHA-256 of
+the file and the page number, so indexing the same PDF again overwrites its
+points instead of duplicating them, and deletes the chunks left over when a
+page now has fewer.
+"""
+
+import logging
+from typing import Iterable, Iterator, Optional
+from .bulk_insert import batched
+from .qdrant_connection import point_id_for
+
+logger = logging.getLogger(__name__)
+
+
+def page_text(content: list) -> str:
+    """
+    Return the text of a page extracted by the OCR workflow: its whole page
+    content (text lines, tables and text from images, in reading order), one
+    element per line.
+    """
+    if not content:
+        return ""
+    return "\n".join(
+        element.strip()
+        for element in content[-1]
+        if isinstance(element, str) and element.strip()
+    )
+
+
+def index_pdf(
+    qdrant,
+    collection_name: str,
+    pages: Iterable[tuple],
+    file_hash: str,
+    payload: Optional[dict] = None,
+    batch_size: int = 16,
+) -> Iterator[dict]:
+    """
+    Insert the pages of a PDF into a collection in batches.
+
+    Args:
+        qdrant (QdrantConnection): The connection used for the upserts.
+        collection_name (str): The target collection.
+        pages (Iterable[tuple]): The ("Page_N", content) of the pages, as
+        yielded by `iter_document`.
+        file_hash (str): The SHA-256 of the PDF, part of the point IDs.
+        payload (dict, optional): Stored with every page, along with the file
+        hash and the page number.
+        batch_size (int): How many pages are embedded and upserted together.
+
+    Yields:
+        dict: One status entry per page, in page order, e.g.
+        {"page": 1, "status": "indexed"}, {"page": 2, "status": "empty"} for a
+        page without text, or {"page": 3, "error": "..."}.
+    """
+    for batch in batched(pages, batch_size):
+        records = []
+        for key, content in batch:
+            page_number = int(key.split("_")[1])
+            text = page_text(content)
+            if text:
+                records.append((page_number, text))
+        inserted = bool(records) and qdrant.insert_vectors(
+            collection_name,
+            [{"text": text} for _, text in records],
+            [
+                {**(payload or {}), "file_hash": file_hash, "page": page_number}
+                for page_number, _ in records
+            ],
+            batch_size=batch_size,
+            ids=[
+                point_id_for({"file_hash": file_hash, "page": page_number})
+                for page_number, _ in records
+            ],
+        )
+        indexed = {page_number for page_number, _ in records}
+        for key, _ in batch:
+            page_number = int(key.split("_")[1])
+            if page_number not in indexed:
+                yield {"page": page_number, "status": "empty"}
+            elif inserted:
+                yield {"page": page_number, "status": "indexed"}
+            else:
+                yield {"page": page_number, "error": "Failed to insert data"}
+        logger.debug(f"Indexed {len(records)} pages into {collection_name}")
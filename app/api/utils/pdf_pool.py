@@ -0,0 +1,229 @@
+"""
+This module spreads the pages of a PDF over a process pool.
+
+Figure OCR is CPU-bound and runs in Tesseract for seconds per page, so the
+pages of a document are split into ranges of `PDF_OCR_PAGES_PER_TASK` pages,
+each one extracted by a worker process that opens the file once. The pool has
+`PDF_OCR_WORKERS` processes, is started on first use and shared by the
+requests of the Django process. Results are put back in page order, merged
+with the pages found in the OCR result cache.
+"""
+
+import logging
+import multiprocessing
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+from app.settings import PDF_OCR_PAGES_PER_TASK, PDF_OCR_WORKERS
+from .image_preprocessing import add_timings, reset_timings, timing_stats
+from .ocr_cache import get_ocr_cache
+from .pdfhandler import (
+    FULL,
+    extract_page_range,
+    extract_pages,
+    extraction_options,
+    open_pdf,
+    page_key,
+    select_pages,
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Return the process-wide pool extracting PDF pages. Workers are forked
+    from a fork server rather than from the (threaded) web process.
+    """
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=PDF_OCR_WORKERS,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+    return _executor
+
+
+def _reset_executor(executor: ProcessPoolExecutor):
+    """
+    Drop `executor` after one of its workers died, the next request starts a
+    new pool.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def page_ranges(page_numbers, size: int) -> List[list]:
+    """
+    Split `page_numbers` into consecutive ranges of at most `size` pages.
+    """
+    page_numbers = list(page_numbers)
+    size = max(size, 1)
+    return [
+        page_numbers[start : start + size]
+        for start in range(0, len(page_numbers), size)
+    ]
+
+
+def _extract_range(pdf_path: str, page_numbers: List[int], mode: str = FULL):
+    """
+    Run `extract_page_range` in a worker process. The preprocessing timings
+    of the range are returned with its pages, to be added to those of the
+    Django process.
+    """
+    reset_timings()
+    pages = extract_page_range(pdf_path, page_numbers, mode)
+    return pages, timing_stats()
+
+
+def _extract_pages(pdf, pdf_path: str, page_numbers: List[int], mode: str = FULL):
+    """
+    Yield the (key, content) of the `page_numbers` of `pdf_path` extracted in
+    `mode`, in order:
+    from the open document `pdf` in the calling thread for a single range (or
+    when `PDF_OCR_WORKERS` is 1), otherwise in ranges on the process pool.
+    """
+    ranges = page_ranges(page_numbers, PDF_OCR_PAGES_PER_TASK)
+    if PDF_OCR_WORKERS <= 1 or len(ranges) <= 1:
+        yield from extract_pages(pdf, pdf_path, page_numbers, mode)
+        return
+
+    logger.debug(f"Extracting {len(page_numbers)} pages in {len(ranges)} tasks")
+    executor = get_executor()
+    # At most two ranges per worker are in flight, so a slow consumer does not
+    # pile up the pages of a long document in memory
+    remaining = iter(ranges)
+    pending = deque(
+        executor.submit(_extract_range, pdf_path, page_range, mode)
+        for page_range in islice(remaining, 2 * PDF_OCR_WORKERS)
+    )
+    try:
+        while pending:
+            pages, timings = pending.popleft().result()
+            add_timings(timings)
+            for page_range in islice(remaining, 1):
+                pending.append(
+                    executor.submit(_extract_range, pdf_path, page_range, mode)
+                )
+            yield from pages
+    except BrokenProcessPool:
+        logger.error("A PDF worker process died, restarting the pool.")
+        _reset_executor(executor)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _write_cache(write: Callable, *args) -> bool:
+    """
+    Call the OCR result cache `write` method, return False if it failed.
+    """
+    try:
+        write(*args)
+        return True
+    except sqlite3.Error as error:
+        logger.error("Failed to write the OCR result cache: %s", str(error))
+        return False
+
+
+def iter_document(
+    pdf_path: str,
+    progress: Optional[Callable] = None,
+    pages: Optional[List[tuple]] = None,
+    file_hash: Optional[str] = None,
+    mode: str = FULL,
+):
+    """
+    Yield the ("Page_N", content) of the pages of `pdf_path`, in page order.
+
+    With the `file_hash` of the file, pages are read from and written to the
+    OCR result cache: only the pages that are not cached are extracted, and
+    the PDF is not opened at all when every page is. When the cache fails
+    (locked or corrupt file), the pages are extracted without it.
+
+    Args:
+        pdf_path (str): The PDF file.
+        progress (Callable, optional): Called with (pages done, page count)
+        before the first page and after each page.
+        pages (List[tuple], optional): The page ranges to extract, as returned
+        by `parse_pages`. Every page by default.
+        file_hash (str, optional): The SHA-256 of the file.
+        mode (str): The extraction mode, `full` (default) or `text`, see
+        `extract_page`.
+
+    Raises:
+        PageRangeError: If `pages` starts after the last page.
+    """
+    report = progress or (lambda done, total: None)
+    cache = get_ocr_cache() if file_hash else None
+    options = extraction_options(mode)
+    page_count = None
+    cached = {}
+    if cache:
+        try:
+            page_count = cache.page_count(file_hash)
+            if page_count is not None:
+                page_numbers = select_pages(pages, page_count)
+                cached = cache.get_pages(file_hash, options, page_numbers)
+        except sqlite3.Error as error:
+            logger.error("Failed to read the OCR result cache: %s", str(error))
+            cache, page_count, cached = None, None, {}
+
+    pdf = None
+    fresh = None
+    try:
+        if page_count is None or len(cached) < len(page_numbers):
+            pdf = open_pdf(pdf_path, mode)
+            page_count = len(pdf.pages)
+            page_numbers = select_pages(pages, page_count)
+            if cache and not _write_cache(cache.set_page_count, file_hash, page_count):
+                cache = None
+            missing = [number for number in page_numbers if number not in cached]
+            fresh = _extract_pages(pdf, pdf_path, missing, mode)
+        else:
+            logger.debug(f"All {len(page_numbers)} pages found in the OCR cache")
+
+        report(0, len(page_numbers))
+        for done, page_number in enumerate(page_numbers, start=1):
+            if page_number in cached:
+                content = cached[page_number]
+            else:
+                _, content = next(fresh)
+                if cache and not _write_cache(
+                    cache.set_page, file_hash, options, page_number, content
+                ):
+                    cache = None
+            yield page_key(page_number), content
+            report(done, len(page_numbers))
+    finally:
+        if fresh is not None:
+            fresh.close()
+        if pdf is not None:
+            pdf.close()
+
+
+def extract_document(
+    pdf_path: str,
+    progress: Optional[Callable] = None,
+    pages: Optional[List[tuple]] = None,
+    file_hash: Optional[str] = None,
+    mode: str = FULL,
+) -> Dict[str, list]:
+    """
+    Return the content of the pages of `pdf_path` keyed by "Page_N", in page
+    order, see `iter_document`.
+    """
+    return dict(iter_document(pdf_path, progress, pages, file_hash, mode))
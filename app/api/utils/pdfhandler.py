@@ -1,9 +1,43 @@
+import logging
+import threading
+from contextlib import contextmanager
 from PIL import Image
-from pdf2image import convert_from_path
-import pytesseract
-import PyPDF2
+import pypdfium2
 from pdfminer.layout import LTTextContainer, LTChar, LTRect, LTFigure
 import pdfplumber
+from app.settings import (
+    PDF_OCR_DPI,
+    PDF_OCR_MIN_FIGURE_AREA,
+    PDF_OCR_TEXT_COVERAGE,
+)
+from .image_preprocessing import preprocess, preprocessing_options
+from .ocr_engine import get_engine, submit_ocr
+
+logger = logging.getLogger(__name__)
+
+# PDFium is not thread-safe, the threads of a process take turns rendering.
+_pdfium_lock = threading.Lock()
+
+# Extraction modes: `full` returns the fonts of the lines and the OCR text of
+# the figures, `text` only the lines and the tables.
+FULL = "full"
+TEXT = "text"
+MODES = (FULL, TEXT)
+
+# pdfplumber only runs the pdfminer layout analysis (text boxes and lines) when
+# it is given layout parameters, the defaults are those of `extract_pages`.
+# `extract_page` sorts the elements itself, so the text mode skips the
+# hierarchical grouping of the text boxes (`boxes_flow`).
+LAYOUT_PARAMS = {FULL: {}, TEXT: {"boxes_flow": None}}
+
+
+def open_pdf(pdf_path, mode=FULL):
+    """
+    Open `pdf_path` once for text, table and figure extraction in `mode`. The
+    pages of the returned pdfplumber document expose the pdfminer layout as
+    `page.layout` and its tables through `page.find_tables()`.
+    """
+    return pdfplumber.open(pdf_path, laparams=LAYOUT_PARAMS[mode])
 
 
 # Create a function to extract text
@@ -30,55 +64,90 @@ def text_extraction(element):
     return (line_text, format_per_line)
 
 
-# Create a function to crop the image elements from PDFs
-def crop_image(element, pageObj):
-    # Get the coordinates to crop the image from the PDF
-    [image_left, image_top, image_right, image_bottom] = [
-        element.x0,
-        element.y0,
-        element.x1,
-        element.y1,
-    ]
-    # Crop the page using coordinates (left, bottom, right, top)
-    pageObj.mediabox.lower_left = (image_left, image_bottom)
-    pageObj.mediabox.upper_right = (image_right, image_top)
-    # Save the cropped page to a new PDF
-    cropped_pdf_writer = PyPDF2.PdfWriter()
-    cropped_pdf_writer.add_page(pageObj)
-    # Save the cropped PDF to a new file
-    with open(
-        "cropped_image.pdf", "wb"
-    ) as cropped_pdf_file:  # todo rename to random filename
-        cropped_pdf_writer.write(cropped_pdf_file)
-
-
-# Create a function to convert the PDF to images
-def convert_to_images(
-    input_file,
-):
-    images = convert_from_path(input_file)
-    image = images[0]
-    output_file = "PDF_image.png"  # todo rename to random filename
-    image.save(output_file, "PNG")
+@contextmanager
+def open_renderer(pdf_path):
+    """
+    Open `pdf_path` with PDFium to render its figures, closed on exit.
+    """
+    with _pdfium_lock:
+        document = pypdfium2.PdfDocument(pdf_path)
+    try:
+        yield document
+    finally:
+        with _pdfium_lock:
+            document.close()
+
+
+# Create a function to render the image elements from PDFs
+def crop_image(element, layout, pdfium_page, dpi=PDF_OCR_DPI):
+    """
+    Render only the bounding box of the layout `element` of the page `layout`
+    at `dpi`, in memory, and return it as a PIL image. `pdfium_page` is the
+    same page opened with `open_renderer`.
+    """
+    # Get the margins to cut off around the image, (left, bottom, right, top)
+    crop = (
+        max(element.x0 - layout.x0, 0),
+        max(element.y0 - layout.y0, 0),
+        max(layout.x1 - element.x1, 0),
+        max(layout.y1 - element.y1, 0),
+    )
+    with _pdfium_lock:
+        bitmap = pdfium_page.render(scale=dpi / 72, crop=crop)
+        image = bitmap.to_pil()
+        bitmap.close()
+    image.info["dpi"] = (dpi, dpi)
+    return image
 
 
 # Create a function to read text from images
-def image_to_text(image_path):
-    # Read the image
-    img = Image.open(image_path)
-    # Extract the text from the image
-    text = pytesseract.image_to_string(img)
+def image_to_text(image):
+    # Read the image, unless it is already loaded
+    img = image if isinstance(image, Image.Image) else Image.open(image)
+    # Clean it up and shrink it for OCR, see `image_preprocessing`
+    img, _ = preprocess(img)
+    # Extract the text from the image with the engine of this thread, kept
+    # between images
+    text = get_engine().recognize(img)
     return text
 
 
+def element_area(element):
+    return max(element.x1 - element.x0, 0) * max(element.y1 - element.y0, 0)
+
+
+def text_coverage(layout):
+    """
+    Return the fraction of the area of the page `layout` covered by its text
+    layer (the boxes of the text elements with some visible character), 0
+    for a scanned page.
+    """
+    page_area = element_area(layout) or 1
+    text_area = sum(
+        element_area(element)
+        for element in layout
+        if isinstance(element, LTTextContainer) and element.get_text().strip()
+    )
+    return text_area / page_area
+
+
+def needs_ocr(element, layout, coverage):
+    """
+    Return whether the figure `element` of the page `layout` is sent to OCR:
+    every figure of a page whose text layer covers less than
+    `PDF_OCR_TEXT_COVERAGE` of it (an image-dominant page), otherwise only
+    the figures covering at least `PDF_OCR_MIN_FIGURE_AREA` of the page, so
+    logos and icons next to the text are skipped.
+    """
+    if coverage < PDF_OCR_TEXT_COVERAGE:
+        return True
+    return element_area(element) >= PDF_OCR_MIN_FIGURE_AREA * element_area(layout)
+
+
 # Extracting tables from the page
-def extract_table(pdf_path, page_num, table_num):
-    # Open the pdf file
-    pdf = pdfplumber.open(pdf_path)
-    # Find the examined page
-    table_page = pdf.pages[page_num]
-    # Extract the appropriate table
-    table = table_page.extract_tables()[table_num]
+def extract_table(tables, table_num):
+    # Extract the appropriate table from the ones found on the page
+    table = tables[table_num].extract()
     return table
 
 
@@ -102,3 +171,284 @@ def table_converter(table):
     # Removing the last line break
     table_string = table_string[:-1]
     return table_string
+
+
+# Extract the content of one page of a document opened with `open_pdf`
+def extract_page(page, pdfium_page, mode=FULL):
+    """
+    Return the content lists of the pdfplumber `page` (text, line formats,
+    text from images, text from tables and the whole page content, without
+    the empty ones). `pdfium_page` is the same page opened with
+    `open_renderer`, to render the figures from. In the `text` mode, the
+    fonts of the lines are not collected and the figures are not OCRed, so
+    `pdfium_page` can be None.
+    """
+    full = mode == FULL
+    # The pdfminer layout of the page, analysed once by pdfplumber
+    layout = page.layout
+    page_text = []
+    line_format = []
+    text_from_images = []
+    text_from_tables = []
+    page_content = []
+    # The (place in page_content, pending OCR or render error) of the images
+    ocr_results = []
+    # Initialize the number of the examined tables
+    table_num = 0
+    first_element = True
+    table_extraction_flag = False
+    # The tables of the page, found once on its first rectangle: finding them
+    # converts every character of the page, pages without rectangles skip it
+    tables = None
+    lower_side = 0
+    upper_side = 0
+
+    # Measure the text layer to decide which figures need OCR (none in the
+    # text mode)
+    coverage = text_coverage(layout) if full else 0.0
+    logger.debug(f"Text layer covers {coverage:.1%} of the page")
+
+    # Find all the elements
+    page_elements = [(element.y1, element) for element in layout._objs]
+    # Without a text layer the page is a scan (or text drawn as shapes): OCR
+    # the whole page once instead of its figures
+    whole_page_ocr = full and coverage == 0 and bool(page_elements)
+    if whole_page_ocr:
+        page_elements.insert(0, (layout.y1, layout))
+    # Sort all the elements as they appear in the page
+    page_elements.sort(key=lambda a: a[0], reverse=True)
+    logger.debug("Sorted page elements by their y1 position")
+
+    # Find the elements that composed a page
+    for i, component in enumerate(page_elements):
+        logger.debug(f"Processing component {i} of the page")
+        # Extract the element of the page layout
+        element = component[1]
+
+        # Check if the element is a text element
+        if isinstance(element, LTTextContainer):
+            logger.debug("Found a text element")
+            # Check if the text appeared in a table
+            if table_extraction_flag == False and not full:
+                # Only the text, without walking the characters for their fonts
+                line_text = element.get_text()
+                page_text.append(line_text)
+                page_content.append(line_text)
+            elif table_extraction_flag == False:
+                # Use the function to extract the text and format for each text element
+                line_text, format_per_line = text_extraction(element)
+                logger.debug(f"Extracted text: {line_text}")
+                # Append the text of each line to the page text
+                page_text.append(line_text)
+                # Append the format for each line containing text
+                line_format.append(format_per_line)
+                page_content.append(line_text)
+            else:
+                # Omit the text that appeared in a table
+                logger.debug("Omitted text in a table")
+
+        # Check the elements for images, or the whole page of a scan
+        if isinstance(element, LTFigure) and (
+            not full or whole_page_ocr or not needs_ocr(element, layout, coverage)
+        ):
+            logger.debug("Skipped an image element, no OCR needed.")
+        elif isinstance(element, LTFigure) or element is layout:
+            logger.debug("Found an image element, starting OCR process.")
+            try:
+                # Render the image from the PDF
+                image = crop_image(element, layout, pdfium_page)
+                # Extract the text from the image on the OCR threads, the
+                # figures of the page are recognized in parallel
+                ocr_results.append(
+                    (len(page_content), submit_ocr(image_to_text, image))
+                )
+            except Exception as e:
+                ocr_results.append((len(page_content), e))
+            # The text takes this place in the page content once recognized
+            page_content.append(None)
+
+        # Check the elements for tables
+        if isinstance(element, LTRect):
+            logger.debug("Found a table element")
+            if tables is None:
+                tables = page.find_tables()
+                logger.debug(f"Found {len(tables)} tables on the page")
+            # If the first rectangular element
+            if first_element == True and (table_num + 1) <= len(tables):
+                # Find the bounding box of the table
+                lower_side = layout.bbox[3] - tables[table_num].bbox[3]
+                upper_side = element.y1
+                logger.debug(f"Extracting table {table_num}")
+                # Extract the information from the table
+                table = extract_table(tables, table_num)
+                # Convert the table information in structured string format
+                table_string = table_converter(table)
+                logger.debug(f"Converted table to string: {table_string}")
+                # Append the table string into a list
+                text_from_tables.append(table_string)
+                page_content.append(table_string)
+                # Set the flag as True to avoid the content again
+                table_extraction_flag = True
+                # Make it another element
+                first_element = False
+                # Add a placeholder in the text and format lists
+                page_text.append("table")
+                if full:
+                    line_format.append("table")
+
+            # Check if we already extracted the tables from the page
+            if element.y0 >= lower_side and element.y1 <= upper_side:
+                logger.debug(
+                    "Element within the bounds of the extracted table, skipping"
+                )
+            elif i + 1 == len(page_elements) or not isinstance(
+                page_elements[i + 1][1], LTRect
+            ):
+                logger.debug("No more tables to extract, resetting flags")
+                table_extraction_flag = False
+                first_element = True
+                table_num += 1
+
+    # Collect the text of the images, in page order
+    for index, result in ocr_results:
+        try:
+            if isinstance(result, Exception):
+                raise result
+            image_text = result.result()
+            logger.debug(f"Extracted text from image: {image_text}")
+            if image_text.strip():  # Only add non-empty results
+                text_from_images.append(image_text)
+            page_content[index] = image_text
+            # Indicate that OCR was successfully performed on an image
+            logger.debug("OCR process completed successfully.")
+        except Exception as e:
+            logger.error(f"Error during OCR process: {str(e)}")
+            # Append error message to indicate OCR process failure
+            text_from_images.append("Error during OCR process.")
+            page_content[index] = "Error during OCR process."
+
+    # Filter out empty lists from the page content
+    return [
+        content
+        for content in [
+            page_text,
+            line_format,
+            text_from_images,
+            text_from_tables,
+            page_content,
+        ]
+        if content
+    ]
+
+
+def extraction_options(mode=FULL):
+    """
+    Return the settings that change what is extracted from a page in `mode`,
+    part of the key of its cached results.
+    """
+    if mode == TEXT:
+        return {"mode": TEXT}
+    return {
+        "mode": FULL,
+        "dpi": PDF_OCR_DPI,
+        "text_coverage": PDF_OCR_TEXT_COVERAGE,
+        "min_figure_area": PDF_OCR_MIN_FIGURE_AREA,
+        "preprocess": preprocessing_options(),
+    }
+
+
+def page_key(page_number):
+    """
+    Return the key of the 0-based `page_number` in the workflow results.
+    """
+    return "Page_" + str(page_number + 1)
+
+
+class PageRangeError(ValueError):
+    """
+    Raised when the requested pages are not in the document.
+    """
+
+
+def parse_pages(spec):
+    """
+    Parse a `pages` parameter such as "1-3,5,8-" (1-based and inclusive, "8-"
+    runs to the last page) into a list of (first, last) page ranges, with
+    last None for the open ones.
+
+    Raises:
+        ValueError: If the syntax is invalid.
+    """
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        try:
+            first = int(first)
+            last = (int(last) if last.strip() else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid pages: {spec!r}.") from None
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid pages: {spec!r}.")
+        ranges.append((first, last))
+    return ranges
+
+
+def select_pages(pages, page_count):
+    """
+    Return the sorted 0-based page numbers of the `pages` ranges returned by
+    `parse_pages` (every page when None) in a document of `page_count` pages.
+
+    Raises:
+        PageRangeError: If a range starts after the last page.
+    """
+    if pages is None:
+        return list(range(page_count))
+    page_numbers = set()
+    for first, last in pages:
+        if first > page_count:
+            raise PageRangeError(f"Page {first} is past the last page ({page_count}).")
+        last = page_count if last is None else min(last, page_count)
+        page_numbers.update(range(first - 1, last))
+    return sorted(page_numbers)
+
+
+def extract_pages(pdf, pdf_path, page_numbers, mode=FULL):
+    """
+    Yield the (key, content) of the `page_numbers` of the pdfplumber document
+    `pdf` opened from `pdf_path`, in order. The figures are rendered in memory
+    from a PDFium document opened once, in the `full` mode only.
+    """
+    if mode != FULL:
+        for pagenum in page_numbers:
+            page = pdf.pages[pagenum]
+            try:
+                content = extract_page(page, None, mode)
+            finally:
+                page.close()
+            yield page_key(pagenum), content
+        return
+
+    with open_renderer(pdf_path) as renderer:
+        for pagenum in page_numbers:
+            logger.debug(f"Processing page number: {pagenum}")
+            page = pdf.pages[pagenum]
+            with _pdfium_lock:
+                pdfium_page = renderer[pagenum]
+            try:
+                content = extract_page(page, pdfium_page)
+            finally:
+                # Release the parsed objects of the page before the next one
+                page.close()
+                with _pdfium_lock:
+                    pdfium_page.close()
+            logger.debug(f"Completed processing for page {pagenum}")
+            yield page_key(pagenum), content
+
+
+def extract_page_range(pdf_path, page_numbers, mode=FULL):
+    """
+    Open `pdf_path` and return the (key, content) of its `page_numbers` in
+    `mode`. This is the task run by the OCR process pool.
+    """
+    with open_pdf(pdf_path, mode) as pdf:
+        return list(extract_pages(pdf, pdf_path, page_numbers, mode))
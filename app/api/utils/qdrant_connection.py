@@ -9,15 +9,62 @@ Returns:
     Connection: A connection object to the Qdrant server.
 """
 
-import os
+import hashlib
 import logging
 import json
-from qdrant_client import QdrantClient, models
+import uuid
+from collections import defaultdict
+from qdrant_client import models
 from qdrant_client.models import Filter, FieldCondition, Range, MatchValue
-from app.settings import EMBEDDINGS_MODEL, TEXT_FIELD_NAME
+from app.settings import (
+    CHUNK_INDEX_FIELD_NAME,
+    CONTENT_HASH_FIELD_NAME,
+    PARENT_ID_FIELD_NAME,
+    TEXT_FIELD_NAME,
+)
+from .chunking import chunk_document, chunk_point_ids
+from .client_registry import get_client
+from .embedding_store import embed_documents
+from .result_cache import bump_generation
+from .hybrid_search import (
+    embed_sparse_documents,
+    sparse_vector_name,
+    sparse_vector_params,
+)
+from .lru_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# collection name -> whether it has the sparse vector of hybrid search.
+_hybrid_collections = LRUCache(maxsize=1024, ttl=300)
+
+# Namespace of the deterministic point IDs derived from filter_conditions.
+POINT_ID_NAMESPACE = uuid.UUID("6f1c7a52-4d0e-5b8a-9c3f-2e7d41b0a9c6")
+
+
+def point_id_for(filter_conditions: dict) -> str:
+    """
+    Return the point ID of the record identified by `filter_conditions`, a
+    UUIDv5 of its sorted identity keys. Values are compared as strings, so
+    {"companyID": 1772} and {"companyID": "1772"} name the same record.
+    """
+    identity = json.dumps(
+        {str(key): str(value) for key, value in filter_conditions.items()},
+        sort_keys=True,
+    )
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, identity))
+
+
+def content_hash(document) -> str:
+    """
+    Return the SHA-256 of the canonical JSON of `document` (sorted keys, no
+    whitespace), so equal documents hash equally however they were sent.
+    """
+    canonical = json.dumps(
+        document, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
 
 class QdrantConnection:
     """
@@ -36,27 +83,19 @@ class QdrantConnection:
         collections, inserting points, and running queries.
     """
 
-    def __init__(self):
-        self.initialize_client()
+    def __init__(self, client=None):
+        self.client = client
+        if self.client is None:
+            self.initialize_client()
 
     def initialize_client(self):
-        self.client = QdrantClient(
-            url=os.environ.get("QDRANT_URL"),
-            port=os.environ.get("QDRANT_PORT"),
-            prefer_grpc=True,  # Use gRPC for better performance
-            # api_key=os.environ.get("QDRANT_API_KEY"),
-        )
-        embedding_model_name = EMBEDDINGS_MODEL
-        if not self.client._FASTEMBED_INSTALLED:
-            return "FastEmbed is not installed. Install fastembed to use this feature."
-        if not hasattr(self.client, "model_set") or not self.client.model_set:
-            self.client.set_model(embedding_model_name=embedding_model_name)
-            self.client.model_set = True
-            # Check if the model is initialized & cls.embeddings_models is set with expected values
-            dim, _ = self.client._get_model_params(embedding_model_name)
-            assert dim == 384
-
-    def create_collection(self, collection_name: str, vector_size):
+        """
+        Attach the process-wide client from the registry. The gRPC channel and
+        the embedding model are shared, so this is cheap to call per request.
+        """
+        self.client = get_client()
+
+    def create_collection(self, collection_name: str, vector_size, hybrid=False):
         """
         This function creates a new collection in the Qdrant server.
 
@@ -65,6 +104,8 @@ class QdrantConnection:
             This name should be unique across the server.
             vector_size (int): The size of the vectors that will be stored in the
             collection. All vectors in a collection must be of the same size.
+            hybrid (bool, optional): Also configure a sparse vector, so the
+            collection supports `type=hybrid` search. Defaults to False.
 
         Raises:
             CollectionCreationError: If there is an issue creating the collection.
@@ -76,6 +117,7 @@ class QdrantConnection:
             self.client.create_collection(
                 collection_name=collection_name,
                 vectors_config=self.client.get_fastembed_vector_params(on_disk=True),
+                sparse_vectors_config=sparse_vector_params() if hybrid else None,
                 quantization_config=models.ScalarQuantization(
                     scalar=models.ScalarQuantizationConfig(
                         type=models.ScalarType.INT8, quantile=0.99, always_ram=True
@@ -93,6 +135,18 @@ class QdrantConnection:
                     lowercase=True,
                 ),
             )
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=CONTENT_HASH_FIELD_NAME,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=PARENT_ID_FIELD_NAME,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+            bump_generation(collection_name)
+            _hybrid_collections.set(collection_name, hybrid)
             logger.info("Collection %s created successfully.", collection_name)
         except Exception as error:
             error_message = str(error)
@@ -106,6 +160,267 @@ class QdrantConnection:
             )
             return formatted_error  # Return the error message instead of raising an exception
 
+    @staticmethod
+    def filter_from_conditions(filter_conditions: dict) -> models.Filter:
+        """
+        Build a filter matching every `key: value` pair of `filter_conditions`.
+        """
+        return models.Filter(
+            must=[
+                models.FieldCondition(key=key, match=models.MatchValue(value=value))
+                for key, value in filter_conditions.items()
+            ]
+        )
+
+    def is_hybrid(self, collection_name: str, create_missing: bool = False) -> bool:
+        """
+        Return True if the collection has the sparse vector used by hybrid
+        search. The answer is cached for a few minutes. A missing collection is
+        not hybrid, with `create_missing` it is created the way `client.add`
+        does on the first insert.
+        """
+        hybrid = _hybrid_collections.get(collection_name)
+        if hybrid is None:
+            try:
+                collection_info = self.client.get_collection(collection_name)
+            except Exception:  # pylint: disable=broad-except
+                if not create_missing:
+                    return False
+                self.client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=self.client.get_fastembed_vector_params(),
+                )
+                _hybrid_collections.set(collection_name, False)
+                return False
+            sparse_vectors = collection_info.config.params.sparse_vectors or {}
+            hybrid = sparse_vector_name() in sparse_vectors
+            _hybrid_collections.set(collection_name, hybrid)
+        return hybrid
+
+    def build_points(
+        self,
+        documents: list,
+        payloads: list,
+        batch_size: int = 64,
+        sparse=False,
+        ids: list = None,
+    ) -> list:
+        """
+        This function embeds documents and wraps them into points, the same
+        way `client.add` does, so they can be sent with `upsert` by any client.
+        Vectors already in the embedding store are not computed again.
+
+        Args:
+            documents (list): The document strings to embed.
+            payloads (list): One payload dictionary per document.
+            batch_size (int, optional): The embedding batch size. Defaults to 64.
+            sparse (bool, optional): Also compute the sparse vector of hybrid
+            collections. Defaults to False.
+            ids (list, optional): The point IDs, random UUIDs by default.
+
+        Returns:
+            list: One `PointStruct` per document.
+        """
+        if ids is None:
+            ids = [uuid.uuid4().hex for _ in documents]
+        vector_name = self.client.get_vector_field_name()
+        encoded_docs = embed_documents(self.client, documents, batch_size)
+        points = [
+            models.PointStruct(
+                id=point_id,
+                vector={vector_name: vector},
+                payload={"document": document, **(payload or {})},
+            )
+            for (document, vector), payload, point_id in zip(
+                encoded_docs, payloads, ids
+            )
+        ]
+        if sparse:
+            sparse_name = sparse_vector_name()
+            sparse_vectors = embed_sparse_documents(
+                self.client, [point.payload["document"] for point in points], batch_size
+            )
+            for point, sparse_vector in zip(points, sparse_vectors):
+                point.vector[sparse_name] = sparse_vector
+        return points
+
+    @staticmethod
+    def hash_lookup_requests(hashes: list) -> list:
+        """
+        Return one filter-only query per content hash, fetching the vector of
+        a point storing that hash. The filter is served by the keyword index.
+        """
+        return [
+            models.QueryRequest(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key=CONTENT_HASH_FIELD_NAME,
+                            match=models.MatchValue(value=hash_),
+                        )
+                    ]
+                ),
+                limit=1,
+                with_vector=True,
+                with_payload=False,
+            )
+            for hash_ in hashes
+        ]
+
+    def vectors_by_hash(self, collection_name: str, hashes: list) -> dict:
+        """
+        Return the vectors already stored for the given content hashes, so
+        identical documents are not embedded again. All the lookups go in a
+        single `query_batch_points` request. A missing collection has no
+        vectors.
+
+        Returns:
+            dict: content hash -> vector (all the named vectors of the point).
+        """
+        unique_hashes = list(dict.fromkeys(hashes))
+        if not unique_hashes:
+            return {}
+        try:
+            responses = self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=self.hash_lookup_requests(unique_hashes),
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            logger.debug(
+                "No stored vectors for collection %s: %s", collection_name, str(error)
+            )
+            return {}
+        return {
+            hash_: response.points[0].vector
+            for hash_, response in zip(unique_hashes, responses)
+            if response.points
+        }
+
+    def build_insert_points(
+        self,
+        collection_name,
+        documents: list,
+        payloads: list,
+        batch_size: int = 64,
+        known_vectors: dict = None,
+        ids: list = None,
+    ) -> list:
+        """
+        Return the points inserting `documents`, one per chunk (see
+        `chunk_document`), with their content hash and parent reference.
+        Documents of a single chunk whose content hash is already in the
+        collection reuse the stored vector, the other chunks are embedded in
+        batches. `known_vectors` (see `vectors_by_hash`) is looked up when not
+        given. `ids` are the parent IDs of the documents, random by default.
+        """
+        hashes = [content_hash(document) for document in documents]
+        if known_vectors is None:
+            known_vectors = self.vectors_by_hash(collection_name, hashes)
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+        points = []
+        chunks, chunk_payloads, chunk_ids = [], [], []
+        for document, payload, hash_, parent_id in zip(
+            documents, payloads, hashes, ids
+        ):
+            document_chunks = chunk_document(document)
+            base_payload = {
+                **(payload or {}),
+                CONTENT_HASH_FIELD_NAME: hash_,
+                PARENT_ID_FIELD_NAME: parent_id,
+            }
+            if len(document_chunks) == 1 and hash_ in known_vectors:
+                points.append(
+                    models.PointStruct(
+                        id=parent_id,
+                        vector=known_vectors[hash_],
+                        payload={
+                            TEXT_FIELD_NAME: document_chunks[0],
+                            **base_payload,
+                            CHUNK_INDEX_FIELD_NAME: 0,
+                        },
+                    )
+                )
+                continue
+            for index, point_id in enumerate(
+                chunk_point_ids(parent_id, len(document_chunks))
+            ):
+                chunk_payloads.append({**base_payload, CHUNK_INDEX_FIELD_NAME: index})
+                chunk_ids.append(point_id)
+            chunks.extend(document_chunks)
+        if chunks:
+            points.extend(
+                self.build_points(
+                    chunks,
+                    chunk_payloads,
+                    batch_size=batch_size,
+                    sparse=self.is_hybrid(collection_name),
+                    ids=chunk_ids,
+                )
+            )
+        return points
+
+    def _insert_documents(
+        self,
+        collection_name,
+        documents: list,
+        payloads: list,
+        batch_size: int = 64,
+        ids: list = None,
+    ):
+        """
+        Store `documents` with their `payloads` and content hash, the chunks
+        of `batch_size` documents per upsert. Vectors are reused from the collection or the
+        embedding store when possible, the other documents are embedded.
+        With `ids`, the chunks left over from a longer version of a document
+        are deleted in the same request.
+        """
+        self.is_hybrid(collection_name, create_missing=True)
+        for start in range(0, len(documents), batch_size):
+            points = self.build_insert_points(
+                collection_name,
+                documents[start : start + batch_size],
+                payloads[start : start + batch_size],
+                batch_size=batch_size,
+                ids=ids[start : start + batch_size] if ids else None,
+            )
+            if not ids:
+                self.client.upsert(collection_name=collection_name, points=points)
+                continue
+            chunk_ids = defaultdict(list)
+            for point in points:
+                chunk_ids[point.payload[PARENT_ID_FIELD_NAME]].append(point.id)
+            self.client.batch_update_points(
+                collection_name=collection_name,
+                update_operations=[
+                    models.UpsertOperation(upsert=models.PointsList(points=points)),
+                    *(
+                        self.stale_chunks_operation(parent_id, point_ids)
+                        for parent_id, point_ids in chunk_ids.items()
+                    ),
+                ],
+            )
+
+    @staticmethod
+    def stale_chunks_operation(parent_id: str, point_ids: list):
+        """
+        Return the deletion of the chunks of the document `parent_id` other
+        than `point_ids`, left over from a longer version of it.
+        """
+        return models.DeleteOperation(
+            delete=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key=PARENT_ID_FIELD_NAME,
+                            match=models.MatchValue(value=parent_id),
+                        )
+                    ],
+                    must_not=[models.HasIdCondition(has_id=point_ids)],
+                )
+            )
+        )
+
     def insert_vector(self, collection_name, document: dict, payload: dict):
         """
         This function inserts documents into a specified collection in the Qdrant server.
@@ -129,15 +444,8 @@ class QdrantConnection:
             bool: True if the insertion was successful, False otherwise.
         """
         try:
-            document_str = json.dumps(
-                document
-            )  # Convert document dict to a JSON string
-            self.client.add(
-                collection_name=collection_name,
-                documents=[document_str],
-                metadata=payload,
-                parallel=0,
-            )
+            self._insert_documents(collection_name, [document], payload)
+            bump_generation(collection_name)
             return True
         except Exception as error:
             logger.error(
@@ -147,61 +455,219 @@ class QdrantConnection:
             )
             return False
 
-    def update_vector(self, collection_name: str, filter_conditions: dict):
+    def insert_vectors(
+        self,
+        collection_name,
+        documents: list,
+        payloads: list,
+        batch_size: int = 64,
+        ids: list = None,
+    ):
         """
-        This function deletes a specific record from a collection in the Qdrant server.
+        This function inserts many documents into a collection, embedding and
+        upserting them in batches instead of one request per document.
+        Documents already stored in the collection are not embedded again.
 
         Args:
-            collection_name (str): The name of the collection from which the record
-            needs to be deleted.
-            filter_conditions (dict): A dictionary representing the conditions to filter
-            the vectors that need to be updated or deleted.
-
-        Raises:
-            DeletionError: If there is an issue deleting the record from the collection.
-            This could be due to the record not existing, issues with the collection,
-            or server issues.
+            collection_name (str): The name of the collection into which the
+            documents need to be inserted.
+            documents (list): The documents to embed, one per point.
+            payloads (list): One payload dictionary per document.
+            batch_size (int, optional): How many documents are embedded and
+            upserted per call. Defaults to 64.
+            ids (list, optional): The point IDs of the documents, so inserting
+            them again overwrites them. Random by default.
 
         Returns:
-            bool: True if the deletion was successful, False otherwise.
+            bool: True if the insertion was successful, False otherwise.
         """
+        try:
+            self._insert_documents(
+                collection_name, documents, payloads, batch_size, ids
+            )
+            bump_generation(collection_name)
+            return True
+        except Exception as error:
+            logger.error(
+                "Failed to insert %s vectors into collection %s: %s",
+                len(documents),
+                collection_name,
+                str(error),
+            )
+            return False
+
+    @staticmethod
+    def record_payload(document, payload: list, point_id: str) -> dict:
+        """
+        Return the payload shared by the points of a record: its payload, the
+        content hash of its document and its parent reference.
+        """
+        return {
+            **((payload[0] if payload else None) or {}),
+            CONTENT_HASH_FIELD_NAME: content_hash(document),
+            PARENT_ID_FIELD_NAME: point_id,
+        }
 
-        must_conditions = [
-            models.FieldCondition(key=key, match=models.MatchValue(value=value))
-            for key, value in filter_conditions.items()
+    def payload_operations(
+        self, stored: list, chunks: list, new_payload: dict, filter_conditions
+    ):
+        """
+        Return the operations of an update whose document is unchanged: the
+        deletion of the other points of the record (duplicates inserted before
+        IDs were deterministic) if the payload is unchanged too, else a
+        payload overwrite and that deletion. Return None
+        when the `stored` first point (from `retrieve`) is missing or its
+        content hash differs, or when the payload of a chunked document
+        changed: the document then has to be upserted.
+        """
+        hash_ = new_payload[CONTENT_HASH_FIELD_NAME]
+        if not stored or stored[0].payload.get(CONTENT_HASH_FIELD_NAME) != hash_:
+            return None
+        stored_payload = {
+            key: value
+            for key, value in stored[0].payload.items()
+            if key not in (TEXT_FIELD_NAME, CHUNK_INDEX_FIELD_NAME)
+        }
+        if stored_payload == new_payload:
+            point_ids = list(chunk_point_ids(stored[0].id, len(chunks)))
+            return [self.delete_duplicates_operation(point_ids, filter_conditions)]
+        if len(chunks) > 1:
+            return None
+        point_id = stored[0].id
+        return [
+            models.OverwritePayloadOperation(
+                overwrite_payload=models.SetPayload(
+                    payload={
+                        TEXT_FIELD_NAME: chunks[0],
+                        **new_payload,
+                        CHUNK_INDEX_FIELD_NAME: 0,
+                    },
+                    points=[point_id],
+                )
+            ),
+            self.delete_duplicates_operation([point_id], filter_conditions),
         ]
-        scroll_filter = models.Filter(must=must_conditions)
 
-        try:
-            scroll_response = self.client.scroll(
-                collection_name=collection_name,
-                scroll_filter=scroll_filter,
-                limit=100,
-                offset=0,
-                with_payload=True,
+    def delete_duplicates_operation(self, point_ids: list, filter_conditions: dict):
+        """
+        Delete the points of the record other than `point_ids`: points
+        matching `filter_conditions` (records inserted before IDs were
+        deterministic) and chunks left over from a longer version of it.
+        """
+        return models.DeleteOperation(
+            delete=models.FilterSelector(
+                filter=models.Filter(
+                    should=[
+                        self.filter_from_conditions(filter_conditions),
+                        models.FieldCondition(
+                            key=PARENT_ID_FIELD_NAME,
+                            match=models.MatchValue(value=point_ids[0]),
+                        ),
+                    ],
+                    must_not=[models.HasIdCondition(has_id=point_ids)],
+                )
             )
+        )
 
-            logger.debug(f"scroll_response: {scroll_response}")
+    def upsert_operations(
+        self,
+        collection_name: str,
+        point_id: str,
+        chunks: list,
+        new_payload: dict,
+        filter_conditions: dict,
+        vector=None,
+    ) -> list:
+        """
+        Return the operations upserting the chunks of the record under
+        `point_id` and the IDs derived from it, and deleting its other points.
+        The chunks are embedded unless the document is a single chunk and a
+        stored `vector` of the same content is given.
+        """
+        point_ids = list(chunk_point_ids(point_id, len(chunks)))
+        payloads = [
+            {**new_payload, CHUNK_INDEX_FIELD_NAME: index}
+            for index in range(len(chunks))
+        ]
+        if len(chunks) == 1 and vector is not None:
+            points = [
+                models.PointStruct(
+                    id=point_id,
+                    vector=vector,
+                    payload={TEXT_FIELD_NAME: chunks[0], **payloads[0]},
+                )
+            ]
+        else:
+            points = self.build_points(
+                chunks,
+                payloads,
+                sparse=self.is_hybrid(collection_name),
+                ids=point_ids,
+            )
+        return [
+            models.UpsertOperation(upsert=models.PointsList(points=points)),
+            self.delete_duplicates_operation(point_ids, filter_conditions),
+        ]
 
-            if not scroll_response[0]:  # Check if the scroll_response list is empty
-                logger.info("No records found matching the conditions.")
-                return False
+    def update_operations(
+        self, collection_name: str, filter_conditions: dict, document, payload: list
+    ):
+        """
+        Return the point ID of the record identified by `filter_conditions`
+        and the operations replacing it with `document` and `payload`, to run
+        in order in a single `batch_update_points` request.
 
-            point_ids = [record.id for record in scroll_response[0]]
-            if point_ids:
-                self.client.delete(
-                    collection_name=collection_name,
-                    points_selector=models.PointIdsList(points=point_ids),
-                )
-                deleted_ids = [str(point_id) for point_id in point_ids]
-                logger.info(f"Successfully deleted records with IDs: {deleted_ids}")
-                return deleted_ids
-            else:
-                logger.info("No records found matching the conditions.")
-                return False
+        The content hash is checked before embedding: an unchanged document
+        only overwrites the payload (or is a no-op), and a single-chunk
+        document stored elsewhere in the collection reuses that vector.
+        """
+        point_id = point_id_for(filter_conditions)
+        chunks = chunk_document(document)
+        new_payload = self.record_payload(document, payload, point_id)
+        stored = self.client.retrieve(
+            collection_name=collection_name, ids=[point_id], with_payload=True
+        )
+        operations = self.payload_operations(
+            stored, chunks, new_payload, filter_conditions
+        )
+        if operations is not None:
+            return point_id, operations
+        vector = None
+        if len(chunks) == 1:
+            hash_ = new_payload[CONTENT_HASH_FIELD_NAME]
+            vector = self.vectors_by_hash(collection_name, [hash_]).get(hash_)
+        return point_id, self.upsert_operations(
+            collection_name, point_id, chunks, new_payload, filter_conditions, vector
+        )
 
-        except Exception as e:
-            logger.error(f"Error updating data in vector database: {str(e)}")
-            raise Exception(
-                f"Error deleting records from collection {collection_name}: {str(e)}"
+    def upsert_vector(
+        self, collection_name: str, filter_conditions: dict, document, payload: list
+    ):
+        """
+        Replace the record identified by `filter_conditions` with `document`
+        and `payload`. The record is written under a deterministic ID in one
+        request, so it is never missing from search and repeating the update
+        is harmless. A missing record is created, an unchanged one is not
+        embedded again.
+
+        Returns:
+            str: The point ID of the record, or False if the update failed.
+        """
+        try:
+            point_id, operations = self.update_operations(
+                collection_name, filter_conditions, document, payload
+            )
+            if operations:
+                self.client.batch_update_points(
+                    collection_name=collection_name, update_operations=operations
+                )
+                bump_generation(collection_name)
+            return point_id
+        except Exception as error:
+            logger.error(
+                "Failed to update %s in collection %s: %s",
+                filter_conditions,
+                collection_name,
+                str(error),
             )
+            return False
@@ -0,0 +1,109 @@
+"""
+This module caches search responses through Django's cache framework.
+
+Every collection has a generation counter stored in the same cache. It is part
+of each result key and is bumped by every write to the collection, so writes
+invalidate that collection's entries without flushing the whole cache. With a
+shared backend (Redis, Memcached, file-based) several workers share both the
+results and the counters.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Optional
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_GENERATION_PREFIX = "search-generation"
+_RESULT_PREFIX = "search-results"
+
+
+def get_cache():
+    """
+    Return the cache backend configured by `SEARCH_CACHE_ALIAS`.
+    """
+    return caches[settings.SEARCH_CACHE_ALIAS]
+
+
+def _generation_key(collection_name: str) -> str:
+    return f"{_GENERATION_PREFIX}:{collection_name}"
+
+
+def get_generation(collection_name: str) -> int:
+    """
+    Return the current generation of a collection (0 if never written).
+    """
+    return get_cache().get(_generation_key(collection_name), 0)
+
+
+def bump_generation(collection_name: str):
+    """
+    Invalidate the cached results of one collection. Errors are logged and
+    never propagated, a cache outage must not fail a write.
+    """
+    cache = get_cache()
+    key = _generation_key(collection_name)
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr().
+        cache.set(key, 1, timeout=None)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.error(
+            "Failed to bump the cache generation of %s: %s",
+            collection_name,
+            str(error),
+        )
+
+
+def make_key(collection_name: str, **params) -> Optional[str]:
+    """
+    Build the cache key of a search from its parameters and the current
+    generation of the collection. Returns None when the generation cannot be
+    read, `get_results` and `set_results` then skip the cache.
+    """
+    try:
+        generation = get_generation(collection_name)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.error("Failed to read the search cache generation: %s", str(error))
+        return None
+    raw_key = json.dumps(
+        {
+            "collection_name": collection_name,
+            "generation": generation,
+            **params,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+    return f"{_RESULT_PREFIX}:{digest}"
+
+
+def get_results(key: Optional[str]):
+    """
+    Return the cached results stored under `key`, or None.
+    """
+    if key is None:
+        return None
+    try:
+        return get_cache().get(key)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.error("Failed to read the search cache: %s", str(error))
+        return None
+
+
+def set_results(key: Optional[str], results):
+    """
+    Store search results under `key` for `SEARCH_CACHE_TIMEOUT` seconds.
+    """
+    if key is None:
+        return
+    try:
+        get_cache().set(key, results)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.error("Failed to write the search cache: %s", str(error))
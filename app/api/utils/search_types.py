@@ -0,0 +1,19 @@
+"""
+This module defines the search types accepted by the search endpoints.
+"""
+
+TEXT = "text"
+NEURAL = "neural"
+HYBRID = "hybrid"
+
+
+def resolve_search_type(value: str) -> str:
+    """
+    Map the `type` parameter to a search type: text by default, hybrid when
+    asked for, and neural for anything else (the historical behaviour).
+    """
+    if not value or value == TEXT:
+        return TEXT
+    if value == HYBRID:
+        return HYBRID
+    return NEURAL
@@ -1,62 +1,322 @@
 """
 This module provides text search functionality using the Qdrant server.
+
+Text searches are full-text scrolls. The `next_page_offset` returned by each
+scroll is handed to the client as an opaque cursor, so the next page is a cheap
+continuation of the same scroll instead of a larger query.
 """
 
-import re
+import base64
+import binascii
+import json
 import time
 import logging
-from typing import List
-from qdrant_client.models import Filter, FieldCondition, MatchText
-from .qdrant_connection import QdrantConnection
-from app.settings import TEXT_FIELD_NAME
+from typing import Iterator, List, Optional, Tuple
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchText
+from .client_registry import get_client
+from .highlighter import Highlighter, document_text, get_highlighter
+from app.settings import (
+    CHUNK_INDEX_FIELD_NAME,
+    CONTENT_HASH_FIELD_NAME,
+    PARENT_ID_FIELD_NAME,
+    TEXT_FIELD_NAME,
+)
 
 logger = logging.getLogger(__name__)
 
+# Payload fields kept out of the hits.
+HIDDEN_FIELDS = (
+    TEXT_FIELD_NAME,
+    CONTENT_HASH_FIELD_NAME,
+    PARENT_ID_FIELD_NAME,
+    CHUNK_INDEX_FIELD_NAME,
+)
+
+
+def encode_cursor(offset) -> Optional[str]:
+    """
+    Wrap a scroll offset (point id) in an opaque, URL-safe cursor.
+    """
+    if offset is None:
+        return None
+    raw = json.dumps({"offset": offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """
+    Return the scroll offset of a cursor made by `encode_cursor`.
+    Raise ValueError if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset = json.loads(raw)["offset"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as error:
+        raise ValueError("Invalid cursor.") from error
+    if isinstance(offset, bool) or not isinstance(offset, (int, str)):
+        raise ValueError("Invalid cursor.")
+    return offset
+
 
 class TextSearcher:
 
-    def __init__(self, collection_name: str):
+    def __init__(self, collection_name: str, client=None):
         self.collection_name = collection_name
         self.highlight_field = TEXT_FIELD_NAME
-        qdrant_connection = QdrantConnection()
-        qdrant_connection.initialize_client()
-        self.client = qdrant_connection.client
+        self.client = client if client is not None else get_client()
 
     def highlight(self, record, text) -> dict:
-        text = record[self.highlight_field]
-
-        for word in text.lower().split():
-            if len(word) > 4:
-                pattern = re.compile(
-                    rf"(\b{re.escape(word)}?.?\b)", flags=re.IGNORECASE
-                )
-            else:
-                pattern = re.compile(rf"(\b{re.escape(word)}\b)", flags=re.IGNORECASE)
-            text = re.sub(pattern, r"<b>\1</b>", text)
-
-        record[self.highlight_field] = text
+        """
+        Wrap the words of the query `text` found in the record's document in
+        <b> tags, in a single pass.
+        """
+        record[self.highlight_field] = get_highlighter(text).highlight(
+            record[self.highlight_field]
+        )
         return record
 
-    def search(self, text: str, search_limit: int = 10) -> List[dict]:
-        start_time = time.time()
-        query_response = self.client.scroll(
+    @staticmethod
+    def build_filter(text: str, filter_: dict = None) -> Filter:
+        """
+        Return a full-text match on the query, narrowed by the caller's filter.
+        """
+        must = [
+            FieldCondition(
+                key=TEXT_FIELD_NAME,
+                match=MatchText(text=text),
+            )
+        ]
+        if filter_ is not None:
+            must.append(Filter(**filter_))
+        return Filter(must=must)
+
+    @staticmethod
+    def format_hit(record, highlighter: Highlighter = None) -> dict:
+        """
+        Convert one scrolled `Record` into the response format, without the
+        document. With a `highlighter`, a "highlight" list of snippets is added.
+        """
+        hit = {k: v for k, v in record.payload.items() if k not in HIDDEN_FIELDS}
+        if highlighter is not None:
+            hit["highlight"] = highlighter.snippets(
+                document_text(record.payload.get(TEXT_FIELD_NAME))
+            )
+        return hit
+
+    @classmethod
+    def format_hits(cls, records, highlighter: Highlighter = None) -> List[dict]:
+        """
+        Convert scrolled `Record`s into the response format, see `format_hit`.
+        """
+        return [cls.format_hit(record, highlighter) for record in records]
+
+    def scroll(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        cursor: str = None,
+        collapse: bool = False,
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Return the `Record`s of one page starting at `cursor`, and the cursor
+        of the next page (None after the last page). With `collapse`, see
+        `scroll_collapsed`.
+        """
+        if collapse:
+            return self.scroll_collapsed(text, search_limit, filter_, cursor)
+        records, next_offset = self.client.scroll(
             collection_name=self.collection_name,
-            scroll_filter=Filter(
-                must=[
-                    FieldCondition(
-                        key=TEXT_FIELD_NAME,
-                        match=MatchText(text=text),
-                    )
-                ]
-            ),
+            scroll_filter=self.build_filter(text, filter_),
             with_payload=True,
             with_vectors=False,
             limit=int(search_limit),
+            offset=decode_cursor(cursor),
+        )
+        return records, encode_cursor(next_offset)
+
+    @classmethod
+    def parents_filter(cls, text: str, filter_: dict, parent_ids: set) -> Filter:
+        """
+        Return the matches of the query among the chunks of `parent_ids`.
+        """
+        return Filter(
+            must=[
+                cls.build_filter(text, filter_),
+                FieldCondition(
+                    key=PARENT_ID_FIELD_NAME, match=MatchAny(any=list(parent_ids))
+                ),
+            ]
+        )
+
+    @staticmethod
+    def unseen_parents(records, seen: set) -> set:
+        """
+        Return the documents (parents) of `records` that are not in `seen`.
+        """
+        return {
+            record.payload[PARENT_ID_FIELD_NAME]
+            for record in records
+            if PARENT_ID_FIELD_NAME in record.payload
+        } - seen
+
+    @staticmethod
+    def collapse_page(
+        records, first_ids: dict, seen: set, collapsed: list, limit: int
+    ) -> Optional[int]:
+        """
+        Append to `collapsed` the records of a scrolled page that are the first
+        matching chunk of a document not in `seen`, until it holds `limit`
+        records. Return the position in `records` of the record that reached
+        `limit`, or None if the page did not fill it.
+        """
+        for position, record in enumerate(records):
+            parent_id = record.payload.get(PARENT_ID_FIELD_NAME, record.id)
+            if parent_id in seen:
+                continue
+            # Documents whose first chunk was on an earlier page
+            if first_ids.get(parent_id, record.id) != record.id:
+                continue
+            seen.add(parent_id)
+            collapsed.append(record)
+            if len(collapsed) == limit:
+                return position
+        return None
+
+    def first_chunk_ids(self, text: str, filter_: dict, parent_ids: set) -> dict:
+        """
+        Return the ID of the first matching chunk, in scroll order, of each
+        document (parent) of `parent_ids`.
+        """
+        scroll_filter = self.parents_filter(text, filter_, parent_ids)
+        remaining = set(parent_ids)
+        first_ids = {}
+        offset = None
+        while remaining:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                with_payload=[PARENT_ID_FIELD_NAME],
+                with_vectors=False,
+                limit=max(len(remaining), 64),
+                offset=offset,
+            )
+            for record in records:
+                parent_id = record.payload.get(PARENT_ID_FIELD_NAME)
+                if parent_id in remaining:
+                    first_ids[parent_id] = record.id
+                    remaining.discard(parent_id)
+            if offset is None:
+                break
+        return first_ids
+
+    def scroll_collapsed(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        cursor: str = None,
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Like `scroll`, with one `Record` per document (parent): scroll until
+        `search_limit` documents are found or the matches are exhausted. A
+        document belongs to the page of its first matching chunk, the chunks
+        found on later pages are skipped, so no document is repeated across
+        cursors.
+        """
+        limit = int(search_limit)
+        collapsed = []
+        seen = set()
+        offset = decode_cursor(cursor)
+        while True:
+            records, next_offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self.build_filter(text, filter_),
+                with_payload=True,
+                with_vectors=False,
+                limit=limit,
+                offset=offset,
+            )
+            unseen = self.unseen_parents(records, seen)
+            first_ids = self.first_chunk_ids(text, filter_, unseen) if unseen else {}
+            position = self.collapse_page(records, first_ids, seen, collapsed, limit)
+            if position is not None:
+                if position + 1 < len(records):
+                    next_offset = records[position + 1].id
+                return collapsed, encode_cursor(next_offset)
+            if next_offset is None:
+                return collapsed, None
+            offset = next_offset
+
+    def search_page(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        highlight: bool = False,
+        cursor: str = None,
+        collapse: bool = False,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Return one page of hits starting at `cursor`, and the cursor of the
+        next page (None after the last page). With `collapse`, the page holds
+        `search_limit` documents, one hit each (see `scroll_collapsed`).
+        """
+        records, next_cursor = self.scroll(
+            text, search_limit, filter_, cursor, collapse
+        )
+        hits = self.format_hits(records, get_highlighter(text) if highlight else None)
+        return hits, next_cursor
+
+    def iter_pages(
+        self,
+        text: str,
+        page_size: int = 10,
+        filter_: dict = None,
+        highlight: bool = False,
+        cursor: str = None,
+    ) -> Iterator[Tuple[List[dict], Optional[str]]]:
+        """
+        Scroll through all the hits page by page, yielding each page with the
+        cursor that resumes after it.
+        """
+        while True:
+            hits, cursor = self.search_page(text, page_size, filter_, highlight, cursor)
+            yield hits, cursor
+            if cursor is None:
+                return
+
+    def iter_records(
+        self,
+        text: str,
+        page_size: int = 10,
+        filter_: dict = None,
+        cursor: str = None,
+    ) -> Iterator:
+        """
+        Scroll through all the matching `Record`s, one page in memory at a time.
+        """
+        while True:
+            records, cursor = self.scroll(text, page_size, filter_, cursor)
+            yield from records
+            if cursor is None:
+                return
+
+    def search(
+        self,
+        text: str,
+        search_limit: int = 10,
+        filter_: dict = None,
+        highlight: bool = False,
+        cursor: str = None,
+        collapse: bool = False,
+    ) -> List[dict]:
+        start_time = time.time()
+        hits, _ = self.search_page(
+            text, search_limit, filter_, highlight, cursor, collapse
         )
-        hits = [
-            {k: v for k, v in hit.payload.items() if k != "document"}
-            for hit in query_response[0]
-        ]
         if not hits:
             logger.info("No hits found for query: %s", text)
         return hits, start_time
@@ -0,0 +1,49 @@
+"""
+This module hands uploaded files to the code that needs them on disk (PDFium,
+pdfplumber and the worker processes of the PDF pool read paths).
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def save_upload(uploaded_file):
+    """
+    Write `uploaded_file` to a new temporary file and return its path, the
+    caller deletes it.
+    """
+    fd, path = tempfile.mkstemp(prefix="ocr-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    return path
+
+
+def upload_hash(uploaded_file):
+    """
+    Return the SHA-256 of the content of `uploaded_file`, its key in the OCR
+    result cache.
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def upload_path(uploaded_file):
+    """
+    Yield the path of a file with the content of `uploaded_file`: the
+    temporary file Django already wrote for a large upload, without a copy,
+    or a new temporary file of the request, deleted on exit.
+    """
+    if hasattr(uploaded_file, "temporary_file_path"):
+        yield uploaded_file.temporary_file_path()
+        return
+    path = save_upload(uploaded_file)
+    try:
+        yield path
+    finally:
+        os.remove(path)
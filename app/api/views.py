@@ -14,23 +14,78 @@ import os.path
 import time
 import logging
 import json
+import grpc
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import (
     api_view,
+    parser_classes,
     permission_classes,
+    renderer_classes,
 )
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from api.utils.qdrant_connection import QdrantConnection
-from api.utils.neural_search import NeuralSearcher
-from api.utils.text_search import TextSearcher
+from api.utils.bulk_insert import bulk_insert
+from api.utils.pdf_indexing import index_pdf
+from api.utils.pdf_pool import iter_document
+from api.utils.pdfhandler import FULL, MODES, PageRangeError, parse_pages
+from api.utils.uploads import upload_hash, upload_path
+from api.utils import result_cache
+from api.utils.batch_search import batch_search
+from api.utils.embedding_store import get_embedding_store
+from api.utils.ocr_cache import get_ocr_cache
+from api.utils.neural_search import NeuralSearcher, query_embedding_cache
+from api.utils.highlighter import get_highlighter
+from api.utils.image_preprocessing import timing_stats
+from api.utils.hybrid_search import FUSIONS, HybridSearcher
+from api.utils.search_types import HYBRID, TEXT, resolve_search_type
+from api.utils.text_search import TextSearcher, decode_cursor
+from api.renderers import NDJSONRenderer
 from api.serializers import MessageSerializer
 
 
 logger = logging.getLogger(__name__)
 
+# The errors of a search, the Qdrant client raises the last three.
+SEARCH_ERRORS = (
+    ValueError,
+    ConnectionError,
+    KeyError,
+    TypeError,
+    IndexError,
+    grpc.RpcError,
+    ResponseHandlingException,
+    UnexpectedResponse,
+)
+
+
+def search_error_response(error: Exception) -> Response:
+    """
+    Log a failed search and return it as a 500 response.
+    """
+    logger.exception("Unhandled exception during search: %s", str(error))
+    return Response(
+        {"error": f"Failed to perform search due to an internal error. {str(error)}"},
+        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+
+
+def ndjson_response(items) -> StreamingHttpResponse:
+    """
+    Stream an iterable of JSON-serializable items, one NDJSON line each.
+    """
+    return StreamingHttpResponse(
+        (json.dumps(item) + "\n" for item in items),
+        content_type="application/x-ndjson",
+    )
+
 
 class HelloWorldApiView(APIView):
     """
@@ -53,8 +108,10 @@ def create_qdrant_collection_name(request):
     Create a new collection in Qdrant. Will create IDUser +
     namespace to be sure is unique/user specific.
     {
-        "namespace":  "SearchEngineGP"
+        "namespace":  "SearchEngineGP",
+        "hybrid": false
     }
+    "hybrid": true also configures a sparse vector, for type=hybrid searches.
     """
     user = request.user
     # collection_name = f"{user.id}_{request.data.get('collection_name')}"
@@ -67,8 +124,11 @@ def create_qdrant_collection_name(request):
 
     try:
         vector_size = int(os.getenv("VECTOR_SIZE", "1536"))
+        hybrid = request.data.get("hybrid") in (True, "1", "true", "True")
         qdrant = QdrantConnection()
-        creation_result = qdrant.create_collection(collection_name, vector_size)
+        creation_result = qdrant.create_collection(
+            collection_name, vector_size, hybrid=hybrid
+        )
         if creation_result is not None:  # If creation_result contains an error message
             return Response(
                 {"error": creation_result}, status=status.HTTP_400_BAD_REQUEST
@@ -116,7 +176,11 @@ def embed_data_into_vector_database(request):
         document_data = request.data.get("data")
 
         qdrant = QdrantConnection()
-        qdrant.insert_vector(collection_name, document_data, payload)
+        if not qdrant.insert_vector(collection_name, document_data, payload):
+            return Response(
+                {"error": f"Failed to insert data into {collection_name}."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
         response_data = {"SUCCESS": payload}
         return Response(response_data, status=status.HTTP_201_CREATED)
 
@@ -156,6 +220,10 @@ def update_data_into_vector_database(request):
         "data":  "Any other document-specific information which will be searchable"
     }
 
+    The record is stored under a point ID derived from "filter_conditions" and
+    upserted in one request, which also removes older points matching them.
+    A missing record is created, and repeating an update is harmless.
+
     Args:
         request (HttpRequest): The request object that encapsulates all of the
         HTTP request data. This includes data like the method (GET, POST, etc.),
@@ -181,29 +249,15 @@ def update_data_into_vector_database(request):
             )
 
         qdrant = QdrantConnection()
-        data_deleted = qdrant.update_vector(
-            collection_name=collection_name, filter_conditions=filter_conditions
+        point_id = qdrant.upsert_vector(
+            collection_name, filter_conditions, document_data, payload
         )
-        if data_deleted:
-            data_inserted = qdrant.insert_vector(
-                collection_name, document_data, payload
-            )
-            if data_inserted:
-                response_data = {
-                    "DELETED_IDS": data_deleted,
-                    "SUCCESS": payload,
-                }
-            else:
-                response_data = {
-                    "DELETED_IDS": data_deleted,
-                    "ERROR": "Failed to insert data",
-                }
-            return Response(response_data, status=status.HTTP_200_OK)
-        else:
+        if not point_id:
             return Response(
-                {"error": f"No records found for: {filter_conditions}"},
-                status=status.HTTP_404_NOT_FOUND,
+                {"error": f"Failed to update data for: {filter_conditions}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        return Response({"ID": point_id, "SUCCESS": payload}, status=status.HTTP_200_OK)
     except Exception as error:
         logger.error(f"Error updating data in vector database: {str(error)}")
         return Response(
@@ -212,7 +266,119 @@ def update_data_into_vector_database(request):
         )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@csrf_exempt
+def bulk_insert_into_vector_database(request):
+    """
+    This endpoint streams an NDJSON body, one record per line:
+    {"payload": {"companyID": 1772, "type": "business"}, "data": {...}}
+    {"payload": {"companyID": 1773, "type": "business"}, "data": {...}}
+
+    params:
+        collection_name=COLLECTION_NAME (mandatory)
+        batch_size=64 (optional, default BULK_INSERT_BATCH_SIZE)
+
+    The body is parsed incrementally and records are embedded and upserted in
+    batches. The response is NDJSON as well, with one status line per input
+    line, e.g. {"line": 1, "status": "inserted"} or {"line": 2, "error": "..."}.
+    """
+    collection_name = request.GET.get("collection_name")
+    if not collection_name:
+        return Response(
+            {"error": "Query parameter 'collection_name' is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        batch_size = int(request.GET.get("batch_size", settings.BULK_INSERT_BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+    except ValueError as error:
+        return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    qdrant = QdrantConnection()
+    results = bulk_insert(
+        qdrant, collection_name, iter(request.readline, b""), batch_size
+    )
+    return ndjson_response(results)
+
+
+@api_view(["POST"])
+@parser_classes([MultiPartParser])
+@permission_classes([IsAuthenticated])
+@csrf_exempt
+def index_pdf_into_vector_database(request):
+    """
+    This endpoint indexes an uploaded PDF (multipart field "file") into a
+    collection, one record per page with the text, tables and OCR text of
+    the page.
+
+    params:
+        collection_name=COLLECTION_NAME (mandatory)
+        pages=1-3,5,8- (optional, every page by default)
+        mode=full|text (optional, text skips the OCR of the figures)
+        batch_size=16 (optional, default PDF_INDEX_BATCH_SIZE)
+
+    An optional "payload" form field (a JSON object) is stored with every
+    page, along with "file_hash" and "page". Pages are extracted, embedded
+    and upserted in batches while the response streams one NDJSON status
+    line per page, e.g. {"page": 1, "status": "indexed"}. Indexing the same
+    PDF again overwrites its pages.
+    """
+    collection_name = request.GET.get("collection_name")
+    if not collection_name:
+        return Response(
+            {"error": "Query parameter 'collection_name' is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    uploaded_file = request.FILES.get("file")
+    if not uploaded_file:
+        return Response(
+            {"error": "No file uploaded."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        pages = parse_pages(request.GET["pages"]) if "pages" in request.GET else None
+        mode = request.GET.get("mode", FULL)
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode: {mode!r}, expected one of {MODES}.")
+        batch_size = int(request.GET.get("batch_size", settings.PDF_INDEX_BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        payload = json.loads(request.data.get("payload") or "{}")
+        if not isinstance(payload, dict):
+            raise ValueError("'payload' must be an object.")
+    except ValueError as error:
+        return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    file_hash = upload_hash(uploaded_file)
+    payload = {**payload, "file_name": uploaded_file.name}
+    qdrant = QdrantConnection()
+
+    def results():
+        # The file stays on disk until the last page is indexed
+        with upload_path(uploaded_file) as pdf_path:
+            try:
+                yield from index_pdf(
+                    qdrant,
+                    collection_name,
+                    iter_document(
+                        pdf_path, pages=pages, file_hash=file_hash, mode=mode
+                    ),
+                    file_hash,
+                    payload,
+                    batch_size,
+                )
+            except PageRangeError as error:
+                yield {"error": str(error)}
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Failed to index %s", uploaded_file.name)
+                yield {"error": f"Failed to extract the PDF: {error}"}
+
+    return ndjson_response(results())
+
+
 @api_view(["GET"])
+@renderer_classes([JSONRenderer, NDJSONRenderer])
 def search_in_vector_database(request):
     """
     This function handles the HTTP requests to a specific view in the Django application.
@@ -228,7 +394,17 @@ def search_in_vector_database(request):
         q=QUERY (mandatory)
         collection_name=COLLECTION_NAME (mandatory)
         limit=1 (optional, default 10)
-        type=neural (or text by default)
+        type=neural or hybrid (or text by default)
+        fusion=rrf or dbsf (optional, hybrid only, default HYBRID_FUSION)
+        highlight=1 (optional, adds snippets around the matches to each hit)
+        cursor=CURSOR (optional, text only, the "cursor" of the previous page)
+        stream=1 (optional, text only, streams every page as an NDJSON line)
+        format=ndjson (optional, streams one hit per line instead of a JSON body)
+        collapse=1 (optional, one hit per document instead of one per chunk)
+
+    Text results carry a "cursor" to fetch the next page, null after the last one.
+    With format=ndjson it is sent in the X-Next-Cursor header, and stream=1
+    exports every matching hit, one per line.
 
     Returns:
         HttpResponse: The response object that encapsulates all of the HTTP response data.
@@ -239,6 +415,12 @@ def search_in_vector_database(request):
     q = request.GET.get("q")
     search_type = request.GET.get("type")
     search_limit = int(request.GET.get("limit", 10))
+    highlight = request.GET.get("highlight") in ("1", "true", "True")
+    cursor = request.GET.get("cursor")
+    stream = request.GET.get("stream") in ("1", "true", "True")
+    collapse = request.GET.get("collapse") in ("1", "true", "True")
+    # format=ndjson or an "Accept: application/x-ndjson" header.
+    response_format = request.accepted_renderer.format
     if not q:
         return Response(
             {"error": "Query parameter 'q' is required."},
@@ -251,29 +433,251 @@ def search_in_vector_database(request):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    text_searcher = TextSearcher(collection_name=collection_name)
-    neural_searcher = NeuralSearcher(collection_name=collection_name)
+    search_type = resolve_search_type(search_type)
+    fusion = request.GET.get("fusion", settings.HYBRID_FUSION)
+    if search_type == HYBRID and fusion not in FUSIONS:
+        return Response(
+            {"error": f"Query parameter 'fusion' must be one of {list(FUSIONS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if search_type == HYBRID and not QdrantConnection().is_hybrid(collection_name):
+        return Response(
+            {
+                "error": f"Collection '{collection_name}' has no sparse vectors, "
+                'type=hybrid needs a collection created with "hybrid": true.'
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if (cursor or stream) and search_type != TEXT:
+        return Response(
+            {"error": "Query parameters 'cursor' and 'stream' require type=text."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        decode_cursor(cursor)
+    except ValueError as error:
+        return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-    if search_type == "text" or not search_type:
-        do_search = text_searcher.search(text=q, search_limit=search_limit)
-        logging.info("Text search")
-    else:
-        do_search = neural_searcher.search(text=q, search_limit=search_limit)
-        logging.info("Neural search")
+    highlighter = get_highlighter(q) if highlight else None
+    if stream and response_format == "ndjson":
+        text_searcher = TextSearcher(collection_name=collection_name)
+        records = text_searcher.iter_records(
+            text=q, page_size=search_limit, cursor=cursor
+        )
+        return ndjson_response(
+            TextSearcher.format_hit(record, highlighter) for record in records
+        )
+    if stream:
+        text_searcher = TextSearcher(collection_name=collection_name)
+        pages = text_searcher.iter_pages(
+            text=q, page_size=search_limit, highlight=highlight, cursor=cursor
+        )
+        return ndjson_response(
+            {"results": hits, "cursor": next_cursor} for hits, next_cursor in pages
+        )
+    if response_format == "ndjson":
+        # Points are converted and written one at a time, the full result list
+        # and JSON body are never built.
+        try:
+            if search_type == TEXT:
+                text_searcher = TextSearcher(collection_name=collection_name)
+                points, next_cursor = text_searcher.scroll(
+                    text=q, search_limit=search_limit, cursor=cursor, collapse=collapse
+                )
+                format_hit = TextSearcher.format_hit
+            elif search_type == HYBRID:
+                hybrid_searcher = HybridSearcher(
+                    collection_name=collection_name, fusion=fusion
+                )
+                points = hybrid_searcher.search_points(
+                    text=q, search_limit=search_limit, collapse=collapse
+                )
+                format_hit = NeuralSearcher.format_hit
+            else:
+                neural_searcher = NeuralSearcher(collection_name=collection_name)
+                points = neural_searcher.search_points(
+                    text=q, search_limit=search_limit, collapse=collapse
+                )
+                format_hit = NeuralSearcher.format_hit
+        except SEARCH_ERRORS as error:
+            return search_error_response(error)
+        response = ndjson_response(format_hit(point, highlighter) for point in points)
+        if search_type == TEXT and next_cursor is not None:
+            response["X-Next-Cursor"] = next_cursor
+        return response
+
+    start_time = time.time()
+    cache_key = result_cache.make_key(
+        collection_name,
+        q=q,
+        type=search_type,
+        limit=search_limit,
+        fusion=fusion if search_type == HYBRID else None,
+        highlight=highlight,
+        cursor=cursor,
+        collapse=collapse,
+    )
+    cached_response = result_cache.get_results(cache_key)
+    if cached_response is not None:
+        return Response(
+            {
+                **cached_response,
+                "search_time_seconds": round(time.time() - start_time, 2),
+                "cached": True,
+            },
+            status=status.HTTP_200_OK,
+        )
 
     try:
+        if search_type == TEXT:
+            text_searcher = TextSearcher(collection_name=collection_name)
+            text_hits, next_cursor = text_searcher.search_page(
+                text=q,
+                search_limit=search_limit,
+                highlight=highlight,
+                cursor=cursor,
+                collapse=collapse,
+            )
+            do_search = (text_hits, start_time)
+            logging.info("Text search")
+        elif search_type == HYBRID:
+            hybrid_searcher = HybridSearcher(
+                collection_name=collection_name, fusion=fusion
+            )
+            do_search = hybrid_searcher.search(
+                text=q,
+                search_limit=search_limit,
+                highlight=highlight,
+                collapse=collapse,
+            )
+            logging.info("Hybrid search")
+        else:
+            neural_searcher = NeuralSearcher(collection_name=collection_name)
+            do_search = neural_searcher.search(
+                text=q,
+                search_limit=search_limit,
+                highlight=highlight,
+                collapse=collapse,
+            )
+            logging.info("Neural search")
+
         search_results, start_time = do_search
         search_time_seconds = time.time() - start_time
+        cached_response = {"results": search_results}
+        if search_type == TEXT:
+            cached_response["cursor"] = next_cursor
+        result_cache.set_results(cache_key, cached_response)
         response_data = {
-            "results": search_results,
+            **cached_response,
             "search_time_seconds": round(search_time_seconds, 2),
+            "cached": False,
         }
         return Response(response_data, status=status.HTTP_200_OK)
-    except (ValueError, ConnectionError, KeyError, TypeError, IndexError) as error:
-        logger.exception("Unhandled exception during search: %s", str(error))
+    except SEARCH_ERRORS as error:
+        return search_error_response(error)
+
+
+@api_view(["POST"])
+def batch_search_in_vector_database(request):
+    """
+    Run several searches in one request. This endpoint expects:
+    {
+        "collection_name": "COLLECTION_NAME",
+        "queries": [
+            {"q": "Chicago", "type": "neural", "limit": 5},
+            {"q": "angels", "collection_name": "OTHER_COLLECTION"},
+            {"q": "music", "filter": {"must": [{"key": "city", "match": {"value": "Chicago"}}]}}
+        ]
+    }
+
+    Where:
+    - "collection_name" is the default collection, each query may override it.
+    - "type" is "neural", "hybrid" or "text" (default), "limit" defaults to 10 and
+      "filter" is a Qdrant filter. "highlight": true adds match snippets.
+
+    Neural and hybrid queries are embedded together and sent in one round trip
+    per collection and type, text queries run concurrently. The response holds one
+    {"results": [...]} or {"error": "..."} per query, in request order.
+    """
+    queries = request.data.get("queries")
+    default_collection = request.data.get("collection_name")
+    if not isinstance(queries, list) or not queries:
+        return Response(
+            {"error": "'queries' must be a non-empty list."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(queries) > settings.SEARCH_BATCH_MAX_QUERIES:
         return Response(
             {
-                "error": f"Failed to perform search due to an internal error. {str(error)}"
+                "error": f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries are allowed."
             },
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    validated = []
+    for index, query in enumerate(queries):
+        if not isinstance(query, dict) or not query.get("q"):
+            return Response(
+                {"error": f"Query {index}: 'q' is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        collection_name = query.get("collection_name", default_collection)
+        if not collection_name:
+            return Response(
+                {"error": f"Query {index}: 'collection_name' is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = int(query.get("limit", 10))
+        except (TypeError, ValueError):
+            return Response(
+                {"error": f"Query {index}: 'limit' must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        search_filter = query.get("filter")
+        if search_filter is not None and not isinstance(search_filter, dict):
+            return Response(
+                {"error": f"Query {index}: 'filter' must be an object."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        validated.append(
+            {
+                "q": query["q"],
+                "collection_name": collection_name,
+                "type": resolve_search_type(query.get("type")),
+                "limit": limit,
+                "filter": search_filter,
+                "highlight": bool(query.get("highlight", False)),
+            }
         )
+
+    start_time = time.time()
+    responses = batch_search(validated)
+    return Response(
+        {
+            "responses": responses,
+            "search_time_seconds": round(time.time() - start_time, 2),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def cache_stats(request):
+    """
+    Return the hit/miss counters of the in-process caches, to size them, and
+    the time spent in each OCR preprocessing step by this process and its PDF
+    workers.
+    """
+    store = get_embedding_store()
+    ocr_cache = get_ocr_cache()
+    return Response(
+        {
+            "query_embeddings": query_embedding_cache.stats(),
+            "document_embeddings": store.stats() if store is not None else None,
+            "ocr_results": ocr_cache.stats() if ocr_cache is not None else None,
+            "ocr_preprocessing": timing_stats(),
+        },
+        status=status.HTTP_200_OK,
+    )
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# Build the shared Qdrant client and load the embedding model before the
+# first request (QDRANT_WARMUP_ON_STARTUP).
+from api.utils.client_registry import warm_up  # noqa: E402
+
+warm_up()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import json
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -171,3 +172,136 @@ EMBEDDINGS_MODEL = os.environ.get(
 )
 
 TEXT_FIELD_NAME = "document"
+# Payload field holding the SHA-256 of the canonical document (keyword index).
+CONTENT_HASH_FIELD_NAME = "content_hash"
+# Chunked documents: every point stores the ID of its document's first point
+# and its position (keyword/integer payload).
+PARENT_ID_FIELD_NAME = "parent_id"
+CHUNK_INDEX_FIELD_NAME = "chunk_index"
+
+# Build the shared Qdrant client and load the embedding model when the server
+# starts (wsgi.py, asgi.py), not for management commands.
+QDRANT_WARMUP_ON_STARTUP = (
+    os.environ.get("QDRANT_WARMUP_ON_STARTUP", "True").lower() == "true"
+)
+
+# Number of NDJSON records embedded and upserted together by /api/bulk-insert/.
+BULK_INSERT_BATCH_SIZE = int(os.environ.get("BULK_INSERT_BATCH_SIZE", "64"))
+# Number of PDF pages embedded and upserted together by /api/index-pdf/.
+PDF_INDEX_BATCH_SIZE = int(os.environ.get("PDF_INDEX_BATCH_SIZE", "16"))
+
+# Bounded LRU of query embeddings used by neural search (TTL in seconds, 0 = none).
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+QUERY_EMBEDDING_CACHE_TTL = int(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", "0"))
+
+# Search results are cached in the SEARCH_CACHE_ALIAS cache and invalidated per
+# collection on every write. locmem is per process; use a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache or filebased) when running
+# several workers so they share results and invalidations.
+SEARCH_CACHE_ALIAS = "search"
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    SEARCH_CACHE_ALIAS: {
+        "BACKEND": os.environ.get(
+            "SEARCH_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("SEARCH_CACHE_LOCATION", "search-results"),
+        "TIMEOUT": int(os.environ.get("SEARCH_CACHE_TIMEOUT", "300")),
+        # Backend specific, e.g. {"MAX_ENTRIES": 10000} for locmem/filebased.
+        "OPTIONS": json.loads(
+            os.environ.get("SEARCH_CACHE_OPTIONS", '{"MAX_ENTRIES": 10000}')
+        ),
+    },
+}
+
+# /api/search/batch/ limits: queries per request and threads running them.
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", "50"))
+SEARCH_BATCH_WORKERS = int(os.environ.get("SEARCH_BATCH_WORKERS", "8"))
+
+# Threads running the CPU-bound embedding work of the async (ASGI) views.
+ASYNC_EMBEDDING_WORKERS = int(os.environ.get("ASYNC_EMBEDDING_WORKERS", "4"))
+
+# Hybrid search: sparse model of hybrid collections, server-side fusion
+# (rrf or dbsf) and how many candidates each prefetch returns.
+SPARSE_EMBEDDINGS_MODEL = os.environ.get(
+    "SPARSE_EMBEDDINGS_MODEL", "prithvida/Splade_PP_en_v1"
+)
+HYBRID_FUSION = os.environ.get("HYBRID_FUSION", "rrf")
+HYBRID_PREFETCH_LIMIT = int(os.environ.get("HYBRID_PREFETCH_LIMIT", "50"))
+
+# highlight=1 returns up to HIGHLIGHT_MAX_SNIPPETS snippets of about
+# HIGHLIGHT_SNIPPET_SIZE characters around the matches of each hit.
+HIGHLIGHT_SNIPPET_SIZE = int(os.environ.get("HIGHLIGHT_SNIPPET_SIZE", "160"))
+HIGHLIGHT_MAX_SNIPPETS = int(os.environ.get("HIGHLIGHT_MAX_SNIPPETS", "3"))
+
+# Persistent document embedding store (SQLite, shared by the workers of a host
+# and kept across restarts), keyed by model and text hash. Empty path disables it.
+EMBEDDING_STORE_PATH = os.environ.get(
+    "EMBEDDING_STORE_PATH", str(BASE_DIR / "embedding_store.sqlite3")
+)
+EMBEDDING_STORE_MAX_ENTRIES = int(
+    os.environ.get("EMBEDDING_STORE_MAX_ENTRIES", "1000000")
+)
+
+# Documents whose JSON is longer than CHUNK_SIZE characters are split into
+# chunks (long text fields, with CHUNK_OVERLAP characters of overlap), each
+# embedded as its own point. 0 disables chunking.
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "200"))
+
+# Pages of a PDF sent to /pdf-ocr-api/ocr/ are extracted by a pool of
+# PDF_OCR_WORKERS processes shared by the requests (1 extracts them in the
+# request thread), in ranges of PDF_OCR_PAGES_PER_TASK pages per task.
+PDF_OCR_WORKERS = int(os.environ.get("PDF_OCR_WORKERS", str(os.cpu_count() or 1)))
+PDF_OCR_PAGES_PER_TASK = int(os.environ.get("PDF_OCR_PAGES_PER_TASK", "4"))
+# Resolution at which the figures of a PDF are rendered for OCR.
+PDF_OCR_DPI = int(os.environ.get("PDF_OCR_DPI", "200"))
+# Only the figures of pages whose text layer covers less than
+# PDF_OCR_TEXT_COVERAGE of the page, and the figures covering at least
+# PDF_OCR_MIN_FIGURE_AREA of a text page, are sent to OCR. Pages without a text
+# layer are OCRed whole.
+PDF_OCR_TEXT_COVERAGE = float(os.environ.get("PDF_OCR_TEXT_COVERAGE", "0.1"))
+PDF_OCR_MIN_FIGURE_AREA = float(os.environ.get("PDF_OCR_MIN_FIGURE_AREA", "0.2"))
+# OCR threads per process (Django and PDF pool workers), each keeping an
+# initialized Tesseract engine when tesserocr is installed.
+OCR_ENGINE_WORKERS = int(os.environ.get("OCR_ENGINE_WORKERS", "2"))
+# Preprocessing of the images before OCR: grayscale, downscaling to
+# OCR_PREPROCESS_DPI (0 keeps the rendered size), deskewing and adaptive
+# binarization, each one can be turned off. The default 150 DPI is below
+# PDF_OCR_DPI, so the rendered figures are shrunk by a quarter; images at or
+# below OCR_PREPROCESS_DPI are not resized.
+OCR_PREPROCESS_GRAYSCALE = (
+    os.environ.get("OCR_PREPROCESS_GRAYSCALE", "True").lower() == "true"
+)
+OCR_PREPROCESS_DPI = int(os.environ.get("OCR_PREPROCESS_DPI", "150"))
+OCR_PREPROCESS_DESKEW = (
+    os.environ.get("OCR_PREPROCESS_DESKEW", "True").lower() == "true"
+)
+OCR_PREPROCESS_BINARIZE = (
+    os.environ.get("OCR_PREPROCESS_BINARIZE", "True").lower() == "true"
+)
+
+# Background OCR jobs (POST /pdf-ocr-api/ocr/?async=1): OCR_JOB_WORKERS threads
+# per Django process run them, at most OCR_JOB_QUEUE_SIZE wait (more are
+# refused). Their progress and results are kept in the SQLite file
+# OCR_JOB_STORE_PATH, shared by the processes of the host, for OCR_JOB_TTL
+# seconds after they end. A process refreshes its jobs every OCR_JOB_HEARTBEAT
+# seconds; jobs not refreshed for OCR_JOB_STALE_TIMEOUT seconds (their process
+# stopped) are marked failed.
+OCR_JOB_WORKERS = int(os.environ.get("OCR_JOB_WORKERS", "2"))
+OCR_JOB_QUEUE_SIZE = int(os.environ.get("OCR_JOB_QUEUE_SIZE", "16"))
+OCR_JOB_STORE_PATH = os.environ.get(
+    "OCR_JOB_STORE_PATH", str(BASE_DIR / "ocr_jobs.sqlite3")
+)
+OCR_JOB_TTL = int(os.environ.get("OCR_JOB_TTL", "86400"))
+OCR_JOB_HEARTBEAT = int(os.environ.get("OCR_JOB_HEARTBEAT", "30"))
+OCR_JOB_STALE_TIMEOUT = int(os.environ.get("OCR_JOB_STALE_TIMEOUT", "300"))
+
+# Content-addressed cache of the OCR results, one entry per page keyed by the
+# SHA-256 of the PDF and the extraction options, in the SQLite file
+# OCR_CACHE_PATH (empty disables it). Above OCR_CACHE_MAX_BYTES of results the
+# least recently used pages are evicted.
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", str(BASE_DIR / "ocr_cache.sqlite3"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(512 * 1024**2)))
@@ -0,0 +1,76 @@
+import os
+
+import django
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+os.environ.setdefault("QDRANT_WARMUP_ON_STARTUP", "False")
+os.environ.setdefault("EMBEDDING_STORE_PATH", "")
+os.environ.setdefault("OCR_CACHE_PATH", "")
+django.setup()
+
+# The vector of every document and query of `qdrant_client`, the size of the
+# default embedding model so `client.add` and `create_collection` accept it.
+FAKE_VECTOR = [1.0] + [0.0] * 383
+
+
+class FakeModel:
+    def query_embed(self, query):
+        for _ in query:
+            yield np.array(FAKE_VECTOR)
+
+
+@pytest.fixture
+def fake_vector():
+    return FAKE_VECTOR
+
+
+@pytest.fixture
+def qdrant_client(monkeypatch):
+    """
+    An in-memory client with a dense collection "c". Documents and queries
+    are embedded as `FAKE_VECTOR` without loading a model; patch
+    `_embed_documents` again for other vectors.
+    """
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        "c",
+        vectors_config={
+            client.get_vector_field_name(): models.VectorParams(
+                size=len(FAKE_VECTOR), distance=models.Distance.COSINE
+            )
+        },
+    )
+    monkeypatch.setattr(client, "_get_or_init_model", lambda model_name: FakeModel())
+    monkeypatch.setattr(
+        client,
+        "_embed_documents",
+        lambda documents, **kwargs: ((doc, FAKE_VECTOR) for doc in documents),
+    )
+    return client
+
+
+@pytest.fixture
+def qdrant(qdrant_client):
+    from api.utils.qdrant_connection import QdrantConnection
+
+    return QdrantConnection(client=qdrant_client)
+
+
+@pytest.fixture
+def registered_client(qdrant_client, monkeypatch):
+    """
+    `qdrant_client` as the client of the process (`client_registry`), used by
+    the searchers and `QdrantConnection()`, with an empty query embedding cache.
+    """
+    from api.utils import client_registry
+    from api.utils.neural_search import query_embedding_cache
+
+    client_registry.reset()
+    monkeypatch.setattr(client_registry, "_build_client", lambda: qdrant_client)
+    query_embedding_cache.clear()
+    yield qdrant_client
+    client_registry.reset()
+    query_embedding_cache.clear()
@@ -0,0 +1,100 @@
+"""
+Compare the OCR of the figures of a PDF with one Tesseract process per image
+(pytesseract) and with the persistent engines of the OCR threads. Both sides
+recognize the same preprocessed images on `OCR_ENGINE_WORKERS` threads, so
+only the engine differs; the preprocessing time per step is listed apart.
+
+    python manage.py benchmark_ocr document.pdf --repeat 3
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytesseract
+from django.core.management.base import BaseCommand
+from pdfminer.layout import LTFigure
+from api.utils import ocr_engine
+from api.utils.image_preprocessing import preprocess, timing_stats
+from api.utils.pdfhandler import (
+    crop_image,
+    needs_ocr,
+    open_pdf,
+    open_renderer,
+    text_coverage,
+)
+from app.settings import OCR_ENGINE_WORKERS
+
+
+def render_figures(pdf_path):
+    """
+    Return the images of the figures of `pdf_path` that the workflow OCRs.
+    """
+    images = []
+    with open_pdf(pdf_path) as pdf, open_renderer(pdf_path) as renderer:
+        for page_number, page in enumerate(pdf.pages):
+            layout = page.layout
+            coverage = text_coverage(layout)
+            pdfium_page = renderer[page_number]
+            if coverage == 0:
+                images.append(crop_image(layout, layout, pdfium_page))
+            else:
+                images.extend(
+                    crop_image(element, layout, pdfium_page)
+                    for element in layout
+                    if isinstance(element, LTFigure)
+                    and needs_ocr(element, layout, coverage)
+                )
+            pdfium_page.close()
+    return images
+
+
+def recognize(image):
+    return ocr_engine.get_engine().recognize(image)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the OCR engine threads against one Tesseract process per image."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pdf_path")
+        parser.add_argument("--repeat", type=int, default=1)
+
+    def handle(self, *args, **options):
+        images = render_figures(options["pdf_path"]) * options["repeat"]
+        if not images:
+            self.stdout.write("No figure to OCR in this PDF.")
+            return
+        workers = max(OCR_ENGINE_WORKERS, 1)
+        engine = "tesserocr" if ocr_engine.tesserocr else "pytesseract"
+        self.stdout.write(f"{len(images)} images, {workers} OCR threads ({engine})")
+
+        images = [preprocess(image)[0] for image in images]
+        for step, stats in timing_stats().items():
+            self.stdout.write(
+                f"  {step}: {stats['seconds']:.2f}s for {stats['images']} images"
+            )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            start = time.perf_counter()
+            list(executor.map(pytesseract.image_to_string, images))
+            per_image = time.perf_counter() - start
+        self.stdout.write(f"One Tesseract process per image: {per_image:.2f}s")
+
+        # Initialize the engine of every OCR thread before timing, as on a
+        # running server: the barrier holds each thread to one of these tasks
+        barrier = threading.Barrier(workers)
+
+        def initialize():
+            ocr_engine.get_engine()
+            barrier.wait(timeout=60)
+
+        for future in [ocr_engine.submit_ocr(initialize) for _ in range(workers)]:
+            future.result()
+        start = time.perf_counter()
+        futures = [ocr_engine.submit_ocr(recognize, image) for image in images]
+        for future in futures:
+            future.result()
+        engines = time.perf_counter() - start
+        self.stdout.write(
+            f"OCR engine threads: {engines:.2f}s ({per_image / engines:.1f}x)"
+        )
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import OCRView
+from .views import OCRJobView, OCRView
 
 urlpatterns = [
     path("ocr/", OCRView.as_view(), name="ocr_api"),
+    path("ocr/jobs/<str:job_id>/", OCRJobView.as_view(), name="ocr_job"),
 ]
@@ -1,7 +1,5 @@
-import os
-import pdfplumber
-import PyPDF2
 from django.http import JsonResponse
+from django.urls import reverse
 import logging
 
 logging.getLogger("pdfminer").setLevel(logging.WARNING)
@@ -14,16 +12,10 @@ from rest_framework.views import APIView
 # https://towardsdatascience.com/extracting-text-from-pdf-files-with-python-a-comprehensive-guide-9fc4003d517
 
 # To analyze the PDF layout and extract text
-from pdfminer.high_level import extract_pages, extract_text
-from pdfminer.layout import LTTextContainer, LTChar, LTRect, LTFigure
-from api.utils.pdfhandler import (
-    text_extraction,
-    crop_image,
-    convert_to_images,
-    image_to_text,
-    extract_table,
-    table_converter,
-)
+from api.utils.pdf_pool import extract_document
+from api.utils.pdfhandler import FULL, MODES, PageRangeError, parse_pages
+from api.utils.uploads import save_upload, upload_hash, upload_path
+from api.utils.ocr_jobs import DONE, FAILED, QUEUED, JobQueueFull, get_job_runner
 
 logger = logging.getLogger(__name__)
 
@@ -37,21 +29,62 @@ class OCRView(APIView):
         if not uploaded_file:
             return Response({"error": "No file uploaded."}, status=400)
 
-        # Execute the PDF workflow
-        # Save the uploaded file to a temporary path
-        temp_pdf_path = (
-            "/tmp/uploaded_file.pdf"  # Consider using a more dynamic path or handling
-        )
-        with open(temp_pdf_path, "wb+") as destination:
-            for chunk in uploaded_file.chunks():
-                destination.write(chunk)
-
-        # Execute the PDF workflow with the path of the uploaded file and decode the result
-        workflow_results = OCRView.pdfworkflow(temp_pdf_path)
+        # Only process the requested pages, e.g. pages=1-3,5,8-
+        try:
+            pages = (
+                parse_pages(request.GET["pages"]) if "pages" in request.GET else None
+            )
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+
+        # mode=text only returns the lines and the tables, without fonts or OCR
+        mode = request.GET.get("mode", FULL)
+        if mode not in MODES:
+            return Response(
+                {"error": f"Invalid mode: {mode!r}, expected one of {MODES}."},
+                status=400,
+            )
+
+        # The key of the results in the OCR result cache
+        file_hash = upload_hash(uploaded_file)
+
+        # With async=1, queue a background job and return its ID right away
+        if request.GET.get("async") in ("1", "true", "True"):
+            return OCRView.submit_job(request, uploaded_file, pages, file_hash, mode)
+
+        # Execute the PDF workflow with the path of the uploaded file, removed
+        # once the response is ready
+        with upload_path(uploaded_file) as pdf_path:
+            try:
+                workflow_results = OCRView.pdfworkflow(pdf_path, pages, file_hash, mode)
+            except PageRangeError as error:
+                return Response({"error": str(error)}, status=400)
         return Response({"data": workflow_results}, status=200)
 
     @staticmethod
-    def pdfworkflow(pdf_path):
+    def submit_job(request, uploaded_file, pages=None, file_hash=None, mode=FULL):
+        """
+        Queue the PDF workflow of `uploaded_file` (its `pages` only, if given)
+        in `mode` on the background job runner. Returns 202 with the job ID and the URL
+        of its status, or 503 when the job queue is full.
+        """
+        pdf_path = save_upload(uploaded_file)
+        try:
+            job_id = get_job_runner().submit(
+                pdf_path, pages=pages, file_hash=file_hash, mode=mode
+            )
+        except JobQueueFull as error:
+            return Response(
+                {"error": str(error)}, status=503, headers={"Retry-After": "30"}
+            )
+        status_url = request.build_absolute_uri(reverse("ocr_job", args=[job_id]))
+        return Response(
+            {"job_id": job_id, "status": QUEUED, "status_url": status_url},
+            status=202,
+        )
+
+    @staticmethod
+    def pdfworkflow(pdf_path, pages=None, file_hash=None, mode=FULL):
         """
         The `OCRView.pdfworkflow()` method in `app/pdfocrapi/views.py` is
         designed to process a PDF file and extract various types of content
@@ -61,15 +94,19 @@ class OCRView(APIView):
         1. **Initialization and Logging**: The method starts by logging the
         beginning of the PDF workflow and the path of the PDF file being processed.
 
-        2. **Opening the PDF File**: It opens the PDF file using
-        `PyPDF2.PdfReader` to create a PDF reader object for accessing
-        the pages of the PDF.
+        2. **Splitting the Work**: `extract_document` selects the pages (all of
+        them, or the `pages` ranges parsed by `parse_pages`). With the
+        `file_hash` of the file, the pages found in the OCR result cache are
+        reused, and the PDF is not opened when they all are. The other pages
+        are split into ranges of `PDF_OCR_PAGES_PER_TASK` pages, extracted in
+        parallel by the `PDF_OCR_WORKERS` processes of the shared PDF pool (a
+        single range is extracted in the request thread).
 
-        3. **Preparing for Content Extraction**: Initializes a dictionary
-        `text_per_page` to store the extracted content from each page. It then
-        iterates through each page of the PDF using `extract_pages` from `pdfminer`.
+        3. **Opening the PDF File**: Each range opens the PDF file once with
+        `pdfplumber`, which runs the `pdfminer` layout analysis of each page and
+        finds its tables, and once with PDFium (`pypdfium2`) to render the figures.
 
-        4. **Processing Each Page**: For each page, it initializes several
+        4. **Processing Each Page**: `extract_page` initializes several
         lists to hold different types of extracted content (`page_text`, `line_format`,
         `text_from_images`, `text_from_tables`, `page_content`) and flags for
         table extraction control.
@@ -78,193 +115,78 @@ class OCRView(APIView):
            - **Text Extraction**: For text elements (`LTTextContainer`), it extracts
            the text and its format using the `text_extraction` function and appends
            this information to the respective lists.
-           - **Image Extraction and OCR**: For image elements (`LTFigure`), it crops
-           the image from the PDF, converts the cropped PDF to an image file, and then
-           uses OCR (Optical Character Recognition) to extract text from the image,
-           appending the results to the lists.
+           - **Image Extraction and OCR**: For image elements (`LTFigure`) that need
+           it, it renders only the bounding box of the image, in memory and at
+           `PDF_OCR_DPI`, and then uses OCR (Optical Character Recognition) to extract
+           text from the image on the OCR threads of the process, which keep their
+           Tesseract engine between images, appending the results to the lists in
+           page order. The image is first converted to grayscale, downscaled,
+           deskewed and binarized with NumPy, as enabled in the settings. `text_coverage`
+           measures the text layer of the page first: when it covers at least
+           `PDF_OCR_TEXT_COVERAGE` of the page, only the figures covering
+           `PDF_OCR_MIN_FIGURE_AREA` of it are OCRed, and a page without a text
+           layer is rendered and OCRed whole instead of figure by figure.
            - **Table Extraction**: For table elements (`LTRect`), it identifies tables,
-           extracts their content using `extract_table` and `table_converter` functions,
+           extracts their content from the tables found on the open page using
+           `extract_table` and `table_converter` functions,
            and appends the structured string format of the table content to the lists.
+           - **Text Mode**: With `mode="text"`, the PDF is opened without the
+           hierarchical grouping of the text boxes, only the text of the lines (not
+           their fonts) and the tables are extracted, and no figure is OCRed.
 
         6. **Compiling Page Content**: After processing all elements on a page,
         it compiles the extracted content into the `text_per_page` dictionary,
-        keyed by page number.
+        keyed by page number, in page order whichever worker extracted it.
 
-        7. **Cleanup**: Closes the PDF file object and deletes any temporary files
-        created during the process (e.g., cropped images).
+        7. **Cleanup**: Releases the parsed objects of each page once it is
+        processed and closes the PDF files. No intermediate file is written, so
+        concurrent workflows do not interfere.
 
         8. **Logging and Returning Results**: Logs the completion of the process for
         each page and the entire workflow. Finally, it returns a JSON response indicating
         the completion of the PDF workflow.
 
         This method is a comprehensive approach to handling PDF content, utilizing both
-        `pdfminer` for text and layout analysis and `PyPDF2` for PDF manipulation, along
-        with `pdfplumber` for table extraction and `PIL`/`pdf2image` for image handling
-        and OCR via `pytesseract`.
+        `pdfminer` for text and layout analysis and `pdfplumber` for table extraction,
+        along with `pypdfium2`/`PIL` for image handling and OCR via `tesserocr`,
+        falling back to `pytesseract` when it is not installed.
         """
         logger.debug("Starting PDF workflow")
         logger.debug(f"PDF path: {pdf_path}")
 
-        # create a PDF file object
-        pdfFileObj = open(pdf_path, "rb")
-        # create a PDF reader object
-        pdfReaded = PyPDF2.PdfReader(pdfFileObj)
-
-        # Create the dictionary to extract text from each image
-        text_per_page = {}
-        logger.debug("Initialized dictionary for text per page")
-        # We extract the pages from the PDF
-        for pagenum, page in enumerate(extract_pages(pdf_path)):
-
-            logger.debug(f"Processing page number: {pagenum}")
-
-            # Initialize the variables needed for the text extraction from the page
-            pageObj = pdfReaded.pages[pagenum]
-            logger.debug("Initialized page object for text extraction")
-            page_text = []
-            line_format = []
-            text_from_images = []
-            text_from_tables = []
-            page_content = []
-            # Initialize the number of the examined tables
-            table_num = 0
-            first_element = True
-            table_extraction_flag = False
-            # Open the pdf file
-            pdf = pdfplumber.open(pdf_path)
-            logger.debug("Opened PDF with pdfplumber for table extraction")
-            # Find the examined page
-            page_tables = pdf.pages[pagenum]
-            # Find the number of tables on the page
-            tables = page_tables.find_tables()
-            logger.debug(f"Found {len(tables)} tables on the page")
-            lower_side = 0
-            upper_side = 0
-
-            # Find all the elements
-            page_elements = [(element.y1, element) for element in page._objs]
-            # Sort all the elements as they appear in the page
-            page_elements.sort(key=lambda a: a[0], reverse=True)
-            logger.debug("Sorted page elements by their y1 position")
-
-            # Find the elements that composed a page
-            for i, component in enumerate(page_elements):
-                logger.debug(f"Processing component {i} of the page")
-                # Extract the position of the top side of the element in the PDF
-                pos = component[0]
-                # Extract the element of the page layout
-                element = component[1]
-
-                # Check if the element is a text element
-                if isinstance(element, LTTextContainer):
-                    logger.debug("Found a text element")
-                    # Check if the text appeared in a table
-                    if table_extraction_flag == False:
-                        # Use the function to extract the text and format for each text element
-                        (line_text, format_per_line) = text_extraction(element)
-                        logger.debug(f"Extracted text: {line_text}")
-                        # Append the text of each line to the page text
-                        page_text.append(line_text)
-                        # Append the format for each line containing text
-                        line_format.append(format_per_line)
-                        page_content.append(line_text)
-                    else:
-                        # Omit the text that appeared in a table
-                        logger.debug("Omitted text in a table")
-                        pass
-
-                # Check the elements for images
-                if isinstance(element, LTFigure):
-                    try:
-                        logger.debug("Found an image element, starting OCR process.")
-                        # Crop the image from the PDF
-                        crop_image(element, pageObj)
-                        # Convert the cropped pdf to an image
-                        convert_to_images("cropped_image.pdf")
-                        # Extract the text from the image
-                        image_text = image_to_text("PDF_image.png")
-                        logger.debug(f"Extracted text from image: {image_text}")
-                        if image_text.strip():  # Only add non-empty results
-                            text_from_images.append(image_text)
-                        page_content.append(image_text)
-                        # Indicate that OCR was successfully performed on an image
-                        logger.debug("OCR process completed successfully.")
-                    except Exception as e:
-                        logger.error(f"Error during OCR process: {str(e)}")
-                        # Append error message to indicate OCR process failure
-                        text_from_images.append("Error during OCR process.")
-                        page_content.append("Error during OCR process.")
-
-                # Check the elements for tables
-                if isinstance(element, LTRect):
-                    logger.debug("Found a table element")
-                    # If the first rectangular element
-                    if first_element == True and (table_num + 1) <= len(tables):
-                        # Find the bounding box of the table
-                        lower_side = page.bbox[3] - tables[table_num].bbox[3]
-                        upper_side = element.y1
-                        logger.debug(f"Extracting table {table_num}")
-                        # Extract the information from the table
-                        table = extract_table(pdf_path, pagenum, table_num)
-                        # Convert the table information in structured string format
-                        table_string = table_converter(table)
-                        logger.debug(f"Converted table to string: {table_string}")
-                        # Append the table string into a list
-                        text_from_tables.append(table_string)
-                        page_content.append(table_string)
-                        # Set the flag as True to avoid the content again
-                        table_extraction_flag = True
-                        # Make it another element
-                        first_element = False
-                        # Add a placeholder in the text and format lists
-                        page_text.append("table")
-                        line_format.append("table")
-
-                    # Check if we already extracted the tables from the page
-                    if element.y0 >= lower_side and element.y1 <= upper_side:
-                        logger.debug(
-                            "Element within the bounds of the extracted table, skipping"
-                        )
-                        pass
-                    elif not isinstance(page_elements[i + 1][1], LTRect):
-                        logger.debug("No more tables to extract, resetting flags")
-                        table_extraction_flag = False
-                        first_element = True
-                        table_num += 1
-
-            # Create the key of the dictionary
-            dctkey = "Page_" + str(pagenum + 1)
-            # Filter out empty lists from the page content before adding it to the dictionary
-            filtered_page_content = [
-                content
-                for content in [
-                    page_text,
-                    line_format,
-                    text_from_images,
-                    text_from_tables,
-                    page_content,
-                ]
-                if content
-            ]
-            # Add the list of list as the value of the page key
-            text_per_page[dctkey] = filtered_page_content
-            logger.debug(f"Completed processing for page {pagenum}")
-
-        # Closing the pdf file object
-        pdfFileObj.close()
-
-        logger.debug("Closed PDF file object")
-
-        # Deleting the additional files created
-        if os.path.exists("cropped_image.pdf"):
-            os.remove("cropped_image.pdf")
-        if os.path.exists("PDF_image.png"):
-            os.remove("PDF_image.png")
+        # Extract the pages, in ranges spread over the PDF process pool
+        text_per_page = extract_document(
+            pdf_path, pages=pages, file_hash=file_hash, mode=mode
+        )
+        logger.debug(f"Extracted {len(text_per_page)} pages")
 
         # result = "".join(text_per_page["Page_0"][4])
         result = text_per_page
         return result
 
 
+class OCRJobView(APIView):
+    def get(self, request, job_id, *args, **kwargs):
+        """
+        Return the status of an OCR job: queued, running, done or failed, with
+        the pages done out of the page count (null until the job starts). Done
+        jobs include the workflow result as "data", failed ones an "error".
+        """
+        job = get_job_runner().store.get(job_id)
+        if job is None:
+            return Response({"error": "Unknown OCR job."}, status=404)
+        response_data = {
+            "job_id": job_id,
+            "status": job["status"],
+            "pages_done": job["pages_done"],
+            "pages_total": job["pages_total"],
+        }
+        if job["status"] == DONE:
+            response_data["data"] = job["result"]
+        elif job["status"] == FAILED:
+            response_data["error"] = job["error"]
+        return Response(response_data, status=200)
+
+
 if __name__ == "__main__":
     OCRView.pdfworkflow()